@@ -0,0 +1,242 @@
+"""
+A class that represents a batch of boards in a game of 2048 advanced together with NumPy.
+All K boards share the size and the goal and are stored as a single (K, N, N) array of tile values,
+so moves, tile spawns and game over checks run as vectorized operations over the whole batch.
+"""
+import numpy as np
+from Classes.Board import *
+
+
+class BatchBoard:
+    def __init__(self, count: int, size: int, goal: int, seed=None, two_probability=0.7):
+        """
+        Initializes a batch of count boards of the given size and goal, each with 2 random tiles
+
+        Parameters:
+            count (int): The number of boards in the batch
+            size (int): The size of the boards
+            goal (int): The goal as in the tile that player aims to achieve
+            optional seed (int): Seed of the random generator used for spawning tiles
+            optional two_probability (float): Probability that a new tile is 2 rather than 4
+        Returns:
+            None
+        Raises:
+            WrongBoardSizeError: if the size is not an integer or is lower than 2
+            WrongGoalError: if the goal is not an integer or is less than 8 or more than 16384 or is not a power of 2
+        """
+        if not isinstance(size, int) or size < 2:
+            raise WrongBoardSizeError('board size must be greater than 2')
+        if not isinstance(goal, int) or goal.bit_count() != 1 or goal <= 8 or goal > 16384:
+            raise WrongGoalError('goal must be power of 2 greater than 8 and smaller or equal to 16384')
+        self.size = size
+        self.goal = goal
+        self.two_probability = two_probability
+        self.rng = np.random.default_rng(seed)
+        self.tiles = np.zeros((count, size, size), dtype=np.int32)
+        #2 tiles at beginning
+        self.generate_new_tiles()
+        self.generate_new_tiles()
+
+    @classmethod
+    def from_tiles(cls, tiles_list: list[list[list[int]]], goal: int, seed=None, two_probability=0.7) -> 'BatchBoard':
+        """
+        Builds a batch from the tiles of existing boards, e.g. [board.tiles for board in boards]
+        Parameters:
+            tiles_list (list[list[list[int]]]): tiles of every board, all of the same size
+            goal (int): The goal of the boards
+            optional seed (int): Seed of the random generator used for spawning tiles
+            optional two_probability (float): Probability that a new tile is 2 rather than 4
+        Returns:
+            BatchBoard: the batch holding copies of the given tiles
+        """
+        batch = cls(0, len(tiles_list[0]), goal, seed, two_probability)
+        batch.tiles = np.array(tiles_list, dtype=np.int32).reshape(len(tiles_list), batch.size, batch.size)
+        return batch
+
+    def __len__(self) -> int:
+        return self.tiles.shape[0]
+
+    def to_tiles(self) -> list[list[list[int]]]:
+        """
+        Converts the batch back to the list of rows format used by Board.tiles
+        Returns:
+            list[list[list[int]]]: tiles of every board in the batch
+        """
+        return self.tiles.tolist()
+
+    def to_boards(self) -> list[Board]:
+        """
+        Converts the batch to separate Board instances
+        Returns:
+            list[Board]: a board for every board in the batch
+        """
+        boards = []
+        for tiles in self.to_tiles():
+            board = Board(self.size, self.goal, two_probability=self.two_probability)
+            board.tiles = tiles
+            boards.append(board)
+        return boards
+
+    @staticmethod
+    def merge_rows_left(rows: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Slides and merges every row of the given array to the left, the same way Board.make_move does
+        Parameters:
+            rows (np.ndarray): (R, N) array of tile values
+        Returns:
+            (np.ndarray, np.ndarray): the rows after the move and the (R,) sum of the merged tiles per row
+        """
+        #stable sort of the zero flags packs the tiles to the left keeping their order
+        order = np.argsort(rows == 0, axis=1, kind='stable')
+        packed = np.take_along_axis(rows, order, axis=1)
+        merged_sum = np.zeros(rows.shape[0], dtype=np.int64)
+        for j in range(rows.shape[1] - 1):
+            merge = (packed[:, j] == packed[:, j + 1]) & (packed[:, j] != 0)
+            packed[merge, j] *= 2
+            packed[merge, j + 1] = 0
+            merged_sum += np.where(merge, packed[:, j], 0)
+        order = np.argsort(packed == 0, axis=1, kind='stable')
+        return np.take_along_axis(packed, order, axis=1), merged_sum
+
+    @staticmethod
+    def orient(tiles: np.ndarray, direction: Direction, inverse=False) -> np.ndarray:
+        """
+        Views boards so that a move in the given direction becomes a move to the left
+        Parameters:
+            tiles (np.ndarray): (M, N, N) array of boards
+            direction (Direction): direction of the move
+            optional inverse (bool): turn reoriented boards back instead
+        Returns:
+            np.ndarray: the reoriented view of the boards
+        """
+        if direction == Direction.RIGHT:
+            return tiles[:, :, ::-1]
+        elif direction == Direction.UP:
+            return tiles.transpose(0, 2, 1)
+        elif direction == Direction.DOWN:
+            if inverse:
+                return tiles[:, :, ::-1].transpose(0, 2, 1)
+            return tiles.transpose(0, 2, 1)[:, :, ::-1]
+        return tiles
+
+    def make_moves(self, directions) -> (np.ndarray, np.ndarray):
+        """
+        Makes one move on every board of the batch, each in its own direction
+        Parameters:
+            directions: a Direction for the whole batch, or a sequence or array with a Direction or its value per board
+        Returns:
+            (np.ndarray, np.ndarray): (K,) mask of boards on which the move was made and (K,) sum of tiles merged by it
+        """
+        count = len(self)
+        if isinstance(directions, Direction):
+            directions = np.full(count, directions.value)
+        elif isinstance(directions, np.ndarray):
+            directions = directions.astype(np.int8)
+        else:
+            directions = np.array([d.value if isinstance(d, Direction) else d for d in directions], dtype=np.int8)
+        moved = np.zeros(count, dtype=bool)
+        merged = np.zeros(count, dtype=np.int64)
+        for direction in Direction:
+            index = np.flatnonzero(directions == direction.value)
+            if len(index) == 0:
+                continue
+            before = self.tiles[index]
+            oriented = self.orient(before, direction)
+            rows, row_merged = self.merge_rows_left(oriented.reshape(-1, self.size))
+            after = self.orient(rows.reshape(oriented.shape), direction, inverse=True)
+            self.tiles[index] = after
+            moved[index] = (after != before).any(axis=(1, 2))
+            merged[index] = row_merged.reshape(len(index), self.size).sum(axis=1)
+        return moved, merged
+
+    def generate_new_tiles(self, mask=None):
+        """
+        Generates a new 2/4 tile in a random empty spot of every board, 2 with probability of two_probability
+        Boards without an empty spot are left unchanged
+        Parameters:
+            optional mask (np.ndarray): (K,) boolean mask of boards to spawn on, all boards by default
+        Returns:
+            None
+        """
+        flat = self.tiles.reshape(len(self), self.size * self.size)
+        empty = flat == 0
+        empty_counts = empty.sum(axis=1)
+        spawn = empty_counts > 0
+        if mask is not None:
+            spawn &= mask
+        index = np.flatnonzero(spawn)
+        if len(index) == 0:
+            return
+        #pick the k-th empty cell of each board with k uniform in the number of empty cells
+        targets = (self.rng.random(len(index)) * empty_counts[index]).astype(np.int64)
+        cells = np.argmax(np.cumsum(empty[index], axis=1) > targets[:, None], axis=1)
+        values = np.where(self.rng.random(len(index)) < self.two_probability, 2, 4)
+        flat[index, cells] = values
+
+    def reset_boards(self, mask: np.ndarray):
+        """
+        Clears the masked boards and gives each of them 2 random tiles, as new boards
+        Parameters:
+            mask (np.ndarray): (K,) boolean mask of boards to reset
+        Returns:
+            None
+        """
+        self.tiles[mask] = 0
+        self.generate_new_tiles(mask)
+        self.generate_new_tiles(mask)
+
+    def get_legal_moves(self) -> np.ndarray:
+        """
+        Checks every direction on every board without making the moves
+        A move is legal if some line has a tile after an empty cell or 2 equal neighbors, looking in the direction of the move
+        Returns:
+            np.ndarray: (K, 4) mask of legal moves, column direction.value - 1 for every direction
+        """
+        legal = np.zeros((len(self), 4), dtype=bool)
+        for direction in Direction:
+            oriented = self.orient(self.tiles, direction)
+            first, second = oriented[:, :, :-1], oriented[:, :, 1:]
+            slides = (first == 0) & (second != 0)
+            merges = (first == second) & (first != 0)
+            legal[:, direction.value - 1] = (slides | merges).any(axis=(1, 2))
+        return legal
+
+    def get_empty_tile_counts(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: (K,) number of empty tiles on every board
+        """
+        return (self.tiles == 0).sum(axis=(1, 2))
+
+    def get_scores(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: (K,) sum of the tiles on every board
+        """
+        return self.tiles.sum(axis=(1, 2))
+
+    def find_max_tiles(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: (K,) maximum tile of every board
+        """
+        return self.tiles.max(axis=(1, 2))
+
+    def get_goal_reached(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: (K,) mask of boards on which the goal is reached
+        """
+        return self.find_max_tiles() >= self.goal
+
+    def get_game_over(self) -> np.ndarray:
+        """
+        Checks every board for an empty tile or 2 neighbors with possibility to merge
+        Returns:
+            np.ndarray: (K,) mask of boards on which no move is possible
+        """
+        tiles = self.tiles
+        has_empty = (tiles == 0).any(axis=(1, 2))
+        horizontal = (tiles[:, :, 1:] == tiles[:, :, :-1]).any(axis=(1, 2))
+        vertical = (tiles[:, 1:, :] == tiles[:, :-1, :]).any(axis=(1, 2))
+        return ~(has_empty | horizontal | vertical)
@@ -0,0 +1,253 @@
+"""
+A benchmark suite for the hot paths of the game of 2048: moves, greedy computer moves, move checks,
+tile spawns, save/load, the leaderboard and whole computer games, on boards of size 2 to 10 with fixed seeds.
+Results are written as JSON with ops/sec, p50/p99 latency and peak memory of every benchmark,
+and can be compared against a stored baseline.
+Usage: python -m Classes.Benchmark --output results.json --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from Classes.Game import *
+
+
+class Benchmark:
+    def __init__(self, sizes=range(2, 11), iterations=300, seed=0, game_sizes=range(2, 7), games=3):
+        """
+        Initializes the benchmark suite
+        Parameters:
+            optional sizes (range): board sizes of the board benchmarks
+            optional iterations (int): number of timed operations per benchmark
+            optional seed (int): seed of the boards, games and inputs
+            optional game_sizes (range): board sizes of the full game benchmarks
+            optional games (int): number of full games per size
+        Returns:
+            None
+        """
+        self.sizes = sizes
+        self.iterations = iterations
+        self.seed = seed
+        self.game_sizes = game_sizes
+        self.games = games
+
+    @staticmethod
+    def measure(inputs: list, operation, traced_inputs=None) -> dict:
+        """
+        Times the operation on every input, then runs it again under tracemalloc for the peak memory
+        Parameters:
+            inputs (list): one argument of the operation per timed run
+            operation: function taking one input
+            optional traced_inputs (list): arguments of the traced runs, a tenth of inputs by default
+        Returns:
+            dict: ops_per_sec, p50_us, p99_us, peak_kib and iterations
+        """
+        timings = []
+        clock = time.perf_counter_ns
+        for argument in inputs:
+            start = clock()
+            operation(argument)
+            timings.append(clock() - start)
+        timings.sort()
+        total = sum(timings)
+        tracemalloc.start()
+        if traced_inputs is None:
+            traced_inputs = inputs[:max(1, len(inputs) // 10)]
+        for argument in traced_inputs:
+            operation(argument)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'ops_per_sec': len(timings) * 1e9 / total if total else 0.0,
+            'p50_us': timings[len(timings) // 2] / 1000,
+            'p99_us': timings[min(len(timings) - 1, len(timings) * 99 // 100)] / 1000,
+            'peak_kib': peak / 1024,
+            'iterations': len(timings)
+        }
+
+    def get_boards(self, size: int) -> list[Board]:
+        """
+        Gets mid-game boards of the given size, played by the greedy computer from fixed seeds
+        Parameters:
+            size (int): The size of the boards
+        Returns:
+            list[Board]: one board per iteration
+        """
+        boards = []
+        seeds = random.Random(self.seed * 1000 + size)
+        for _ in range(self.iterations):
+            game = Game(size, 2048, seed=seeds.getrandbits(64))
+            for _ in range(seeds.randrange(size * size * 2)):
+                if not game.make_computer_move(show=False):
+                    break
+            boards.append(game.board)
+        return boards
+
+    @staticmethod
+    def get_uncached(boards: list[Board]) -> list[Board]:
+        """
+        Copies boards without their cached legal moves, so the timed operations do the whole work
+        Parameters:
+            boards (list[Board]): the boards to copy
+        Returns:
+            list[Board]: the copies
+        """
+        copies = [board.clone() for board in boards]
+        for board in copies:
+            board.clear_legal_moves()
+        return copies
+
+    def run_board_benchmarks(self, results: dict):
+        """
+        Runs the move, greedy move, move check and spawn benchmarks for every size
+        Parameters:
+            results (dict): results by benchmark name, filled in place
+        Returns:
+            None
+        """
+        directions = list(Direction)
+        for size in self.sizes:
+            boards = self.get_boards(size)
+            traced = len(boards) // 10 + 1
+            #the boards come out of played games with their legal moves cached, the timed calls get copies without them
+            moves = list(zip(self.get_uncached(boards), [directions[i % 4] for i in range(len(boards))]))
+            results[f'make_move/{size}'] = self.measure(
+                moves, lambda argument: argument[0].make_move(argument[1]),
+                list(zip(self.get_uncached(boards[:traced]), directions * traced)))
+            movable = [board for board in boards if board.is_there_move_possible()]
+            results[f'greedy_direction/{size}'] = self.measure(
+                self.get_uncached(movable), lambda board: board.get_direction_with_highest_empty_tiles(),
+                self.get_uncached(movable[:traced]))
+            results[f'is_there_move_possible/{size}'] = self.measure(
+                self.get_uncached(boards), lambda board: board.is_there_move_possible(),
+                self.get_uncached(boards[:traced]))
+            spawnable = [board for board in boards if board.is_there_empty_tile()]
+            results[f'generate_new_tile/{size}'] = self.measure(
+                [board.clone() for board in spawnable], lambda board: board.generate_new_tile(),
+                [board.clone() for board in spawnable[:traced]])
+
+    def run_file_benchmarks(self, results: dict):
+        """
+        Runs the save/load and leaderboard benchmarks in a temporary directory
+        Parameters:
+            results (dict): results by benchmark name, filled in place
+        Returns:
+            None
+        """
+        working_directory = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                os.makedirs('Saves')
+                os.makedirs('Scores')
+                game = Game(4, 2048, seed=self.seed)
+                names = [f'save{i}' for i in range(self.iterations)]
+                traced_names = [f'traced{i}' for i in range(max(1, self.iterations // 10))]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results['save_file'] = self.measure(names, lambda name: game.save_file(name), traced_names)
+                    results['load_file'] = self.measure(names, lambda name: game.load_file(name))
+                scores = random.Random(self.seed)
+                for i in range(self.iterations * 10):
+                    game.get_leaderboard_store().add_score(f'player{i}', scores.randrange(100000))
+                results['get_leaderboard'] = self.measure(list(range(self.iterations)), lambda _: game.get_leaderboard(10))
+                game.get_leaderboard_store().close()
+            finally:
+                os.chdir(working_directory)
+
+    def run_game_benchmarks(self, results: dict):
+        """
+        Runs whole greedy computer games to completion, reported per move
+        Parameters:
+            results (dict): results by benchmark name, filled in place
+        Returns:
+            None
+        """
+        for size in self.game_sizes:
+            seed_random = random.Random(self.seed * 1000 + size)
+            seeds = [seed_random.getrandbits(64) for _ in range(self.games)]
+            moves = []
+            result = self.measure([Game(size, 2048, seed=seed) for seed in seeds],
+                                  lambda game: moves.append(game.play_game_computer(delay=0, show=False)),
+                                  [Game(size, 2048, seed=seeds[0])])
+            #the last entry comes from the traced run
+            result['moves'] = sum(moves[:-1])
+            result['moves_per_sec'] = result['moves'] * result['ops_per_sec'] / len(seeds)
+            results[f'full_game/{size}'] = result
+
+    def run(self) -> dict:
+        """
+        Runs all the benchmarks
+        Returns:
+            dict: metadata of the run and the results by benchmark name
+        """
+        results = {}
+        self.run_board_benchmarks(results)
+        self.run_file_benchmarks(results)
+        self.run_game_benchmarks(results)
+        return {
+            'meta': {
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'seed': self.seed,
+                'iterations': self.iterations
+            },
+            'results': results
+        }
+
+    @staticmethod
+    def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+        """
+        Compares the results with a baseline
+        A benchmark regressed if its ops/sec dropped by more than the threshold
+        Parameters:
+            report (dict): the report from run
+            baseline (dict): a stored report
+            threshold (float): allowed relative slowdown, e.g. 0.2 for 20%
+        Returns:
+            list[str]: description of every regression
+        """
+        regressions = []
+        for name, result in report['results'].items():
+            base = baseline['results'].get(name)
+            if base is None or not base['ops_per_sec']:
+                continue
+            change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+            if change < -threshold:
+                regressions.append(f'{name}: {result["ops_per_sec"]:.1f} ops/sec, {change * 100:.1f}% against baseline')
+        return regressions
+
+    @staticmethod
+    def print_report(report: dict):
+        print(f'{"benchmark":<28}{"ops/sec":>14}{"p50 us":>12}{"p99 us":>12}{"peak KiB":>12}')
+        for name, result in report['results'].items():
+            print(f'{name:<28}{result["ops_per_sec"]:>14.1f}{result["p50_us"]:>12.1f}'
+                  f'{result["p99_us"]:>12.1f}{result["peak_kib"]:>12.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the game')
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the results to as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown against the baseline')
+    args = parser.parse_args()
+    benchmark_report = Benchmark(iterations=args.iterations, seed=args.seed).run()
+    Benchmark.print_report(benchmark_report)
+    if args.output:
+        with open(args.output, 'w') as fOutput:
+            json.dump(benchmark_report, fOutput, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as fBaseline:
+            found_regressions = Benchmark.compare(benchmark_report, json.load(fBaseline), args.threshold)
+        for regression in found_regressions:
+            print(f'regression - {regression}')
+        if found_regressions:
+            sys.exit(1)
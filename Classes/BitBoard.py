@@ -0,0 +1,505 @@
+"""
+A class that represents a 4x4 board in a game of 2048 packed into a single 64-bit integer.
+Every cell holds the 4-bit exponent of its tile (0 for an empty cell), cell (x, y) lives in nibble 4 * x + y,
+so row x is the 16-bit chunk starting at bit 16 * x.
+Moves are made by looking up each row in precomputed 65536-entry tables, UP and DOWN work on the transposed board.
+A nibble holds tiles up to 32768, a move that would merge two 32768 tiles raises TileOverflowError,
+Game then moves the game onto a Board with the same tiles and carries on.
+"""
+from Classes.Board import *
+
+ROW_MASK = 0xFFFF
+#highest exponent a nibble can hold
+MAX_EXPONENT = 15
+#lowest bit of every nibble
+NIBBLE_LOW_BITS = 0x1111111111111111
+
+_row_left_table = None
+_row_right_table = None
+#rows with two tiles of MAX_EXPONENT that a move would merge, in either direction
+_overflow_rows = None
+
+
+def merge_row_left(line: list[int]) -> list[int]:
+    """
+    Slides and merges a line of exponents towards its start, the same way Board.make_move does for tiles
+    Parameters:
+        line (list[int]): exponents of the line, 0 for empty cells
+    Returns:
+        list[int]: exponents of the line after the move
+    """
+    packed = [exponent for exponent in line if exponent != 0]
+    merged = []
+    i = 0
+    while i < len(packed):
+        if i + 1 < len(packed) and packed[i] == packed[i + 1]:
+            #rows merging two MAX_EXPONENT tiles are never moved through the tables, see row_overflows
+            merged.append(min(packed[i] + 1, MAX_EXPONENT))
+            i += 2
+        else:
+            merged.append(packed[i])
+            i += 1
+    return merged + [0] * (len(line) - len(merged))
+
+
+def row_overflows(line: list[int]) -> bool:
+    """
+    Checks if a move of a line would merge two tiles of MAX_EXPONENT, a run of them merges in both directions
+    Parameters:
+        line (list[int]): exponents of the line, 0 for empty cells
+    Returns:
+        bool: True if the merged tile would not fit into a nibble
+    """
+    packed = [exponent for exponent in line if exponent != 0]
+    return any(a == b == MAX_EXPONENT for a, b in zip(packed, packed[1:]))
+
+
+def build_row_tables() -> (list[int], list[int]):
+    """
+    Builds the left and right row-transition tables for every possible 16-bit row
+    The tables are built once and shared by all bitboards
+    Returns:
+        (list[int], list[int]): the left and the right table, indexed by the row before the move
+    """
+    global _row_left_table, _row_right_table, _overflow_rows
+    if _row_left_table is None:
+        left_table = [0] * (ROW_MASK + 1)
+        right_table = [0] * (ROW_MASK + 1)
+        overflow_rows = set()
+        for row in range(ROW_MASK + 1):
+            line = [(row >> (4 * i)) & 0xF for i in range(4)]
+            if row_overflows(line):
+                overflow_rows.add(row)
+            left = merge_row_left(line)
+            right = merge_row_left(line[::-1])[::-1]
+            left_table[row] = left[0] | left[1] << 4 | left[2] << 8 | left[3] << 12
+            right_table[row] = right[0] | right[1] << 4 | right[2] << 8 | right[3] << 12
+        _overflow_rows = frozenset(overflow_rows)
+        _row_left_table, _row_right_table = left_table, right_table
+    return _row_left_table, _row_right_table
+
+
+def transpose(state: int) -> int:
+    """
+    Transposes a packed board, so that columns become rows
+    Parameters:
+        state (int): the packed board
+    Returns:
+        int: the transposed packed board
+    """
+    a1 = state & 0xF0F00F0FF0F00F0F
+    a2 = state & 0x0000F0F00000F0F0
+    a3 = state & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(state: int) -> int:
+    """
+    Reflects a packed board left to right, reversing the cells of every row
+    Parameters:
+        state (int): the packed board
+    Returns:
+        int: the reflected packed board
+    """
+    return (((state & 0x000F000F000F000F) << 12) | ((state & 0x00F000F000F000F0) << 4)
+            | ((state >> 4) & 0x00F000F000F000F0) | ((state >> 12) & 0x000F000F000F000F))
+
+
+def flip(state: int) -> int:
+    """
+    Reflects a packed board top to bottom, reversing the order of the rows
+    Parameters:
+        state (int): the packed board
+    Returns:
+        int: the reflected packed board
+    """
+    return ((state & ROW_MASK) << 48) | (((state >> 16) & ROW_MASK) << 32) \
+        | (((state >> 32) & ROW_MASK) << 16) | (state >> 48)
+
+
+def get_canonical_state(state: int) -> int:
+    """
+    Gets the smallest of the 8 rotations and reflections of a packed board
+    Parameters:
+        state (int): the packed board
+    Returns:
+        int: the packed board equal for all the symmetric boards
+    """
+    transposed = transpose(state)
+    flipped = flip(state)
+    flipped_transposed = flip(transposed)
+    return min(state, mirror(state), flipped, mirror(flipped),
+               transposed, mirror(transposed), flipped_transposed, mirror(flipped_transposed))
+
+
+def move_rows(state: int, table: list[int]) -> int:
+    """
+    Moves every row of a packed board using the given row-transition table
+    Parameters:
+        state (int): the packed board
+        table (list[int]): the row-transition table
+    Returns:
+        int: the packed board after the move
+    """
+    return (table[state & ROW_MASK]
+            | table[(state >> 16) & ROW_MASK] << 16
+            | table[(state >> 32) & ROW_MASK] << 32
+            | table[(state >> 48) & ROW_MASK] << 48)
+
+
+def move_state(state: int, direction: Direction) -> int:
+    """
+    Makes a move in the given direction on a packed board
+    Parameters:
+        state (int): the packed board
+        direction (Direction): direction of the move
+    Returns:
+        int: the packed board after the move, equal to state if the move is not possible
+    Raises:
+        TileOverflowError: if the move would merge two 32768 tiles
+    """
+    left_table, right_table = build_row_tables()
+    #only a board with a nibble at MAX_EXPONENT can overflow
+    if state & (state >> 1) & (state >> 2) & (state >> 3) & NIBBLE_LOW_BITS:
+        rows = state if direction in (Direction.LEFT, Direction.RIGHT) else transpose(state)
+        if any((rows >> shift) & ROW_MASK in _overflow_rows for shift in range(0, 64, 16)):
+            raise TileOverflowError('bitboard engine only supports tiles up to 32768')
+    if direction == Direction.LEFT:
+        return move_rows(state, left_table)
+    elif direction == Direction.RIGHT:
+        return move_rows(state, right_table)
+    elif direction == Direction.UP:
+        return transpose(move_rows(transpose(state), left_table))
+    else:
+        return transpose(move_rows(transpose(state), right_table))
+
+
+def count_empty(state: int) -> int:
+    """
+    Counts the empty cells of a packed board
+    Parameters:
+        state (int): the packed board
+    Returns:
+        int: number of cells with exponent 0
+    """
+    state |= (state >> 2) & 0x3333333333333333
+    state |= state >> 1
+    return (~state & 0x1111111111111111).bit_count()
+
+
+class BitBoard(Board):
+    __slots__ = ('state', '_moves_state')
+
+    def __init__(self, size: int, goal: int, seed=None, two_probability=0.7):
+        """
+        Initializes an instance of a 4x4 bitboard with the given goal
+
+        Parameters:
+            size (int): The size of the board, has to be 4
+            goal (int): The goal as in the tile that player aims to achieve
+            optional seed (int): Seed of the random stream of the board, the same seed and moves give the same game
+            optional two_probability (float): Probability that a new tile is 2 rather than 4
+        Returns:
+            None
+        Raises:
+            WrongBoardSizeError: if the size is not 4
+            WrongGoalError: if the goal is not an integer or is less than 8 or more than 16384 or is not a power of 2
+        """
+        if size != 4:
+            raise WrongBoardSizeError('bitboard engine only supports board size 4')
+        self.state = 0
+        #legal moves cached with the state they were computed for
+        self._moves_state = None
+        build_row_tables()
+        super().__init__(size, goal, seed, two_probability)
+
+    @property
+    def tiles(self) -> list[list[int]]:
+        """
+        Unpacks the board into a fresh list of rows of tile values
+        Changing the returned lists does not change the board, assign to tiles instead
+        Returns:
+            list[list[int]]: the tiles of the board
+        """
+        return [[self.get_tile(x, y) for y in range(4)] for x in range(4)]
+
+    @tiles.setter
+    def tiles(self, tiles: list[list[int]]):
+        """
+        Packs the given rows of tile values into the board
+        Parameters:
+            tiles (list[list[int]]): the tiles of the board
+        Returns:
+            None
+        Raises:
+            WrongBoardSizeError: if the tiles are not 4x4
+        """
+        if len(tiles) != 4 or any(len(row) != 4 for row in tiles):
+            raise WrongBoardSizeError('bitboard engine only supports board size 4')
+        state = 0
+        for x in range(4):
+            for y in range(4):
+                if tiles[x][y] != 0:
+                    state |= (tiles[x][y].bit_length() - 1) << (4 * (4 * x + y))
+        self.state = state
+
+    def get_exponents(self) -> bytes:
+        """
+        Gets the exponents of the tiles row by row, 0 for empty tiles
+        Returns:
+            bytes: the exponent of the tile at (x, y) at index 4 * x + y
+        """
+        state = self.state
+        return bytes((state >> shift) & 0xF for shift in range(0, 64, 4))
+
+    def get_tile(self, x: int, y: int) -> int:
+        """
+        Gets the value of the tile at the given coordinates
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+        Returns:
+            int: value of the tile, 0 if empty
+        """
+        exponent = (self.state >> (4 * (4 * x + y))) & 0xF
+        return 1 << exponent if exponent else 0
+
+    def find_max_tile(self) -> int:
+        """
+        Finds the maximum tile currently on the board
+        Returns:
+            int: the maximum tile
+        """
+        exponent = max((self.state >> shift) & 0xF for shift in range(0, 64, 4))
+        return 1 << exponent if exponent else 0
+
+    def is_there_empty_tile(self) -> bool:
+        """
+        Checks if there is an empty tile in the board
+        Returns:
+            bool: True if there is a tile, False otherwise
+        """
+        return count_empty(self.state) != 0
+
+    def is_there_move_possible(self) -> bool:
+        """
+        Checks if there is a possible move on the board
+        On a full board a row can move left exactly when it can move right, so checking LEFT and UP is enough
+        Returns:
+            bool: True if there is a possible move, False otherwise
+        """
+        if self.is_there_empty_tile():
+            return True
+        if self._moves_state == self.state:
+            return len(self._moves) != 0
+        try:
+            return move_state(self.state, Direction.LEFT) != self.state or move_state(self.state, Direction.UP) != self.state
+        except TileOverflowError:
+            #the tiles that would overflow can merge, so there is a move
+            return True
+
+    def get_legal_moves(self) -> dict:
+        """
+        Gets the legal moves with the boards after them, cached until the packed state changes
+        The boards after the moves are shared with later calls and must not be changed, clone them first
+        Returns:
+            dict: board after the move by Direction, only for legal moves, in the order of Direction
+        Raises:
+            TileOverflowError: if a move would merge two 32768 tiles
+        """
+        if self._moves_state != self.state:
+            moves = {}
+            for direction in Direction:
+                moved = move_state(self.state, direction)
+                if moved != self.state:
+                    board = self.clone()
+                    board.state = moved
+                    board._moves_state = None
+                    moves[direction] = board
+            self._moves = moves
+            self._moves_state = self.state
+        return self._moves
+
+    def clear_legal_moves(self):
+        self._moves = None
+        self._moves_state = None
+
+    def get_empty_tiles(self) -> list[(int, int)]:
+        """
+        Gets coordinates of all empty tiles on the board
+        Returns:
+            list[(int, int)]: coordinates of the empty tiles
+        """
+        return [(cell // 4, cell % 4) for cell in range(16) if (self.state >> (4 * cell)) & 0xF == 0]
+
+    def get_spawn_order(self) -> list[int]:
+        #the empty tiles are always picked row by row
+        return None
+
+    def set_spawn_order(self, order: list[int]):
+        pass
+
+    def get_random_empty_tile(self) -> (int, int):
+        """
+        Gets coordinates of a random empty tile on the board
+        Returns:
+            (int, int): coordinates of the empty tile
+        """
+        empty_tiles = self.get_empty_tiles()
+        if len(empty_tiles) != 0:
+            return empty_tiles[int(self.get_random() * len(empty_tiles))]
+
+    def generate_new_tile(self):
+        """
+        Generates a new 2/4 tile on the board in an empty spot
+        Returns:
+            (int, int, int): coordinates and value of the new tile
+        """
+        (x, y) = self.get_random_empty_tile()
+        value = self.get_2_or_4()
+        self.state |= (value.bit_length() - 1) << (4 * (4 * x + y))
+        return x, y, value
+
+    def set_tile(self, x: int, y: int, value: int):
+        """
+        Sets the tile at the given coordinates, used by search code to place spawned tiles
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+            value (int): value of the tile, 0 for empty
+        Returns:
+            None
+        """
+        self.set_exponent(4 * x + y, value.bit_length() - 1 if value else 0)
+
+    def set_exponent(self, cell: int, exponent: int):
+        """
+        Sets the exponent of the tile of a cell
+        Parameters:
+            cell (int): index 4 * x + y of the tile
+            exponent (int): exponent of the tile, 0 for empty
+        Returns:
+            None
+        """
+        shift = 4 * cell
+        self.state = (self.state & ~(0xF << shift)) | (exponent << shift)
+
+    def set_exponents(self, cells: bytearray):
+        """
+        Packs the exponents of the tiles into the board
+        Parameters:
+            cells (bytearray): exponents of the tiles row by row
+        Returns:
+            None
+        """
+        state = 0
+        for cell, exponent in enumerate(cells):
+            state |= exponent << (4 * cell)
+        self.state = state
+
+    def clone(self) -> 'BitBoard':
+        """
+        Copies the board, the packed state is immutable so copying the references is enough
+        Returns:
+            BitBoard: an independent copy of the board
+        """
+        board = object.__new__(BitBoard)
+        board.size = self.size
+        board.goal = self.goal
+        board.seed = self.seed
+        board.two_probability = self.two_probability
+        board.random = None
+        board._random_block = self._random_block
+        board._random_index = self._random_index
+        board._random_state = self._random_state
+        board._moves = self._moves
+        board._moves_state = self._moves_state
+        board.state = self.state
+        return board
+
+    def get_state_key(self) -> int:
+        """
+        Gets a hashable key of the tiles, the packed state itself
+        Returns:
+            int: the packed board
+        """
+        return self.state
+
+    def get_hash(self) -> int:
+        """
+        Gets a 64-bit hash of the tiles, the packed state is already one without collisions
+        Returns:
+            int: the packed board
+        """
+        return self.state
+
+    def get_canonical_key(self) -> int:
+        """
+        Gets a 64-bit key equal for all the rotations and reflections of the tiles
+        Returns:
+            int: the smallest of the 8 symmetric packed boards
+        """
+        return get_canonical_state(self.state)
+
+    def get_score_on_board(self) -> int:
+        """
+        Gets the sum of the tiles on the board as the score
+        Returns:
+            int: sum of the tiles on the board
+        """
+        score = 0
+        for shift in range(0, 64, 4):
+            exponent = (self.state >> shift) & 0xF
+            if exponent:
+                score += 1 << exponent
+        return score
+
+    def get_empty_tile_count(self) -> int:
+        """
+        Gets the number of empty tiles on the board
+        Returns:
+            int: number of empty tiles on the board
+        """
+        return count_empty(self.state)
+
+    def get_direction_with_highest_empty_tiles(self) -> Direction:
+        """
+        Gets the direction of the move with the highest empty tiles on the board after the move would be made
+        Only considers valid moves, works on the packed states of the cached legal moves
+        Returns:
+            Direction: Direction of the move with the highest empty tile count
+        """
+        moves = self.get_legal_moves()
+        potential_directions_empties = {}
+        for direction in (Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT):
+            if direction in moves:
+                potential_directions_empties[direction] = count_empty(moves[direction].state)
+        return max(potential_directions_empties, key=potential_directions_empties.get)
+
+    def make_move(self, direction: Direction) -> bool:
+        """
+        Makes a move is the given direction
+        If no tiles were merged or shifted, the move was not made and False is returned
+        Parameters:
+            Direction: Direction of the move to be made
+        Returns:
+            bool: True if the move was valid and made, False otherwise
+        Raises:
+            TileOverflowError: if the move would merge two 32768 tiles
+        """
+        if self._moves_state == self.state:
+            if direction not in self._moves:
+                return False
+            self.state = self._moves[direction].state
+            return True
+        moved = move_state(self.state, direction)
+        move_made = moved != self.state
+        self.state = moved
+        return move_made
+
+
+PROFILER.track(BitBoard, 'make_move', 'board_move')
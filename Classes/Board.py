@@ -1,10 +1,28 @@
 """
 A class that represents a board in a game of 2048 with custom size and goal.
+The tiles are stored as a flat bytearray of their exponents (0 for an empty tile), cell (x, y) at index x * size + y,
+and the tiles property is a view of it that reads and writes tile values, so a board is cheap to copy and to keep.
 """
-import copy
+from array import array
 from enum import Enum
+from functools import lru_cache
+from operator import itemgetter
 import random
 from Classes.exceptions import *
+from Classes.Profiler import PROFILER
+
+
+#number of random values drawn from the stream of a board at once
+RANDOM_BLOCK_SIZE = 1024
+#the zobrist tables are drawn from a fixed seed, so hashes are equal in every process
+ZOBRIST_SEED = 2048
+#tiles up to 2^64 get their own zobrist values
+ZOBRIST_EXPONENTS = 64
+#boards up to this size keep their hashes up to date from a table, bigger boards compute them when asked
+ZOBRIST_TABLE_MAX_SIZE = 16
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+#value of the tile of every exponent, 0 for an empty tile
+TILE_VALUES = tuple(1 << exponent if exponent else 0 for exponent in range(ZOBRIST_EXPONENTS + 1))
 
 
 class Direction(Enum):
@@ -17,14 +35,262 @@ class Direction(Enum):
     LEFT = 4
 
 
+def get_direction_mask(directions) -> int:
+    """
+    Packs directions into a mask with bit direction.value - 1 set for every direction
+    Parameters:
+        directions: iterable of Direction
+    Returns:
+        int: the 4-bit mask
+    """
+    mask = 0
+    for direction in directions:
+        mask |= 1 << (direction.value - 1)
+    return mask
+
+
+_lines_cache = {}
+
+
+def get_lines(size: int, direction: Direction) -> list[list[(int, int)]]:
+    """
+    Gets the coordinates of every line of a board of the given size, ordered so that the first tile lies in the direction of the move
+    Parameters:
+        size (int): The size of the board
+        direction (Direction): direction of the move
+    Returns:
+        list[list[(int, int)]]: coordinates of the tiles of every line
+    """
+    key = (size, direction)
+    if key not in _lines_cache:
+        if direction == Direction.UP:
+            lines = [[(j, i) for j in range(size)] for i in range(size)]
+        elif direction == Direction.DOWN:
+            lines = [[(j, i) for j in reversed(range(size))] for i in range(size)]
+        elif direction == Direction.LEFT:
+            lines = [[(i, j) for j in range(size)] for i in range(size)]
+        else:
+            lines = [[(i, j) for j in reversed(range(size))] for i in range(size)]
+        _lines_cache[key] = lines
+    return _lines_cache[key]
+
+
+_cell_lines_cache = {}
+
+
+def get_cell_lines(size: int, direction: Direction) -> list[(tuple[int, ...], itemgetter)]:
+    """
+    Gets the lines of a direction as cell indices x * size + y, ordered as in get_lines
+    Parameters:
+        size (int): The size of the board
+        direction (Direction): direction of the move
+    Returns:
+        list[(tuple[int, ...], itemgetter)]: the cells of every line and a getter of their exponents as a tuple
+    """
+    key = (size, direction)
+    if key not in _cell_lines_cache:
+        lines = [tuple(x * size + y for (x, y) in line) for line in get_lines(size, direction)]
+        _cell_lines_cache[key] = [(line, itemgetter(*line)) for line in lines]
+    return _cell_lines_cache[key]
+
+
+_coordinates_cache = {}
+
+
+def get_coordinates(size: int) -> list[(int, int)]:
+    """
+    Gets the coordinates of every cell of a board of the given size
+    Returns:
+        list[(int, int)]: (x, y) of the cell x * size + y
+    """
+    if size not in _coordinates_cache:
+        _coordinates_cache[size] = [(x, y) for x in range(size) for y in range(size)]
+    return _coordinates_cache[size]
+
+
+_zobrist_cache = {}
+
+
+def get_symmetric_cells(size: int) -> list[tuple[int, ...]]:
+    """
+    Gets where every cell of a board of the given size lands under the 8 rotations and reflections of the board
+    Parameters:
+        size (int): The size of the board
+    Returns:
+        list[tuple[int, ...]]: for the cell x * size + y, the 8 cells it is mapped to, the identity first
+    """
+    last = size - 1
+    cells = []
+    for x in range(size):
+        for y in range(size):
+            transforms = ((x, y), (y, last - x), (last - x, last - y), (last - y, x),
+                          (x, last - y), (last - x, y), (y, x), (last - y, last - x))
+            cells.append(tuple(i * size + j for i, j in transforms))
+    return cells
+
+
+def get_zobrist_table(size: int) -> list[list[int]]:
+    """
+    Gets the zobrist values of a board of the given size, built once per size
+    The hash of a board under a symmetry is the xor of the values of its tiles at the cells the symmetry maps them to.
+    The 8 hashes of a board are kept as the 64-bit lanes of a single integer, so a tile changes all of them with one xor,
+    the table holds those 8 values of a tile packed the same way, empty tiles have no values
+    The table grows with the square of the size, bigger boards than ZOBRIST_TABLE_MAX_SIZE get no table
+    Parameters:
+        size (int): The size of the board
+    Returns:
+        list[list[int]]: packed values by cell x * size + y and exponent of the tile, which is 0 for empty tiles,
+                         None for big boards
+    """
+    if size > ZOBRIST_TABLE_MAX_SIZE:
+        return None
+    if size not in _zobrist_cache:
+        stream = random.Random(ZOBRIST_SEED * 1000 + size)
+        values = [[0] + [stream.getrandbits(64) for _ in range(ZOBRIST_EXPONENTS)] for _ in range(size * size)]
+        _zobrist_cache[size] = [[sum(values[cell][bits] << (64 * lane) for lane, cell in enumerate(symmetric))
+                                 for bits in range(ZOBRIST_EXPONENTS + 1)]
+                                for symmetric in get_symmetric_cells(size)]
+    return _zobrist_cache[size]
+
+
+def get_zobrist_value(cell: int, exponent: int) -> int:
+    """
+    Gets the zobrist value of a tile by mixing its cell and exponent, so big boards need no table
+    Parameters:
+        cell (int): index x * size + y of the tile
+        exponent (int): exponent of the tile
+    Returns:
+        int: the 64-bit value
+    """
+    value = (ZOBRIST_SEED + (cell * 64 + exponent) * 0x9E3779B97F4A7C15) & HASH_MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return value ^ (value >> 31)
+
+
+@lru_cache(maxsize=1 << 16)
+def merge_exponents(line: tuple[int, ...]) -> tuple[int, ...]:
+    """
+    Shifts the tiles of a line towards its start, then merges each pair of equal neighbors once, starting from the front
+    Lines repeat a lot during a game, so the results are cached
+    Parameters:
+        line (tuple[int, ...]): exponents of the tiles, 0 for empty
+    Returns:
+        tuple[int, ...]: exponents of the tiles after the move
+    """
+    packed = [exponent for exponent in line if exponent != 0]
+    merged = []
+    i = 0
+    while i < len(packed):
+        if i + 1 < len(packed) and packed[i] == packed[i + 1]:
+            merged.append(packed[i] + 1)
+            i += 2
+        else:
+            merged.append(packed[i])
+            i += 1
+    return tuple(merged) + (0,) * (len(line) - len(merged))
+
+
+def get_exponent(value: int) -> int:
+    return value.bit_length() - 1 if value else 0
+
+
+class RowView:
+    __slots__ = ('board', 'x')
+
+    def __init__(self, board: 'Board', x: int):
+        """
+        A row of the tiles of a board, reading and writing its tile values
+        Parameters:
+            board (Board): the board
+            x (int): the row
+        Returns:
+            None
+        """
+        self.board = board
+        self.x = x
+
+    def __len__(self) -> int:
+        return self.board.size
+
+    def __getitem__(self, y):
+        size = self.board.size
+        if isinstance(y, slice):
+            return [self.board.get_tile(self.x, j) for j in range(size)[y]]
+        return self.board.get_tile(self.x, range(size)[y])
+
+    def __setitem__(self, y: int, value: int):
+        self.board.set_tile(self.x, range(self.board.size)[y], value)
+
+    def __iter__(self):
+        return iter(self.board.get_row(self.x))
+
+    def __eq__(self, other) -> bool:
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class TilesView:
+    __slots__ = ('board',)
+
+    def __init__(self, board: 'Board'):
+        """
+        The rows of tiles of a board as a read and write view, tiles[x][y] is the value of the tile at (x, y)
+        Writes go through Board.set_tile, so the aggregates of the board stay up to date
+        Parameters:
+            board (Board): the board
+        Returns:
+            None
+        """
+        self.board = board
+
+    def __len__(self) -> int:
+        return self.board.size
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [RowView(self.board, i) for i in range(self.board.size)[x]]
+        return RowView(self.board, range(self.board.size)[x])
+
+    def __iter__(self):
+        return (RowView(self.board, x) for x in range(self.board.size))
+
+    def __eq__(self, other) -> bool:
+        try:
+            return self.tolist() == [list(row) for row in other]
+        except TypeError:
+            return NotImplemented
+
+    def tolist(self) -> list[list[int]]:
+        """
+        Copies the tiles into a new list of rows, which does not change with the board
+        Returns:
+            list[list[int]]: the tiles of the board
+        """
+        return [list(row) for row in self]
+
+    def __repr__(self) -> str:
+        return repr(self.tolist())
+
+
 class Board:
-    def __init__(self, size: int, goal: int):
+    __slots__ = ('size', 'goal', 'seed', 'two_probability', 'random', '_random_block', '_random_index', '_random_state',
+                 '_moves', '_cells', '_empty', '_counts', '_score', '_max_exponent', '_hashes', '_zobrist')
+
+    def __init__(self, size: int, goal: int, seed=None, two_probability=0.7):
         """
         Initializes an instance of a board with the given size and goal
 
         Parameters:
             size (int): The size of the board
             goal (int): The goal as in the tile that player aims to achieve
+            optional seed (int): Seed of the random stream of the board, the same seed and moves give the same game
+            optional two_probability (float): Probability that a new tile is 2 rather than 4
         Returns:
             None
         Raises:
@@ -43,11 +309,116 @@ class Board:
             raise WrongGoalError('goal must be power of 2 greater than 8 and smaller or equal to 16384')
         self.goal = goal
         self.size = size
+        self.seed = seed
+        self.two_probability = two_probability
+        self.random = random.Random(seed)
+        self._random_block = []
+        self._random_index = 0
+        #state of the stream before the current block was drawn
+        self._random_state = self.random.getstate()
+        self._moves = None
         self.tiles = [[0 for _ in range(self.size)] for _ in range(self.size)]
         #2 tiles at beginning
         self.generate_new_tile()
         self.generate_new_tile()
 
+    @property
+    def tiles(self) -> TilesView:
+        """
+        Gets the rows of tiles of the board as a view, tiles[x][y] reads and writes the tile at (x, y)
+        Use tiles.tolist() for a copy that does not follow the board
+        Returns:
+            TilesView: the tiles of the board
+        """
+        return TilesView(self)
+
+    @tiles.setter
+    def tiles(self, tiles: list[list[int]]):
+        """
+        Replaces the tiles of the board and rebuilds the score, max tile, empty tiles and hashes from scratch
+        Parameters:
+            tiles (list[list[int]]): the tiles of the board
+        Returns:
+            None
+        """
+        size = len(tiles)
+        cells = bytearray(size * size)
+        for x, row in enumerate(tiles):
+            for y, value in enumerate(row):
+                cells[x * size + y] = get_exponent(value)
+        self.size = size
+        self.set_exponents(cells)
+
+    def set_exponents(self, cells: bytearray):
+        """
+        Replaces the exponents of the tiles of the board and rebuilds the aggregates from scratch
+        The empty tiles are kept as one buffer: the position of every empty cell in the list, then the list of empty cells
+        Parameters:
+            cells (bytearray): exponents of the tiles row by row, the board keeps it
+        Returns:
+            None
+        """
+        self._moves = None
+        self._cells = cells
+        self._zobrist = zobrist = get_zobrist_table(self.size)
+        count = len(cells)
+        #cell indices of big boards do not fit into bytes, nor into 16 bits above 256x256
+        if count <= 256:
+            empty = bytearray(count)
+        elif count <= 1 << 16:
+            empty = array('H', bytes(2 * count))
+        else:
+            empty = array('I', bytes(4 * count))
+        #number of tiles by exponent, so removing the max tile finds the next one without a scan
+        counts = [0] * len(TILE_VALUES)
+        score = 0
+        hashes = 0
+        for cell, exponent in enumerate(cells):
+            if exponent:
+                counts[exponent] += 1
+                score += TILE_VALUES[exponent]
+                if zobrist is not None:
+                    hashes ^= zobrist[cell][exponent]
+            else:
+                empty[cell] = len(empty) - count
+                empty.append(cell)
+        self._empty = empty
+        self._counts = counts
+        self._score = score
+        self._max_exponent = max(cells, default=0)
+        #boards without a table compute their hashes when they are asked for
+        self._hashes = hashes if zobrist is not None else None
+
+    def get_exponents(self) -> bytes:
+        """
+        Gets the exponents of the tiles row by row, 0 for empty tiles
+        Returns:
+            bytes: the exponent of the tile at (x, y) at index x * size + y
+        """
+        return bytes(self._cells)
+
+    def get_tile(self, x: int, y: int) -> int:
+        """
+        Gets the value of the tile at the given coordinates
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+        Returns:
+            int: value of the tile, 0 if empty
+        """
+        return TILE_VALUES[self._cells[x * self.size + y]]
+
+    def get_row(self, x: int) -> list[int]:
+        """
+        Gets the values of the tiles of a row
+        Parameters:
+            x (int): the row
+        Returns:
+            list[int]: values of the tiles, 0 for empty tiles
+        """
+        start = x * self.size
+        return [TILE_VALUES[exponent] for exponent in self._cells[start:start + self.size]]
+
     def print_board(self):
         """
         Prints the current state of the board on the console
@@ -77,14 +448,83 @@ class Board:
             return True
         return False
 
+    def get_random(self) -> float:
+        """
+        Gets the next random number of the board, the numbers are drawn from its stream in blocks
+        Returns:
+            float: random number in the range [0, 1)
+        """
+        if self._random_index == len(self._random_block):
+            if self.random is None:
+                #a clone takes its own copy of the stream as it was when it was cloned
+                self.set_random_state(*self.get_random_state())
+            self._random_state = self.random.getstate()
+            draw = self.random.random
+            self._random_block = [draw() for _ in range(RANDOM_BLOCK_SIZE)]
+            self._random_index = 0
+        value = self._random_block[self._random_index]
+        self._random_index += 1
+        return value
+
+    def get_random_state(self) -> (tuple, int, int):
+        """
+        Gets the position of the board in its random stream
+        Returns:
+            (tuple, int, int): state of the generator before the current block, length of the block and index in it
+        """
+        return self._random_state, len(self._random_block), self._random_index
+
+    def set_random_state(self, state: tuple, block_length: int, index: int):
+        """
+        Puts the board at a position of a random stream, the board gets its own generator
+        Parameters:
+            state (tuple): state of the generator before the current block, as from random.Random.getstate
+            block_length (int): length of the current block, 0 if no block was drawn
+            index (int): index of the next number in the block
+        Returns:
+            None
+        """
+        self.random = random.Random()
+        self.random.setstate(state)
+        self._random_state = state
+        draw = self.random.random
+        self._random_block = [draw() for _ in range(block_length)]
+        self._random_index = index
+
+    def get_spawn_order(self) -> list[int]:
+        """
+        Gets the order in which get_random_empty_tile picks from the empty cells, it depends on the moves made so far
+        Engines that pick the empty cells in board order return None
+        Returns:
+            list[int]: indices of the empty cells in picking order
+        """
+        return list(self._empty[len(self._cells):])
+
+    def set_spawn_order(self, order: list[int]):
+        """
+        Puts the empty cells of the board in a picking order from get_spawn_order of a board with the same tiles
+        Parameters:
+            order (list[int]): indices of the empty cells in picking order
+        Returns:
+            None
+        Raises:
+            ValueError: if the cells are not exactly the empty cells of the board
+        """
+        empty = self._empty
+        count = len(self._cells)
+        if sorted(order) != sorted(empty[count:]):
+            raise ValueError('the order does not match the empty cells of the board')
+        for index, cell in enumerate(order):
+            empty[count + index] = cell
+            empty[cell] = index
+
     def get_2_or_4(self) -> int:
         """
-        Returns either 2 with probability of 70% or 4 with probability of 30%
+        Returns either 2 with probability of two_probability, 70% by default, or 4 otherwise
         Returns:
             int: 2 or 4
         """
-        prob = random.uniform(0, 1)
-        if prob < 0.7:
+        if self.get_random() < self.two_probability:
             return 2
         else:
             return 4
@@ -95,7 +535,7 @@ class Board:
         Returns:
             int: the maximum tile
         """
-        return max(max(row) for row in self.tiles)
+        return TILE_VALUES[self._max_exponent]
 
     def is_there_empty_tile(self) -> bool:
         """
@@ -103,26 +543,57 @@ class Board:
         Returns:
             bool: True if there is a tile, False otherwise
         """
-        for row in self.tiles:
-            if 0 in row:
-                return True
-        return False
+        return len(self._empty) != len(self._cells)
 
     def is_there_move_possible(self) -> bool:
         """
-        Checks if there is a possible move on the board, first checking if there is an empty tile, then if there are 2 neigbhors with possibility to merge
+        Checks if there is a possible move on the board, first checking if there is an empty tile, then if any move is legal
         Returns:
             bool: True if there is a possible move, False otherwise
         """
-        if self.is_there_empty_tile():
-            return True
-        for i in range(self.size):
-            for j in range(self.size):
-                if i < self.size - 1 and self.tiles[i][j] == self.tiles[i+1][j]:
-                    return True
-                if j < self.size - 1 and self.tiles[i][j] == self.tiles[i][j+1]:
-                    return True
-        return False
+        return self.is_there_empty_tile() or self.get_legal_move_mask() != 0
+
+    def get_legal_moves(self) -> dict:
+        """
+        Gets the legal moves with the boards after them, computed once per state of the board
+        The cache is dropped by every change of the tiles
+        The boards after the moves are shared with later calls and must not be changed, clone them first
+        Returns:
+            dict: board after the move by Direction, only for legal moves, in the order of Direction
+        """
+        if self._moves is None:
+            moves = {}
+            for direction in Direction:
+                board = self.clone()
+                if board.make_move(direction):
+                    moves[direction] = board
+            self._moves = moves
+        return self._moves
+
+    def clear_legal_moves(self):
+        """
+        Drops the cached legal moves, so the next call computes them again, used to time the computation
+        Returns:
+            None
+        """
+        self._moves = None
+
+    def get_legal_move_mask(self) -> int:
+        """
+        Gets the legal moves as a mask with bit direction.value - 1 set for every legal direction
+        Returns:
+            int: the 4-bit mask, 0 if the game is over
+        """
+        return get_direction_mask(self.get_legal_moves())
+
+    def get_empty_tiles(self) -> list[(int, int)]:
+        """
+        Gets coordinates of all empty tiles on the board, in no particular order
+        Returns:
+            list[(int, int)]: coordinates of the empty tiles
+        """
+        coordinates = get_coordinates(self.size)
+        return [coordinates[cell] for cell in self._empty[len(self._cells):]]
 
     def get_random_empty_tile(self) -> (int, int):
         """
@@ -130,19 +601,167 @@ class Board:
         Returns:
             (int, int): coordinates of the empty tile
         """
-        empty_tiles = [(x, y) for x in range(0, self.size) for y in range(0, self.size) if self.tiles[x][y] == 0]
-        if len(empty_tiles) != 0:
-            return random.choice(empty_tiles)
+        count = len(self._cells)
+        empty_count = len(self._empty) - count
+        if empty_count != 0:
+            return get_coordinates(self.size)[self._empty[count + int(self.get_random() * empty_count)]]
 
     def generate_new_tile(self):
         """
         Generates a new 2/4 tile on the board in an empty spot
         Returns:
-            None
+            (int, int, int): coordinates and value of the new tile
         """
         (x, y) = self.get_random_empty_tile()
-        self.tiles[x][y] = self.get_2_or_4()
+        value = self.get_2_or_4()
+        self.set_tile(x, y, value)
         #print(f"new {self.tiles[x][y]} tile at {x+1}, {y+1}")
+        return x, y, value
+
+    def set_tile(self, x: int, y: int, value: int):
+        """
+        Sets the tile at the given coordinates and updates the score, max tile, empty tiles and hashes
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+            value (int): value of the tile, 0 for empty
+        Returns:
+            None
+        """
+        self.set_exponent(x * self.size + y, get_exponent(value))
+
+    def set_exponent(self, cell: int, exponent: int):
+        """
+        Sets the exponent of the tile of a cell and updates the score, max tile, empty tiles and hashes
+        Parameters:
+            cell (int): index x * size + y of the tile
+            exponent (int): exponent of the tile, 0 for empty
+        Returns:
+            None
+        """
+        cells = self._cells
+        old = cells[cell]
+        if old == exponent:
+            return
+        self._moves = None
+        cells[cell] = exponent
+        self._score += TILE_VALUES[exponent] - TILE_VALUES[old]
+        if self._zobrist is not None:
+            zobrist = self._zobrist[cell]
+            self._hashes ^= zobrist[old] ^ zobrist[exponent]
+        else:
+            self._hashes = None
+        counts = self._counts
+        counts[old] -= 1
+        counts[exponent] += 1
+        if exponent > self._max_exponent:
+            self._max_exponent = exponent
+        elif old == self._max_exponent and old and not counts[old]:
+            max_exponent = old - 1
+            while max_exponent and not counts[max_exponent]:
+                max_exponent -= 1
+            self._max_exponent = max_exponent
+        empty = self._empty
+        count = len(cells)
+        if not old:
+            #swap the tile with the last empty one, so it can be popped in O(1)
+            index = empty[cell]
+            last = empty.pop()
+            if last != cell:
+                empty[count + index] = last
+                empty[last] = index
+        if not exponent:
+            empty[cell] = len(empty) - count
+            empty.append(cell)
+
+    def clone(self) -> 'Board':
+        """
+        Copies the board, only the buffers of the exponents and of the empty tiles are copied
+        The copy continues the random stream of the board from where it is, without drawing from the generator of the board,
+        its own generator is only made once it spawns more tiles than are left in the current block
+        The copy also shares the cache of legal moves, which is dropped as soon as either board changes
+        Returns:
+            Board: an independent copy of the board
+        """
+        board = object.__new__(self.__class__)
+        board.size = self.size
+        board.goal = self.goal
+        board.seed = self.seed
+        board.two_probability = self.two_probability
+        board.random = None
+        board._random_block = self._random_block
+        board._random_index = self._random_index
+        board._random_state = self._random_state
+        board._moves = self._moves
+        board._cells = self._cells[:]
+        board._empty = self._empty[:]
+        board._counts = self._counts[:]
+        board._score = self._score
+        board._max_exponent = self._max_exponent
+        board._hashes = self._hashes
+        board._zobrist = self._zobrist
+        return board
+
+    def adopt(self, board: 'Board'):
+        """
+        Copies the tiles and the aggregates of a board of the same size into this board
+        Parameters:
+            board (Board): the board to copy, it is not changed
+        Returns:
+            None
+        """
+        self._moves = None
+        self._cells = board._cells[:]
+        self._empty = board._empty[:]
+        self._counts = board._counts[:]
+        self._score = board._score
+        self._max_exponent = board._max_exponent
+        self._hashes = board._hashes
+
+    def get_state_key(self):
+        """
+        Gets a hashable key of the tiles, equal for boards with equal tiles
+        Returns:
+            bytes: the exponents of the tiles
+        """
+        return bytes(self._cells)
+
+    def get_hash(self) -> int:
+        """
+        Gets the zobrist hash of the tiles, kept up to date by every change of a tile on boards with a zobrist table
+        Equal tiles give equal hashes in every process, different tiles collide with a probability of about 2^-64
+        Returns:
+            int: the 64-bit hash
+        """
+        return self.get_packed_hashes() & HASH_MASK
+
+    def get_canonical_key(self) -> int:
+        """
+        Gets a 64-bit key equal for all the rotations and reflections of the tiles
+        Used to share cached results between symmetric positions, which have the same value for a symmetric evaluation
+        Returns:
+            int: the smallest of the zobrist hashes of the 8 symmetric boards
+        """
+        hashes = self.get_packed_hashes()
+        return min((hashes >> shift) & HASH_MASK for shift in range(0, 512, 64))
+
+    def get_packed_hashes(self) -> int:
+        """
+        Gets the zobrist hashes of the 8 rotations and reflections of the board as the 64-bit lanes of one integer
+        Boards with a zobrist table keep them up to date, bigger boards compute them once per state
+        Returns:
+            int: the packed hashes, the board itself in the lowest lane
+        """
+        if self._hashes is None:
+            cells = self._cells
+            hashes = 0
+            for cell, symmetric in enumerate(get_symmetric_cells(self.size)):
+                exponent = cells[cell]
+                if exponent:
+                    for lane, target in enumerate(symmetric):
+                        hashes ^= get_zobrist_value(target, exponent) << (64 * lane)
+            self._hashes = hashes
+        return self._hashes
 
     def get_score_on_board(self) -> int:
         """
@@ -150,7 +769,7 @@ class Board:
         Returns:
             int: sum of the tiles on the board
         """
-        return sum([sum(row) for row in self.tiles])
+        return self._score
 
     def get_empty_tile_count(self) -> int:
         """
@@ -158,7 +777,7 @@ class Board:
         Returns:
             int: number of empty tiles on the board
         """
-        return len([(x, y) for x in range(0, self.size) for y in range(0, self.size) if self.tiles[x][y] == 0])
+        return len(self._empty) - len(self._cells)
 
     def get_direction_with_highest_empty_tiles(self) -> Direction:
         """
@@ -167,175 +786,42 @@ class Board:
         Returns:
             Direction: Direction of the move with the highest empty tile count
         """
-        directions = {Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT}
+        #fixed order, so ties are broken the same way in every process
+        directions = (Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT)
+        moves = self.get_legal_moves()
         potential_directions_empties = {}
         for direction in directions:
-            board_copy = copy.deepcopy(self)
-            if board_copy.make_move(direction):
-                potential_directions_empties[direction] = board_copy.get_empty_tile_count()
+            if direction in moves:
+                potential_directions_empties[direction] = moves[direction].get_empty_tile_count()
         return max(potential_directions_empties, key=potential_directions_empties.get)
 
     def make_move(self, direction: Direction) -> bool:
         """
         Makes a move is the given direction
+        Every line is shifted and merged towards the direction, only the tiles that changed are written back
         If the move is invalid, no tiles were merged, or shifted in any direction, it means the move was not made and False is returned
         Parameters:
             Direction: Direction of the move to be made
         Returns:
             bool: True if the move was valid and made, False otherwise
         """
+        if self._moves is not None:
+            #the move was already made on a copy, its tiles and aggregates are copied back
+            if direction not in self._moves:
+                return False
+            self.adopt(self._moves[direction])
+            return True
         move_made = False
-        if direction == Direction.UP:
-            #shift up first
-            for i in range(0, self.size):
-                put_index = 0
-                j = 0
-                while j < self.size:
-                    #if its a number, put it in put_index
-                    if self.tiles[j][i] != 0:
-                        tmp = self.tiles[j][i]
-                        self.tiles[j][i] = self.tiles[put_index][i]
-                        self.tiles[put_index][i] = tmp
-                        #if something changed, then a move was made
-                        if self.tiles[j][i] != tmp:
-                            move_made = True
-                        put_index += 1
-                        j += 1
-                    #if its a zero just go up
-                    elif self.tiles[j][i] == 0:
-                        j += 1
-            #merge then
-            #for each column
-            for i in range(0, self.size):
-            # start at 1, no point in comparing from 0
-                j = 1
-                while j < self.size:
-                    if self.tiles[j][i] == self.tiles[j-1][i] and self.tiles[j][i] != 0:
-                        self.tiles[j-1][i] *= 2
-                        # here shift the rest up
-                        k = j
-                        while k < self.size:
-                            if k == self.size-1:
-                                #if its the last one, take zero
-                                self.tiles[k][i] = 0
-                            else:
-                                self.tiles[k][i] = self.tiles[k+1][i]
-                            k += 1
-                        move_made = True
-                    j += 1
-        elif direction == Direction.DOWN:
-            for i in range(0, self.size):
-                put_index = self.size - 1
-                j = self.size - 1
-                while j >= 0:
-                    #if its a number, put it in put_index
-                    if self.tiles[j][i] != 0:
-                        tmp = self.tiles[j][i]
-                        self.tiles[j][i] = self.tiles[put_index][i]
-                        self.tiles[put_index][i] = tmp
-                        if self.tiles[j][i] != tmp:
-                            move_made = True
-                        put_index -= 1
-                        j -= 1
-                    #if its a zero just go down
-                    elif self.tiles[j][i] == 0:
-                        j -= 1
-            #merge then
-            #for each column
-            for i in range(0, self.size):
-            # start at last - 1, no point in comparing from last
-                j = self.size - 2
-                while j >= 0:
-                    if self.tiles[j][i] == self.tiles[j+1][i] and self.tiles[j][i] != 0:
-                        self.tiles[j+1][i] *= 2
-                        # here shift the rest down
-                        k = j
-                        while k >= 0:
-                            if k == 0:
-                                #if its the last one, take zero
-                                self.tiles[k][i] = 0
-                            else:
-                                self.tiles[k][i] = self.tiles[k-1][i]
-                            k -= 1
-                        #if a merge was made, jump over
-                        move_made = True
-                    j -= 1
-
-        elif direction == Direction.LEFT:
-            # shift left first
-            for i in range(0, self.size):
-                put_index = 0
-                j = 0
-                while j < self.size:
-                    # if its a number, put it in put_index
-                    if self.tiles[i][j] != 0:
-                        tmp = self.tiles[i][j]
-                        self.tiles[i][j] = self.tiles[i][put_index]
-                        self.tiles[i][put_index] = tmp
-                        if self.tiles[i][j] != tmp:
-                            move_made = True
-                        put_index += 1
-                        j += 1
-                    # if its a zero just go up
-                    elif self.tiles[i][j] == 0:
-                        j += 1
-                #merge then
-                #for each row
-
-            for i in range(0, self.size):
-                # start at 1, no point in comparing from 0
-                j = 1
-                while j < self.size:
-                    if self.tiles[i][j] == self.tiles[i][j-1] and self.tiles[i][j] != 0:
-                        self.tiles[i][j - 1] *= 2
-                        # here shift the rest up
-                        k = j
-                        while k < self.size:
-                            if k == self.size - 1:
-                                # if its the last one, take zero
-                                self.tiles[i][k] = 0
-                            else:
-                                self.tiles[i][k] = self.tiles[i][k + 1]
-                            k += 1
-                        # if a jump was made, jump over
-                        move_made = True
-                    j += 1
-
-        elif direction == Direction.RIGHT:
-            for i in range(0, self.size):
-                put_index = self.size - 1
-                j = self.size - 1
-                while j >= 0:
-                    #if its a number, put it in put_index
-                    if self.tiles[i][j] != 0:
-                        tmp = self.tiles[i][j]
-                        self.tiles[i][j] = self.tiles[i][put_index]
-                        self.tiles[i][put_index] = tmp
-                        if self.tiles[i][j] != tmp:
-                            move_made = True
-                        put_index -= 1
-                        j -= 1
-                    #if its a zero just go down
-                    elif self.tiles[i][j] == 0:
-                        j -= 1
-            #merge then
-            #for each row
-            for i in range(0, self.size):
-                 # start at last - 1, no point in comparing from last
-                j = self.size - 2
-                while j >= 0:
-                    if self.tiles[i][j] == self.tiles[i][j + 1] and self.tiles[i][j] != 0:
-                        self.tiles[i][j + 1] *= 2
-                        # here shift the rest down
-                        k = j
-                        while k >= 0:
-                            if k == 0:
-                                #if its the last one, take zero
-                                self.tiles[i][k] = 0
-                            else:
-                                self.tiles[i][k] = self.tiles[i][k - 1]
-                            k -= 1
-                        #if a merge was made, jump over
-                        move_made = True
-                    j -= 1
+        cells = self._cells
+        for line, get_line in get_cell_lines(self.size, direction):
+            values = get_line(cells)
+            merged = merge_exponents(values)
+            if merged != values:
+                move_made = True
+                for cell, old, new in zip(line, values, merged):
+                    if old != new:
+                        self.set_exponent(cell, new)
         return move_made
+
+
+PROFILER.track(Board, 'make_move', 'board_move')
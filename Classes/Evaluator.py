@@ -0,0 +1,185 @@
+"""
+A heuristic evaluation of positions in a game of 2048 built from lookup tables of line scores.
+Every row and every column of exponents is scored on its own by empty cells, possible merges, monotonicity,
+smoothness, the weight of its tiles and whether its biggest tile sits at an end, and the board is the sum of its lines.
+For boards of size up to 4 the score of every possible line is precomputed once, larger boards fill a table lazily.
+The weights of the terms are plain data, so they can be saved, loaded and tuned.
+"""
+import json
+import os
+from Classes.BitBoard import *
+
+DEFAULT_WEIGHTS = {
+    #added to every line, keeps the value of any position above a lost one
+    'lost_penalty': 200000.0,
+    'empty': 270.0,
+    'merges': 700.0,
+    'monotonicity': 47.0,
+    'monotonicity_power': 4.0,
+    'smoothness': 10.0,
+    'sum': 11.0,
+    'sum_power': 3.5,
+    'corner': 20.0
+}
+#highest exponent in a full table, higher exponents are capped
+TABLE_MAX_EXPONENT = 15
+#largest number of lines precomputed up front, 16^4 covers every line of a 4x4 board
+FULL_TABLE_LIMIT = 1 << 16
+#tuned weights are kept here by board configuration
+WEIGHTS_DIR = 'Weights'
+
+
+def get_weights_path(size: int, goal: int, directory=WEIGHTS_DIR) -> str:
+    return os.path.join(directory, f'{size}x{size}_{goal}.json')
+
+
+def pack_line(line) -> int:
+    """
+    Packs a line of exponents into an integer with 4 bits per cell, the first cell in the lowest bits
+    The rows of a BitBoard are packed the same way
+    Parameters:
+        line: exponents of the line, capped at TABLE_MAX_EXPONENT
+    Returns:
+        int: the packed line
+    """
+    packed = 0
+    for i, exponent in enumerate(line):
+        packed |= min(exponent, TABLE_MAX_EXPONENT) << (4 * i)
+    return packed
+
+
+class Evaluator:
+    def __init__(self, weights=None):
+        """
+        Initializes an evaluator with the given weights, missing weights take the default values
+        Parameters:
+            optional weights (dict): weights by term name, as in DEFAULT_WEIGHTS
+        Returns:
+            None
+        Raises:
+            KeyError: if a weight has an unknown name
+        """
+        self.weights = dict(DEFAULT_WEIGHTS)
+        for name, weight in (weights or {}).items():
+            if name not in DEFAULT_WEIGHTS:
+                raise KeyError(f'unknown weight {name}')
+            self.weights[name] = float(weight)
+        #full tables by line length, indexed by the packed line
+        self.full_tables = {}
+        #lazily filled tables by line length, keyed by the tuple of exponents
+        self.lazy_tables = {}
+
+    @classmethod
+    def load(cls, path: str) -> 'Evaluator':
+        """
+        Creates an evaluator with the weights saved as JSON in the given file
+        Parameters:
+            path (str): path of the JSON file with the weights
+        Returns:
+            Evaluator: the evaluator
+        """
+        with open(path, 'r') as fWeights:
+            return cls(json.load(fWeights))
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as fWeights:
+            json.dump(self.weights, fWeights, indent=2)
+
+    def score_line(self, line) -> float:
+        """
+        Scores a single row or column of exponents
+        Parameters:
+            line: exponents of the line, 0 for empty cells
+        Returns:
+            float: the score of the line, higher is better
+        """
+        weights = self.weights
+        power = weights['monotonicity_power']
+        empty = 0
+        merges = 0
+        smoothness = 0
+        total = 0.0
+        previous = 0
+        for exponent in line:
+            if exponent:
+                total += exponent ** weights['sum_power']
+                if exponent == previous:
+                    merges += 1
+                elif previous:
+                    smoothness += abs(exponent - previous)
+                previous = exponent
+            else:
+                empty += 1
+        increase = decrease = 0.0
+        for a, b in zip(line, line[1:]):
+            if a > b:
+                decrease += a ** power - b ** power
+            else:
+                increase += b ** power - a ** power
+        highest = max(line)
+        corner = highest if highest and (line[0] == highest or line[-1] == highest) else 0
+        return (weights['lost_penalty'] + weights['empty'] * empty + weights['merges'] * merges
+                - weights['monotonicity'] * min(increase, decrease) - weights['smoothness'] * smoothness
+                - weights['sum'] * total + weights['corner'] * corner)
+
+    def get_full_table(self, length: int) -> list[float]:
+        """
+        Gets the scores of all the lines of the given length, built on the first call
+        Parameters:
+            length (int): the length of the lines, at most 4
+        Returns:
+            list[float]: scores indexed by the packed line
+        """
+        table = self.full_tables.get(length)
+        if table is None:
+            table = [0.0] * (1 << (4 * length))
+            for packed in range(len(table)):
+                table[packed] = self.score_line([(packed >> (4 * i)) & 0xF for i in range(length)])
+            self.full_tables[length] = table
+        return table
+
+    def evaluate_lines(self, rows: list[list[int]]) -> float:
+        """
+        Evaluates a square grid of exponents as the sum of the scores of its rows and columns
+        Parameters:
+            rows (list[list[int]]): exponents of the tiles, 0 for empty tiles, rows may also be bytes
+        Returns:
+            float: the value of the position, higher is better
+        """
+        size = len(rows)
+        columns = list(zip(*rows))
+        if (TABLE_MAX_EXPONENT + 1) ** size <= FULL_TABLE_LIMIT:
+            table = self.get_full_table(size)
+            return sum(table[pack_line(line)] for line in rows) + sum(table[pack_line(line)] for line in columns)
+        table = self.lazy_tables.setdefault(size, {})
+        value = 0.0
+        for line in map(tuple, rows + columns):
+            score = table.get(line)
+            if score is None:
+                score = table[line] = self.score_line(line)
+            value += score
+        return value
+
+    def evaluate(self, board: Board) -> float:
+        """
+        Evaluates a position, the value is the same for all its rotations and reflections
+        Bitboards are read straight from their packed rows
+        Parameters:
+            board (Board): the position
+        Returns:
+            float: the value of the position, higher is better
+        """
+        if isinstance(board, BitBoard):
+            table = self.get_full_table(4)
+            state = board.state
+            transposed = transpose(state)
+            return (table[state & ROW_MASK] + table[(state >> 16) & ROW_MASK]
+                    + table[(state >> 32) & ROW_MASK] + table[state >> 48]
+                    + table[transposed & ROW_MASK] + table[(transposed >> 16) & ROW_MASK]
+                    + table[(transposed >> 32) & ROW_MASK] + table[transposed >> 48])
+        exponents = board.get_exponents()
+        size = board.size
+        return self.evaluate_lines([exponents[x * size:(x + 1) * size] for x in range(size)])
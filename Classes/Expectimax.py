@@ -0,0 +1,238 @@
+"""
+A computer player for the game of 2048 that searches moves with expectimax.
+Player moves are max nodes, the 2/4 tile spawns are chance nodes, and values of already searched
+positions are kept in a size-bounded transposition table keyed by the canonical keys of the boards,
+so the 8 rotations and reflections of a position share an entry.
+The anytime player deepens the search one move at a time and answers with the best move of the deepest
+finished search once its deadline expires, so every move takes at most about the deadline.
+"""
+from collections import OrderedDict
+import time
+from Classes.Evaluator import *
+
+#value of a position in which no move is possible
+GAME_OVER_VALUE = -1000000.0
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its deadline expires, so the unfinished depth is abandoned"""
+
+
+class TranspositionTable:
+    def __init__(self, max_size=200000):
+        """
+        Initializes an empty transposition table that evicts the least recently used entries
+        Parameters:
+            optional max_size (int): The maximum number of stored positions
+        Returns:
+            None
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, key, depth: int):
+        """
+        Gets the stored value of a position if it was searched at least as deep as requested
+        Parameters:
+            key: the state key of the position
+            depth (int): the depth of the search that needs the value
+        Returns:
+            float: the stored value, None if there is no usable entry
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, depth: int, value: float):
+        """
+        Stores the value of a position searched to the given depth, evicting the oldest entry if the table is full
+        Parameters:
+            key: the state key of the position
+            depth (int): the depth of the search of the value
+            value (float): the value of the position
+        Returns:
+            None
+        """
+        self.entries[key] = (depth, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class ExpectimaxPlayer:
+    def __init__(self, depth=2, time_limit=None, table_size=200000, min_probability=0.0001, evaluator=None):
+        """
+        Initializes an expectimax player
+        Parameters:
+            optional depth (int): The number of player moves searched ahead
+            optional time_limit (float): Seconds per move, once they run out the unsearched positions are only evaluated
+            optional table_size (int): The maximum number of positions in the transposition table
+            optional min_probability (float): Spawn sequences less likely than this are not searched further
+            optional evaluator (Evaluator): The evaluation of the searched positions, default weights if None
+        Returns:
+            None
+        """
+        self.depth = depth
+        self.time_limit = time_limit
+        self.min_probability = min_probability
+        self.table = TranspositionTable(table_size)
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.deadline = None
+
+    def get_direction(self, board: Board) -> Direction:
+        """
+        Gets the direction of the move with the highest expected value
+        Parameters:
+            board (Board): the board to move on, it is not changed
+        Returns:
+            Direction: Direction of the best move, None if no move is possible
+        """
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        best_direction = None
+        best_value = None
+        for direction, child in board.get_legal_moves().items():
+            value = self.chance_value(child.clone(), self.depth - 1, 1.0)
+            if best_value is None or value > best_value:
+                best_direction, best_value = direction, value
+        return best_direction
+
+    def max_value(self, board: Board, depth: int, probability: float) -> float:
+        """
+        Gets the value of a position with the player to move
+        Parameters:
+            board (Board): the position
+            depth (int): the number of player moves left to search
+            probability (float): the probability of reaching the position
+        Returns:
+            float: the value of the best move
+        """
+        best_value = GAME_OVER_VALUE
+        for child in board.get_legal_moves().values():
+            best_value = max(best_value, self.chance_value(child.clone(), depth - 1, probability))
+        return best_value
+
+    def chance_value(self, board: Board, depth: int, probability: float) -> float:
+        """
+        Gets the expected value of a position after a move, averaged over all the possible spawns
+        Parameters:
+            board (Board): the position before the spawn
+            depth (int): the number of player moves left to search after the spawn
+            probability (float): the probability of reaching the position
+        Returns:
+            float: the expected value of the position
+        """
+        if depth <= 0 or probability < self.min_probability or \
+                (self.deadline is not None and time.perf_counter() > self.deadline):
+            return self.evaluate(board)
+        #the evaluation is symmetric, so symmetric positions share an entry
+        key = board.get_canonical_key()
+        value = self.table.get(key, depth)
+        if value is not None:
+            return value
+        empty_tiles = board.get_empty_tiles()
+        value = 0.0
+        for (x, y) in empty_tiles:
+            for tile, tile_probability in ((2, board.two_probability), (4, 1 - board.two_probability)):
+                board.set_tile(x, y, tile)
+                spawn_probability = probability * tile_probability / len(empty_tiles)
+                value += tile_probability * self.max_value(board, depth, spawn_probability)
+            board.set_tile(x, y, 0)
+        value /= len(empty_tiles)
+        #past the deadline some positions below were only evaluated, so the value is not one of the full depth
+        if self.deadline is None or time.perf_counter() <= self.deadline:
+            self.table.put(key, depth, value)
+        return value
+
+    def evaluate(self, board: Board) -> float:
+        """
+        Evaluates a position with the evaluator of the player
+        Returns:
+            float: the value of the position, higher is better
+        """
+        return self.evaluator.evaluate(board)
+
+
+class AnytimePlayer(ExpectimaxPlayer):
+    def __init__(self, deadline=0.02, max_depth=8, table_size=200000, min_probability=0.0001, evaluator=None):
+        """
+        Initializes an expectimax player that searches with iterative deepening under a hard deadline per move
+        Parameters:
+            optional deadline (float): Seconds per move, the search stops when they run out
+            optional max_depth (int): The deepest search, it stops earlier if it is reached before the deadline
+            optional table_size (int): The maximum number of positions in the transposition table
+            optional min_probability (float): Spawn sequences less likely than this are not searched further
+            optional evaluator (Evaluator): The evaluation of the searched positions, default weights if None
+        Returns:
+            None
+        """
+        super().__init__(max_depth, None, table_size, min_probability, evaluator)
+        #the line tables are built up front, so building them does not stall the first moves past the deadline
+        for length in range(2, 5):
+            self.evaluator.get_full_table(length)
+        self.search_deadline = deadline
+        self.stop_time = None
+        self.nodes = 0
+        #depth of the deepest finished search, nodes searched and seconds spent by the last move
+        self.last_depth = 0
+        self.last_nodes = 0
+        self.last_time = 0.0
+
+    def get_direction(self, board: Board) -> Direction:
+        """
+        Gets the direction of the best move of the deepest search finished before the deadline
+        The move found by the previous depth is searched first, so an unfinished depth still replaces it
+        with any move that was fully searched and is better
+        Parameters:
+            board (Board): the board to move on, it is not changed
+        Returns:
+            Direction: Direction of the best move, None if no move is possible
+        """
+        start = time.perf_counter()
+        self.stop_time = start + self.search_deadline
+        self.nodes = 0
+        children = {direction: child.clone() for direction, child in board.get_legal_moves().items()}
+        if not children:
+            self.last_depth = 0
+            self.last_nodes = 0
+            self.last_time = time.perf_counter() - start
+            return None
+        #depth 0 is the evaluation of the positions after the moves, so there is a move even if depth 1 is cut
+        values = {direction: self.evaluate(child) for direction, child in children.items()}
+        best_direction = max(values, key=values.get) if values else None
+        self.last_depth = 0
+        try:
+            for depth in range(1, self.depth + 1):
+                order = [best_direction] + [direction for direction in children if direction != best_direction]
+                values = {}
+                for direction in order:
+                    values[direction] = self.chance_value(children[direction], depth - 1, 1.0)
+                best_direction = max(values, key=values.get) if values else None
+                self.last_depth = depth
+        except SearchTimeout:
+            if values and best_direction in values:
+                best_direction = max(values, key=values.get)
+        self.last_nodes = self.nodes
+        self.last_time = time.perf_counter() - start
+        return best_direction
+
+    def chance_value(self, board: Board, depth: int, probability: float) -> float:
+        """
+        Gets the expected value of a position after a move, as in ExpectimaxPlayer
+        Raises:
+            SearchTimeout: if the deadline of the move has expired
+        """
+        self.nodes += 1
+        if time.perf_counter() > self.stop_time:
+            raise SearchTimeout()
+        return super().chance_value(board, depth, probability)
+
+    def get_report(self) -> str:
+        return f'depth {self.last_depth}, {self.last_nodes} nodes in {self.last_time * 1000:.1f} ms'
@@ -1,11 +1,40 @@
 """
 A class that represents graphical interface of 2048 game made with standard tkinter library
 """
+import functools
+import queue
+import threading
 import tkinter as tk
-from tkinter import simpledialog, messagebox
+from tkinter import simpledialog, messagebox, filedialog
 from Classes.Board import *
 from Classes.Game import *
 
+TILE_COLORS = {
+    0: "#CDC1B4", 2: "#EEE4DA", 4: "#EDE0C8", 8: "#F2B179", 16: "#F59563",
+    32: "#F67C5F", 64: "#F65E3B", 128: "#EDCF72", 256: "#EDCC61",
+    512: "#EDC850", 1024: "#EDC53F", 2048: "#EDC22E",
+    4096: "#3D3A32", 8192: "#2E3A32", 16384: "#1F3A32"
+}
+#largest side of a tile on the canvas in pixels, tiles get smaller on large boards
+TILE_SIZE = 100
+TILE_PADDING = 5
+BOARD_PIXELS = 600
+
+
+@functools.lru_cache(maxsize=None)
+def get_tile_style(value: int, tile_size: int) -> (str, str, tuple):
+    """
+    Gets the text, the color and the font of a tile, cached for every value and tile size
+    Parameters:
+        value (int): The value of the tile
+        tile_size (int): The side of the tile in pixels
+    Returns:
+        (str, str, tuple): text, hexagonal color and font of the tile
+    """
+    text = str(value) if value != 0 else ""
+    font_size = max(6, tile_size * 3 // 10 * 3 // max(3, len(text)))
+    return text, TILE_COLORS.get(value, "#CDC1B4"), ("Helvetica", font_size, "bold")
+
 
 class GUI:
     """
@@ -15,17 +44,29 @@ class GUI:
     Parameters:
         optional size (int): The size of the board
         optional goal (int): The goal as in the tile that player aims to achieve
+        optional engine (type): The board class used for the game, Board, BitBoard for 4x4 boards or SparseBoard for big boards
+        optional frame_rate (int): how many times per second the board is redrawn during a computer game
     Returns:
         None
     """
-    def __init__(self, root, size=4, goal=2048):
+    def __init__(self, root, size=4, goal=2048, engine=Board, frame_rate=30):
         self.leaderboard_size = 10
+        self.frame_rate = frame_rate
         self.root = root
         self.root.title("2048 Game")
         self.size = size
-        self.game = Game(size, goal)
-        self.frame = None
-        self.tiles = [[None for _ in range(size)] for _ in range(size)]
+        self.game = Game(size, goal, engine)
+        self.canvas = None
+        #canvas items of every tile and the values they show
+        self.tiles = []
+        self.shown = []
+        self.strategy_name = tk.StringVar(value='greedy')
+        self.profiling = tk.BooleanVar(value=PROFILER.enabled)
+        #computer game played on a worker thread, which sends the boards after its moves to the interface
+        self.computer_worker = None
+        self.computer_frames = queue.Queue()
+        self.computer_resumed = threading.Event()
+        self.computer_cancelled = threading.Event()
         self.create_menu()
         self.create_grid()
         self.update_grid()
@@ -37,24 +78,44 @@ class GUI:
         Creates the menu for the game
         Options:
             new game
+            undo and redo the last move
             save game
             load game
             computer game - let the simple ai complete the game
+            pause, resume and cancel the computer game
+            computer strategy - choose the computer player used for computer moves
+            record replay - record the moves of the game into a replay file
+            stop replay - stop recording the replay
             quit
             save score
             view leaderboard
+            profiling - turn profiling on or off
+            view, export and reset statistics
+        The entries reading the game or the statistics are disabled while the computer plays on the worker thread
         Returns:
             None
         """
         menu_bar = tk.Menu(self.root)
         file_menu = tk.Menu(menu_bar, tearoff=0)
         file_menu.add_command(label="New Game", command=self.new_game)
+        file_menu.add_command(label="Undo", command=self.undo)
+        file_menu.add_command(label="Redo", command=self.redo)
         file_menu.add_command(label="Save Game", command=self.save_file)
         file_menu.add_command(label="Load Game", command=self.load_file)
         file_menu.add_command(label="Next computer move", command=self.make_computer_move)
         file_menu.add_command(label="Computer Game", command=self.play_computer_game)
+        file_menu.add_command(label="Pause Computer Game", command=self.pause_computer_game)
+        file_menu.add_command(label="Resume Computer Game", command=self.resume_computer_game)
+        file_menu.add_command(label="Cancel Computer Game", command=self.cancel_computer_game)
+        strategy_menu = tk.Menu(file_menu, tearoff=0)
+        for name in STRATEGIES:
+            strategy_menu.add_radiobutton(label=name.capitalize(), variable=self.strategy_name, value=name,
+                                          command=lambda: self.game.set_strategy(self.strategy_name.get()))
+        file_menu.add_cascade(label="Computer Strategy", menu=strategy_menu)
+        file_menu.add_command(label="Record Replay", command=self.start_replay)
+        file_menu.add_command(label="Stop Replay", command=self.stop_replay)
         file_menu.add_separator()
-        file_menu.add_command(label="Quit", command=self.root.quit)
+        file_menu.add_command(label="Quit", command=self.quit)
         menu_bar.add_cascade(label="File", menu=file_menu)
 
         leaderboard_menu = tk.Menu(menu_bar, tearoff=0)
@@ -62,6 +123,19 @@ class GUI:
         leaderboard_menu.add_command(label="View Leaderboard", command=self.print_leaderboard)
         menu_bar.add_cascade(label="Leaderboard", menu=leaderboard_menu)
 
+        statistics_menu = tk.Menu(menu_bar, tearoff=0)
+        statistics_menu.add_checkbutton(label="Profiling", variable=self.profiling, command=self.toggle_profiling)
+        statistics_menu.add_command(label="View Statistics", command=self.print_statistics)
+        statistics_menu.add_command(label="Export Statistics", command=self.export_statistics)
+        statistics_menu.add_command(label="Reset Statistics", command=PROFILER.reset)
+        menu_bar.add_cascade(label="Statistics", menu=statistics_menu)
+        #entries that must not run while the worker changes the game
+        self.game_entries = [(file_menu, "Undo"), (file_menu, "Redo"), (file_menu, "Save Game"),
+                             (file_menu, "Next computer move"), (file_menu, "Record Replay"),
+                             (file_menu, "Stop Replay"), (leaderboard_menu, "Save Score"),
+                             (statistics_menu, "View Statistics"), (statistics_menu, "Export Statistics"),
+                             (statistics_menu, "Reset Statistics")]
+
 
 
 
@@ -79,8 +153,9 @@ class GUI:
             goal = simpledialog.askinteger("New Game", "Enter goal (e.g., 2048):", minvalue=8)
             if size and goal:
                 try:
-                    self.game = Game(size, goal)
-                    self.tiles = [[None for _ in range(size)] for _ in range(size)]
+                    self.cancel_computer_game()
+                    self.game.stop_replay()
+                    self.game = Game(size, goal, self.game.engine, self.game.strategy)
                     self.size = size
                     self.create_grid()
                     self.update_grid()
@@ -92,6 +167,60 @@ class GUI:
                 except WrongGoalError as e:
                     messagebox.showinfo("New game error", str(e))
 
+    def start_replay(self):
+        """
+        Helper function for recording a replay of the current game
+        Returns:
+            None
+        """
+        if self.is_computer_playing():
+            return
+        name = simpledialog.askstring("Record Replay", "Enter replay name: ")
+        if name:
+            if self.game.start_replay(name):
+                messagebox.showinfo("Record Replay", "recording started")
+            else:
+                messagebox.showinfo("Record Replay", "error creating the replay file")
+
+    def stop_replay(self):
+        if not self.is_computer_playing():
+            self.game.stop_replay()
+
+    def quit(self):
+        """
+        Stops the computer game and recording the replay, if there are any, and quits the application
+        Returns:
+            None
+        """
+        self.cancel_computer_game()
+        self.game.stop_replay()
+        self.root.quit()
+
+    def undo(self):
+        """
+        Helper function for undoing the last move, the board belongs to the worker during a computer game
+        Returns:
+            None
+        """
+        if self.is_computer_playing():
+            return
+        if self.game.undo():
+            #the game may have been over before the move was undone
+            self.root.title("2048 Game")
+            self.root.bind("<Key>", self.handle_keypress)
+            self.update_grid()
+
+    def redo(self):
+        """
+        Helper function for redoing the last undone move
+        Returns:
+            None
+        """
+        if self.is_computer_playing():
+            return
+        if self.game.redo():
+            self.update_grid()
+
     def load_file(self):
         """
         Helper function for loading a saved file
@@ -100,11 +229,11 @@ class GUI:
         """
         name = simpledialog.askstring("Load file", "Enter file name: ")
         if name:
+            self.cancel_computer_game()
             if not self.game.load_file(name):
                 messagebox.showinfo("Load error", "error loading file save, perhaps the file doesn't exist?")
             else:
                 self.size = len(self.game.board.tiles[0])
-                self.tiles = [[None for _ in range(self.size)] for _ in range(self.size)]
                 self.create_grid()
                 self.update_grid()
                 self.root.title("2048 Game")
@@ -120,6 +249,9 @@ class GUI:
         Returns:
             None
         """
+        #the board belongs to the worker during a computer game
+        if self.is_computer_playing():
+            return
         name = simpledialog.askstring("Save file", "Enter file name: ")
         if name:
             if not self.game.save_file(name):
@@ -128,6 +260,8 @@ class GUI:
                 messagebox.showinfo("Save file", "save successful")
 
     def save_score(self):
+        if self.is_computer_playing():
+            return
         name = simpledialog.askstring("Save Score", "Enter your name:")
         if name:
             if self.game.save_score(name):
@@ -139,52 +273,100 @@ class GUI:
     def create_grid(self):
         """
         Creates the GUI tile grid for the game from the Game object from scratch
+        The grid is a single canvas with a rectangle and a text item per tile
         Used when a new game is started
         Returns:
             None
         """
-        if self.frame:
+        if self.canvas:
             self.next_computer_move_button.destroy()
-            self.frame.destroy()
+            self.canvas.destroy()
 
-        self.frame = tk.Frame(self.root)
-        self.frame.grid(sticky="w")
+        self.tile_size = min(TILE_SIZE, BOARD_PIXELS // self.size)
+        step = self.tile_size + TILE_PADDING
+        self.canvas = tk.Canvas(self.root, width=self.size * step + TILE_PADDING, height=self.size * step + TILE_PADDING,
+                                bg="#BBADA0", highlightthickness=0)
+        self.canvas.grid(sticky="w")
 
+        self.tiles = [[None for _ in range(self.size)] for _ in range(self.size)]
+        #None forces the first update to draw every tile
+        self.shown = [[None for _ in range(self.size)] for _ in range(self.size)]
         for i in range(self.size):
             for j in range(self.size):
-                tile = tk.Label(self.frame, text="", width=4, height=2, font=("Helvetica", 24), borderwidth=2, relief="groove")
-                tile.grid(row=i, column=j, padx=5, pady=5)
-                self.tiles[i][j] = tile
+                x = TILE_PADDING + j * step
+                y = TILE_PADDING + i * step
+                rectangle = self.canvas.create_rectangle(x, y, x + self.tile_size, y + self.tile_size, width=0)
+                text = self.canvas.create_text(x + self.tile_size // 2, y + self.tile_size // 2)
+                self.tiles[i][j] = (rectangle, text)
         self.next_computer_move_button = tk.Button(
             text="Next computer move", command=self.make_computer_move)
         self.next_computer_move_button.grid(row=len(self.game.board.tiles), column = len(self.game.board.tiles), padx=5, pady=5)
 
 
-    def update_grid(self):
+    def update_grid(self, tiles=None):
         """
         Updates the GUI tile grid based on the current state of the board in Game object
+        Only the tiles whose values changed since the last update are redrawn
+        Parameters:
+            optional tiles (list[list[int]]): a snapshot of the tiles to show instead of the board
         Returns:
              None
         """
+        if tiles is None:
+            tiles = self.game.board.tiles
         for i in range(self.size):
-            for j in range(self.size):
-                value = self.game.board.tiles[i][j]
-                self.tiles[i][j].configure(text=str(value) if value != 0 else "", bg=self.get_tile_color(value))
+            shown_row = self.shown[i]
+            for j, value in enumerate(tiles[i]):
+                if shown_row[j] != value:
+                    shown_row[j] = value
+                    text, color, font = get_tile_style(value, self.tile_size)
+                    rectangle, text_item = self.tiles[i][j]
+                    self.canvas.itemconfigure(rectangle, fill=color)
+                    self.canvas.itemconfigure(text_item, text=text, font=font)
 
     def print_leaderboard(self):
         """
-        Creates and displays a new window with loaded leaderboard from saved score files
+        Creates and displays a new window with the leaderboard
         Shows only top x scores, where x is set in the init function as leaderboard_size
         Returns:
             None
         """
-        top_scores = self.game.get_leaderboard()[:self.leaderboard_size]
+        top_scores = self.game.get_leaderboard(self.leaderboard_size)
         leaderboard_window = tk.Toplevel(self.root)
         leaderboard_window.title("Leaderboard")
 
         for i, (name, score) in enumerate(top_scores, start=1):
             tk.Label(leaderboard_window, text=f"{i}. {name}: {score}").pack()
 
+    def toggle_profiling(self):
+        if self.profiling.get():
+            PROFILER.enable()
+        else:
+            PROFILER.disable()
+
+    def print_statistics(self):
+        """
+        Creates and displays a new window with the profiling statistics
+        Returns:
+            None
+        """
+        statistics_window = tk.Toplevel(self.root)
+        statistics_window.title("Statistics")
+        tk.Label(statistics_window, text=PROFILER.get_report(), font=("Courier", 11), justify="left").pack(padx=5, pady=5)
+
+    def export_statistics(self):
+        """
+        Helper function for exporting the profiling statistics to a JSON file
+        Returns:
+            None
+        """
+        path = filedialog.asksaveasfilename(title="Export Statistics", defaultextension=".json")
+        if path:
+            try:
+                PROFILER.export_json(path)
+            except OSError:
+                messagebox.showinfo("Export Statistics", "error saving the statistics")
+
     def get_tile_color(self, value: int) -> str:
         """
         Gets color in hexagonal based on the value of the tile.
@@ -194,35 +376,123 @@ class GUI:
         Returns:
             str: The hexagonal value of the tile color.
         """
-        colors = {
-            0: "#CDC1B4", 2: "#EEE4DA", 4: "#EDE0C8", 8: "#F2B179", 16: "#F59563",
-            32: "#F67C5F", 64: "#F65E3B", 128: "#EDCF72", 256: "#EDCC61",
-            512: "#EDC850", 1024: "#EDC53F", 2048: "#EDC22E",
-            4096: "#3D3A32", 8192: "#2E3A32", 16384: "#1F3A32"
-        }
-        return colors.get(value, "#CDC1B4")
+        return TILE_COLORS.get(value, "#CDC1B4")
+
+    def is_computer_playing(self) -> bool:
+        return self.computer_worker is not None and self.computer_worker.is_alive()
+
+    def set_game_entries_state(self, state: str):
+        """
+        Enables or disables the menu entries that read the game or the statistics
+        Parameters:
+            state (str): tk.NORMAL or tk.DISABLED
+        Returns:
+            None
+        """
+        for menu, label in self.game_entries:
+            menu.entryconfig(label, state=state)
 
     def make_computer_move(self):
-        self.game.make_computer_move()
+        if self.is_computer_playing():
+            return
+        self.game.make_computer_move(show=False)
         self.update_grid()
 
     def play_computer_game(self):
         """
         Helper function for letting the computer play the game until its over
         Algorith described in Game class
+        The moves are made on a worker thread, so the window stays responsive, and the board is redrawn at the frame rate
         Returns:
             None
         """
-        while self.game.board.is_there_move_possible():
-            direction = self.game.board.get_direction_with_highest_empty_tiles()
-            if self.game.board.make_move(direction):
-                if self.game.board.is_there_empty_tile():
-                    self.game.board.generate_new_tile()
-                self.update_grid()
+        if self.is_computer_playing():
+            return
+        self.computer_frames = queue.Queue()
+        self.computer_resumed.set()
+        self.computer_cancelled.clear()
+        self.computer_worker = threading.Thread(target=self.computer_game_worker, args=(self.game, self.computer_frames),
+                                                daemon=True)
+        self.computer_worker.start()
+        self.set_game_entries_state(tk.DISABLED)
+        self.root.after(1000 // self.frame_rate, self.poll_computer_game, self.computer_frames)
+
+    def computer_game_worker(self, game: Game, frames: queue.Queue):
+        """
+        Plays the computer game on the worker thread and puts a snapshot of the tiles into the queue after every move
+        None is put into the queue when the game is over or cancelled
+        Parameters:
+            game (Game): the game to play
+            frames (queue.Queue): the queue read by the interface
+        Returns:
+            None
+        """
+        try:
+            while not self.computer_cancelled.is_set():
+                self.computer_resumed.wait()
+                if self.computer_cancelled.is_set() or not game.make_computer_move(show=False):
+                    break
+                frames.put([row[:] for row in game.board.tiles])
+        finally:
+            frames.put(None)
+
+    def poll_computer_game(self, frames: queue.Queue):
+        """
+        Shows the newest board sent by the worker, the boards sent since the last frame are skipped
+        Polls again after a frame until the worker is done
+        Parameters:
+            frames (queue.Queue): the queue of the computer game being shown
+        Returns:
+            None
+        """
+        #the computer game was cancelled and maybe a new one started
+        if frames is not self.computer_frames:
+            return
+        tiles = None
+        finished = False
+        try:
+            while True:
+                frame = frames.get_nowait()
+                if frame is None:
+                    finished = True
+                else:
+                    tiles = frame
+        except queue.Empty:
+            pass
+        if tiles is not None and len(tiles) == self.size:
+            self.update_grid(tiles)
+        if finished:
+            self.computer_worker = None
+            self.set_game_entries_state(tk.NORMAL)
+            if self.game.board.is_goal_reached():
+                self.root.title("2048 Game - Goal Reached!")
+        else:
+            self.root.after(1000 // self.frame_rate, self.poll_computer_game, frames)
+
+    def pause_computer_game(self):
+        self.computer_resumed.clear()
+
+    def resume_computer_game(self):
+        self.computer_resumed.set()
+
+    def cancel_computer_game(self):
+        """
+        Stops the computer game and waits for the worker to finish its current move
+        Returns:
+            None
+        """
+        if self.computer_worker is not None:
+            self.computer_cancelled.set()
+            self.computer_resumed.set()
+            self.computer_worker.join()
+            self.computer_worker = None
+            self.set_game_entries_state(tk.NORMAL)
+            self.computer_frames = queue.Queue()
+            self.update_grid()
 
     def handle_keypress(self, event: tk.Event):
         """
-        Helper function for handling wsad key presses and moves
+        Helper function for handling wsad key presses and moves, u and r undo and redo the last move
         Bound when a game is in progress, if the game is over, unbound
         Parameters:
             event (tkinter.Event): The event to which we want to bind the function
@@ -230,7 +500,14 @@ class GUI:
             None
         """
         key = event.keysym
-        if key in ['w', 's', 'a', 'd']:
+        #the board belongs to the worker during a computer game
+        if self.is_computer_playing():
+            return
+        if key == 'u':
+            self.undo()
+        elif key == 'r':
+            self.redo()
+        elif key in ['w', 's', 'a', 'd']:
             direction = {
                 'w': Direction.UP,
                 's': Direction.DOWN,
@@ -240,11 +517,12 @@ class GUI:
             if not self.game.board.is_there_move_possible():
                 messagebox.showinfo("Game Over", "No more moves possible. Game over!")
                 self.root.unbind("<Key>")
-            if self.game.board.make_move(direction):
-                self.update_grid()
+            if self.game.make_move(direction):
                 if self.game.board.is_goal_reached():
                     self.root.title("2048 Game - Goal Reached!")
-                else:
-                    if self.game.board.is_there_empty_tile():
-                        self.game.board.generate_new_tile()
-                    self.update_grid()
+                elif self.game.board.is_there_empty_tile():
+                    self.game.generate_new_tile()
+                self.update_grid()
+
+
+PROFILER.track(GUI, 'update_grid', 'render')
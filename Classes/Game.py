@@ -2,28 +2,79 @@
 A class that represents a game of 2048 with custom size and goal.
 """
 from Classes.Board import *
+from Classes.Expectimax import *
+from Classes.Journal import *
+from Classes.ParallelSearch import *
+from Classes.SaveArchive import *
+from Classes.Leaderboard import *
+from Classes.Replay import *
+from Classes.Tablebase import *
 import os.path
+import random
+import sqlite3
 import time
 import tkinter as tk
 
+#computer players that can be chosen for computer moves, None is the greedy highest empty tiles move
+#every player is created with an optional evaluator of the positions
+STRATEGIES = {
+    'greedy': lambda evaluator=None: None,
+    'expectimax': lambda evaluator=None: ExpectimaxPlayer(evaluator=evaluator),
+    'anytime': lambda evaluator=None: AnytimePlayer(evaluator=evaluator),
+    'parallel': lambda evaluator=None: ParallelExpectimaxPlayer(evaluator=evaluator)
+}
+
 
 class Game:
-    def __init__(self, size=4, goal=2048):
+    def __init__(self, size=4, goal=2048, engine=Board, strategy=None, seed=None, two_probability=0.7):
         """
         Initializes an instance of a game with a board of the given size and goal
         By default the size is 4 and the goal is 2048
         Parameters:
             optional size (int): The size of the board
             optional goal (int): The goal as in the tile that player aims to achieve
+            optional engine (type): The board class used for the game, Board, BitBoard for 4x4 boards or SparseBoard for big boards,
+                                    a BitBoard game moves onto a Board once it would make a tile over 32768
+            optional strategy: The computer player, an object with a get_direction(board) method, greedy if None
+            optional seed (int): Seed of the random stream of the game, every new board gets its seed from it
+            optional two_probability (float): Probability that a new tile is 2 rather than 4
         Returns:
             None
         """
-        self.board = Board(size, goal)
+        self.engine = engine
+        self.strategy = strategy
+        self.random = random.Random(seed)
+        self.two_probability = two_probability
+        self.archive_path = 'Saves/archive.dat'
+        self.archive = None
+        self.leaderboard_path = 'Scores/leaderboard.db'
+        self.leaderboard = None
+        self.recorder = None
+        self.tablebase_dir = TABLEBASE_DIR
+        self.weights_dir = WEIGHTS_DIR
+        #path of the tablebase looked up last and the opened tablebase, None if there is no file
+        self.tablebase_path = None
+        self.tablebase = None
+        #undo/redo history of the board, made for the current board on the first move
+        self.journal = None
+        self.undo_budget = JOURNAL_BUDGET
+        self.board = self.new_board(size, goal)
+
+    def new_board(self, size: int, goal: int) -> Board:
+        """
+        Creates a board of the game engine seeded from the random stream of the game
+        Parameters:
+            size (int): The size of the board
+            goal (int): The goal as in the tile that player aims to achieve
+        Returns:
+            Board: the new board
+        """
+        return self.engine(size, goal, self.random.getrandbits(64), self.two_probability)
 
     def save_file(self, file_name=None) -> bool:
         file_saved = False
         """
-        Saves the current state of the board into a file with a given name
+        Saves the current state of the board into a binary save file with a given name
         Only saves the game if the save file name is not already in use
         Parameters:
             file_name (str): the name of the file to save
@@ -32,15 +83,18 @@ class Game:
         """
         if file_name is None:
             file_name = input('Enter save file name: ')
-        file_path = f'Saves/{file_name}.txt'
-        if os.path.isfile(file_path):
+        file_path = f'Saves/{file_name}.bin'
+        if os.path.isfile(file_path) or os.path.isfile(f'Saves/{file_name}.txt'):
             print('such file save already exists, choose a different name')
         else:
             try:
-                with open(file_path, 'w') as fSave:
-                    fSave.write(f'{self.board.size} {self.board.goal}\n')
-                    string_tiles = [' '.join([str(tile) for tile in row]) for row in self.board.tiles]
-                    fSave.write('\n'.join(string_tiles))
+                save = encode_save(self.board.size, self.board.goal, self.board.tiles)
+            except WrongBoardSizeError as e:
+                print(e)
+                return False
+            try:
+                with open(file_path, 'wb') as fSave:
+                    fSave.write(save)
                 print('file saved')
                 file_saved = True
             except (FileNotFoundError, PermissionError, OSError):
@@ -55,6 +109,7 @@ class Game:
     def load_file(self, file_name=None) -> bool:
         """
         Loads the state of the board from a file with a given name
+        Binary saves are read first, text saves of older versions are still loaded
         If no name is given, name is read from the CLI user input
         Parameters:
             file_name (str): the of the file to load
@@ -63,70 +118,152 @@ class Game:
         """
         if file_name is None:
             file_name = input('Enter save file name: ')
-        file_path = f'Saves/{file_name}.txt'
-        if not os.path.isfile(file_path):
+        file_path = f'Saves/{file_name}.bin'
+        text_file_path = f'Saves/{file_name}.txt'
+        if os.path.isfile(file_path):
+            try:
+                with open(file_path, 'rb') as fSave:
+                    self.set_board_state(*decode_save(fSave.read()))
+                return True
+            except (WrongSaveFormatError, WrongBoardSizeError, FileNotFoundError, PermissionError, OSError):
+                print('error loading save file')
+                return False
+        elif not os.path.isfile(text_file_path):
             print('no such a save file')
             return False
         else:
-            with open(file_path, 'r') as fSave:
+            with open(text_file_path, 'r') as fSave:
                 try:
                     game_info = fSave.readline().strip().split(' ')
-                    self.board.size = int(game_info[0])
-                    self.board.goal = int(game_info[1])
                     tiles = [[int(tile) for tile in row.split(' ')] for row in fSave.read().split('\n')]
-                    self.board.tiles = tiles
+                    self.set_board_state(int(game_info[0]), int(game_info[1]), tiles)
                     return True
-                except (ValueError, FileNotFoundError, PermissionError, OSError):
+                except (ValueError, WrongBoardSizeError, FileNotFoundError, PermissionError, OSError):
                     print('error loading save file')
                     return False
 
+    def set_board_state(self, size: int, goal: int, tiles: list[list[int]]):
+        """
+        Puts a loaded state into the board
+        Parameters:
+            size (int): The size of the board
+            goal (int): The goal of the board
+            tiles (list[list[int]]): the tiles of the board
+        Returns:
+            None
+        Raises:
+            WrongBoardSizeError: if the board engine does not support the size
+        """
+        #the replay can't follow a jump to another state
+        self.stop_replay()
+        #tiles first, engines with a fixed size refuse other sizes
+        self.board.tiles = tiles
+        self.board.size = size
+        self.board.goal = goal
+        #the history of the board before the jump can't be undone into the new state
+        self.journal = None
+
+    def get_archive(self) -> SaveArchive:
+        """
+        Gets the save archive of the game, opening it on first use
+        Returns:
+            SaveArchive: the archive at archive_path
+        """
+        if self.archive is None or self.archive.path != self.archive_path:
+            self.archive = SaveArchive(self.archive_path)
+        return self.archive
+
+    def save_to_archive(self, name=None) -> bool:
+        """
+        Appends the current state of the board to the save archive under the given name
+        A later save under the same name replaces the earlier one
+        If no name is given, name is read from the CLI user input
+        Parameters:
+            name (str): the name of the save
+        Returns:
+            bool: True if the state was saved, False otherwise
+        """
+        if name is None:
+            name = input('Enter archive save name: ')
+        try:
+            self.get_archive().save(name, self.board.size, self.board.goal, self.board.tiles)
+            return True
+        except WrongBoardSizeError as e:
+            print(e)
+            return False
+        except (PermissionError, OSError):
+            print('error saving to the archive')
+            return False
+
+    def load_from_archive(self, name=None) -> bool:
+        """
+        Loads the state of the board from the save archive
+        If no name is given, name is read from the CLI user input
+        Parameters:
+            name (str): the name of the save
+        Returns:
+            bool: True if the state was loaded, False otherwise
+        """
+        if name is None:
+            name = input('Enter archive save name: ')
+        archive = self.get_archive()
+        if name not in archive:
+            print('no such a save in the archive')
+            return False
+        try:
+            self.set_board_state(*archive.load(name))
+            return True
+        except (WrongSaveFormatError, WrongBoardSizeError, OSError):
+            print('error loading from the archive')
+            return False
+
+    def get_leaderboard_store(self) -> Leaderboard:
+        """
+        Gets the persistent leaderboard, opening it on first use
+        Returns:
+            Leaderboard: the leaderboard at leaderboard_path
+        """
+        if self.leaderboard is None:
+            self.leaderboard = Leaderboard(self.leaderboard_path)
+        return self.leaderboard
+
     def save_score(self, file_name=None) -> bool:
         """
-        Saves the current score to the file with the given name
+        Saves the current score to the leaderboard under the given name
         If no name is given, name is read from the CLI user input
         Parameters:
-            file_name (str): the name of the score file
+            file_name (str): the name of the score
         Returns:
             bool: True if the score was saved, False otherwise
         """
         if file_name is None:
             file_name = input('Enter score file name: ')
-        file_path = f'Scores/{file_name}.txt'
-        if os.path.isfile(file_path):
-            print('such score name already exists, choose a different name')
-            return False
-        else:
-            try:
-                with open(file_path, 'w') as fSave:
-                    fSave.write(f'{file_name} {self.board.get_score_on_board()}')
-                    print('score saved')
-                    return True
-            except (FileNotFoundError, PermissionError, OSError):
-                try:
-                    os.remove(file_path)
-                except OSError:
-                    pass
-                print('error saving the score')
+        try:
+            leaderboard = self.get_leaderboard_store()
+            score = self.board.get_score_on_board()
+            if not leaderboard.add_score(file_name, score):
+                print('such score name already exists, choose a different name')
                 return False
+            print(f'score saved, rank {leaderboard.get_rank(score)}')
+            return True
+        except (sqlite3.Error, PermissionError, OSError):
+            print('error saving the score')
+            return False
 
-    def get_leaderboard(self) -> list[tuple[str, int]]:
+    def get_leaderboard(self, limit=None) -> list[tuple[str, int]]:
         """
-        Gets the leaderboard from the saved score files and returns them in a list sorted from high score to low
+        Gets the leaderboard sorted from high score to low
         In case of an error returns an empty list
+        Parameters:
+            optional limit (int): the number of top scores, all of them if None
         Returns:
             list[tuple[str, int]]: sorted list of tuples in which first element is the name of the score and the second is the score
         """
-        score_dict = {}
-        for file in os.listdir('Scores'):
-            try:
-                if file.endswith('.txt'):
-                    file_path = f'Scores/{file}'
-                    with open(file_path, 'r') as fScore:
-                        score_line = fScore.readline().split(' ')
-                        score_dict[score_line[0]] = int(score_line[1])
-            except (IndexError, FileNotFoundError, PermissionError, OSError):
-                print(f"error reading the score from file {file}")
-        return sorted(score_dict.items(), key=lambda item: item[1], reverse=True)
+        try:
+            return self.get_leaderboard_store().get_top(limit)
+        except (sqlite3.Error, PermissionError, OSError):
+            print('error reading the leaderboard')
+            return []
 
     def print_leaderboard(self):
         """
@@ -139,29 +276,264 @@ class Game:
         for score in leaderboard:
             print(f'{score[0]} - scored {score[1]}')
 
-    def make_computer_move(self):
+    def set_strategy(self, name=None) -> bool:
         """
-        Make a single computer move if possible
-        Computer moves are based on a simple greedy algorithm that makes the possible move with the highest amount of empty tiles
+        Selects the computer player used for computer moves by its name in STRATEGIES
+        If no name is given, name is read from the CLI user input
+        The player evaluates positions with the tuned weights of the board configuration, if there are any
+        Parameters:
+            name (str): the name of the strategy
+        Returns:
+            bool: True if the strategy was selected, False otherwise
+        """
+        if name is None:
+            name = input(f'Enter computer strategy ({"/".join(STRATEGIES)}): ').strip().lower()
+        if name not in STRATEGIES:
+            print('no such strategy')
+            return False
+        self.strategy = STRATEGIES[name](evaluator=self.get_evaluator())
+        return True
+
+    def get_evaluator(self) -> Evaluator:
+        """
+        Loads the weights tuned for the size and goal of the board, written by the Tuner
+        Returns:
+            Evaluator: evaluator with the tuned weights, None if there are no readable weights for the configuration
+        """
+        path = get_weights_path(self.board.size, self.board.goal, self.weights_dir)
+        if not os.path.isfile(path):
+            return None
+        try:
+            return Evaluator.load(path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            print(f'error reading the weights {path}')
+            return None
+
+    def get_tablebase(self) -> Tablebase:
+        """
+        Gets the tablebase solved for the size and goal of the board, opened once and kept while the configuration is the same
+        Returns:
+            Tablebase: the tablebase, None if there is no readable file for the configuration
+        """
+        path = get_tablebase_path(self.board.size, self.board.goal, self.tablebase_dir)
+        if path != self.tablebase_path:
+            if self.tablebase is not None:
+                self.tablebase.close()
+                self.tablebase = None
+            self.tablebase_path = path
+            if os.path.isfile(path):
+                try:
+                    self.tablebase = Tablebase(path)
+                except (WrongSaveFormatError, OSError, ValueError):
+                    print(f'error reading the tablebase {path}')
+        return self.tablebase
+
+    def get_computer_direction(self) -> Direction:
+        """
+        Gets the direction of the next computer move from the selected strategy
+        Boards solved in a tablebase are played perfectly from it instead
+        Without a strategy the greedy move with the highest amount of empty tiles is used
+        Returns:
+            Direction: Direction of the computer move
+        """
+        try:
+            tablebase = self.get_tablebase()
+            if tablebase is not None:
+                direction = tablebase.get_direction(self.board)
+                if direction is not None:
+                    return direction
+            if self.strategy is None:
+                return self.board.get_direction_with_highest_empty_tiles()
+            return self.strategy.get_direction(self.board)
+        except TileOverflowError:
+            self.fall_back_to_board()
+            return self.get_computer_direction()
+
+    def fall_back_to_board(self):
+        """
+        Moves the game onto a Board with the same tiles, random stream and undo history,
+        used when the engine of the game can't hold the next tile
+        Returns:
+            None
+        """
+        board = Board(self.board.size, self.board.goal, self.board.seed, self.board.two_probability)
+        board.tiles = [list(row) for row in self.board.tiles]
+        board.set_random_state(*self.board.get_random_state())
+        self.engine = Board
+        if self.journal is not None and self.journal.board is self.board:
+            self.journal.board = board
+        self.board = board
+
+    def get_legal_moves(self) -> dict:
+        """
+        Gets the legal moves of the board, the game moves onto a Board first if its engine can't hold a merged tile
+        Returns:
+            dict: board after the move by Direction, only for legal moves
+        """
+        try:
+            return self.board.get_legal_moves()
+        except TileOverflowError:
+            self.fall_back_to_board()
+            return self.board.get_legal_moves()
+
+    def get_journal(self) -> Journal:
+        """
+        Gets the undo/redo journal of the board, a board that was replaced gets a new empty journal
+        Returns:
+            Journal: the journal of the current board
+        """
+        if self.journal is None or self.journal.board is not self.board:
+            self.journal = Journal(self.board, self.undo_budget)
+        return self.journal
+
+    def make_move(self, direction: Direction) -> bool:
+        """
+        Makes a move on the board and records it in the undo journal and in the replay, if one is being recorded
+        Parameters:
+            direction (Direction): Direction of the move to be made
+        Returns:
+            bool: True if the move was valid and made, False otherwise
+        """
+        if self.recorder is not None:
+            self.recorder.start_turn(self.board)
+        journal = self.get_journal()
+        journal.begin()
+        try:
+            move_made = self.board.make_move(direction)
+        except TileOverflowError:
+            self.fall_back_to_board()
+            move_made = self.board.make_move(direction)
+        if move_made:
+            journal.commit()
+            if self.recorder is not None:
+                self.recorder.record_move(direction)
+        return move_made
+
+    def generate_new_tile(self):
+        """
+        Generates a new tile on the board and records it in the replay, if one is being recorded
+        The tile is added to the last move in the undo journal, so undoing the move also takes it back
+        Returns:
+            (int, int, int): coordinates and value of the new tile
+        """
+        (x, y, value) = self.board.generate_new_tile()
+        self.get_journal().record_spawn(x, y, value)
+        if self.recorder is not None:
+            self.recorder.record_spawn(x, y, value)
+        return x, y, value
+
+    def undo(self) -> bool:
+        """
+        Takes back the last move and the tile that spawned after it
+        Returns:
+            bool: True if a move was undone, False if there is nothing to undo
+        """
+        journal = self.get_journal()
+        if not journal.can_undo():
+            return False
+        #the replay can't follow a jump back
+        self.stop_replay()
+        return journal.undo()
+
+    def redo(self) -> bool:
+        """
+        Makes again the last undone move with the same new tile
+        Returns:
+            bool: True if a move was redone, False if there is nothing to redo
+        """
+        journal = self.get_journal()
+        if not journal.can_redo():
+            return False
+        self.stop_replay()
+        return journal.redo()
+
+    def start_replay(self, name=None, keyframe_interval=256) -> bool:
+        """
+        Starts recording the moves of the current board into the replay file with the given name
+        If no name is given, name is read from the CLI user input
+        Parameters:
+            name (str): the name of the replay file
+            optional keyframe_interval (int): number of moves between keyframes
+        Returns:
+            bool: True if the recording started, False otherwise
+        """
+        if name is None:
+            name = input('Enter replay name: ')
+        self.stop_replay()
+        try:
+            os.makedirs('Replays', exist_ok=True)
+            self.recorder = ReplayWriter(f'Replays/{name}.rpl', self.board, keyframe_interval)
+            return True
+        except WrongBoardSizeError as e:
+            print(e)
+            return False
+        except (PermissionError, OSError):
+            print('error creating the replay file')
+            return False
+
+    def stop_replay(self):
+        """
+        Stops recording the replay and writes the rest of it
         Returns:
             None
         """
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def make_computer_move(self, show=True) -> bool:
+        """
+        Make a single computer move if possible
+        Computer moves are chosen by the selected strategy, the simple greedy algorithm by default
+        Parameters:
+            optional show (bool): print the board after the move
+        Returns:
+            bool: True if a move was made, False otherwise
+        """
         if self.board.is_there_move_possible():
-            direction = self.board.get_direction_with_highest_empty_tiles()
-            if self.board.make_move(direction):
+            direction = self.get_computer_direction()
+            if self.make_move(direction):
                 if self.board.is_there_empty_tile():
-                    self.board.generate_new_tile()
-                self.board.print_board()
-    def play_game_computer(self):
+                    self.generate_new_tile()
+                if show:
+                    self.board.print_board()
+                    #players searching under a deadline tell how far they got
+                    if hasattr(self.strategy, 'get_report'):
+                        print(self.strategy.get_report())
+                return True
+        return False
+
+    def play_game_computer(self, delay=0.2, show=True) -> int:
         """
         Lets the computer play the game until its over
-        Computer moves are based on a simple greedy algorithm that makes the possible move with the highest amount of empty tiles
+        Computer moves are chosen by the selected strategy, the simple greedy algorithm by default
+        Parameters:
+            optional delay (float): seconds to wait before every move
+            optional show (bool): print the board after every move
         Returns:
-            None
+            int: the number of moves made
         """
+        moves = 0
         while self.board.is_there_move_possible():
-            time.sleep(0.2)
-            self.make_computer_move()
+            if delay:
+                time.sleep(delay)
+            if self.make_computer_move(show):
+                moves += 1
+        return moves
+
+    @staticmethod
+    def toggle_profiling():
+        """
+        Turns the profiling of moves, spawns, computer moves, renders and save/load on or off
+        Returns:
+            None
+        """
+        if PROFILER.enabled:
+            PROFILER.disable()
+            print('profiling disabled')
+        else:
+            PROFILER.enable()
+            print('profiling enabled')
 
     def display_main_menu(self):
         """
@@ -170,6 +542,9 @@ class Game:
             game - new game
             load - load file
             comp - play computer
+            strategy - choose the computer strategy
+            profile - turn profiling on or off
+            stats - display the profiling statistics
             q - quit the application
             leaderboard - display the leaderboard
         Returns:
@@ -177,9 +552,15 @@ class Game:
         """
         while True:
             move = input(
-                "Enter game to play a new game or leaderboard to display the leaderboard or load to load a file or comp for computer game or q to quit: ").strip().lower()
+                "Enter game to play a new game or leaderboard to display the leaderboard or load to load a file or comp for computer game or strategy to choose the computer strategy or profile to turn profiling on or off or stats for profiling statistics or q to quit: ").strip().lower()
             if move == 'game':
                 self.handle_console_game()
+            elif move == 'strategy':
+                self.set_strategy()
+            elif move == 'profile':
+                self.toggle_profiling()
+            elif move == 'stats':
+                print(PROFILER.get_report())
             elif move == 'leaderboard':
                 self.print_leaderboard()
             elif move == 'save':
@@ -201,6 +582,10 @@ class Game:
             save for saving current state of the board
             score for saving current score
             comp for initializing ai completing the game
+            strategy for choosing the computer strategy
+            replay for recording a replay of the game
+            u for undoing the last move and r for redoing it
+            stats for showing the profiling statistics
             leaderboard for showing the leaderboard
         Returns:
             None
@@ -211,7 +596,8 @@ class Game:
                 size = input("Enter size of the board: ")
                 goal = input("Enter goal: ")
                 if str.isdigit(size) and str.isdigit(goal):
-                    self.board = Board(int(size), int(goal))
+                    self.stop_replay()
+                    self.board = self.new_board(int(size), int(goal))
                     valid_size_and_goal = True
             except WrongGoalError as e:
                 print(e)
@@ -220,12 +606,25 @@ class Game:
         self.board.print_board()
         while True:
             self.board.print_board()
-            move = input("Enter move (w/a/s/d for up/left/down/right or q to quit or save to save or load to load or score to save score or comp for computer game): ").strip().lower()
+            move = input("Enter move (w/a/s/d for up/left/down/right or u/r to undo/redo or q to quit or save to save or load to load or score to save score or comp for computer game or strategy to choose the computer strategy or replay to record a replay or stats for profiling statistics): ").strip().lower()
             if move == 'comp':
                 self.play_game_computer()
             if move == 'q':
                 print("Quit chosen")
+                self.stop_replay()
                 break
+            elif move == 'strategy':
+                self.set_strategy()
+            elif move == 'replay':
+                self.start_replay()
+            elif move == 'u':
+                if not self.undo():
+                    print("nothing to undo")
+            elif move == 'r':
+                if not self.redo():
+                    print("nothing to redo")
+            elif move == 'stats':
+                print(PROFILER.get_report())
             elif move == 'leaderboard':
                 self.print_leaderboard()
             elif move == 'save':
@@ -237,12 +636,13 @@ class Game:
             elif move in ['w', 'a', 's', 'd']:
                 direction = {'w': Direction.UP, 'a': Direction.LEFT, 's': Direction.DOWN, 'd': Direction.RIGHT}[
                     move]
-                self.board.make_move(direction)
+                move_made = self.make_move(direction)
                 print(self.board.get_direction_with_highest_empty_tiles())
-                if self.board.is_there_empty_tile():
-                    self.board.generate_new_tile()
+                if move_made and self.board.is_there_empty_tile():
+                    self.generate_new_tile()
                 if not self.board.is_there_move_possible():
                     print("No more moves possible. Game over!")
+                    self.stop_replay()
                     self.board.print_board()
                     while True:
                         should_save_score = input("Do you want to save score? y for yes n for no: ").strip().lower()
@@ -257,4 +657,13 @@ class Game:
 
                     break
             else:
-                print("Invalid input. Use w/a/s/d for direction or q to quit.")
+                print("Invalid input. Use w/a/s/d for direction, u/r to undo/redo or q to quit.")
+
+
+PROFILER.track(Game, 'make_move', 'move')
+PROFILER.track(Game, 'generate_new_tile', 'spawn')
+PROFILER.track(Game, 'get_computer_direction', 'ai_decision')
+PROFILER.track(Game, 'save_file', 'save')
+PROFILER.track(Game, 'save_to_archive', 'save')
+PROFILER.track(Game, 'load_file', 'load')
+PROFILER.track(Game, 'load_from_archive', 'load')
@@ -0,0 +1,335 @@
+"""
+An undo/redo journal of the moves of a board of 2048 that keeps what every move changed instead of copies of the board.
+A step of the journal is the list of the cells it changed, every change packed as the cell, its old and its new exponent,
+the spawn after a move is added to the step of the move, so one undo takes back the move and its tile.
+Every few steps also keep a checkpoint of the whole board from before them. When the journal grows over its memory budget,
+the oldest steps between two checkpoints are collapsed into a single span from one checkpoint to the next,
+and once only spans are left the oldest history is dropped.
+Search code can use make_move, place_tile and unmake on a journal without checkpoints instead of copying the board.
+"""
+import struct
+from Classes.Board import *
+
+#cell, old exponent and new exponent of a changed tile, bigger boards need wider cell indices
+CHANGE = struct.Struct('<HBB')
+LARGE_CHANGE = struct.Struct('<IBB')
+#rough size of the objects of an entry besides its bytes, counted against the budget
+ENTRY_BYTES = 64
+#default memory budget of a journal in bytes
+JOURNAL_BUDGET = 1 << 20
+
+
+class Step:
+    __slots__ = ('changes', 'checkpoint')
+
+    def __init__(self, changes: bytes, checkpoint=None):
+        """
+        Parameters:
+            changes (bytes): the packed changes of the step
+            optional checkpoint (bytes): exponents of the board before the step, None if the step has no checkpoint
+        Returns:
+            None
+        """
+        self.changes = changes
+        self.checkpoint = checkpoint
+
+    def get_bytes(self) -> int:
+        return ENTRY_BYTES + len(self.changes) + (len(self.checkpoint) if self.checkpoint is not None else 0)
+
+
+class Span:
+    __slots__ = ('before', 'after')
+
+    def __init__(self, before: bytes, after: bytes):
+        """
+        Parameters:
+            before (bytes): exponents of the board before the collapsed steps
+            after (bytes): exponents of the board after them, shared with the checkpoint of the next step
+        Returns:
+            None
+        """
+        self.before = before
+        self.after = after
+
+    def get_bytes(self) -> int:
+        #the after bytes are counted by the checkpoint they are shared with
+        return ENTRY_BYTES + len(self.before)
+
+
+class Journal:
+    def __init__(self, board: Board, budget=JOURNAL_BUDGET, checkpoint_interval=32):
+        """
+        Initializes an empty journal of the moves of a board
+        Parameters:
+            board (Board): the board whose changes are recorded, of any engine with get_exponents and set_exponent
+            optional budget (int): the memory budget of the history in bytes, unbounded if None
+            optional checkpoint_interval (int): number of steps between two checkpoints, no checkpoints if None
+        Returns:
+            None
+        """
+        self.board = board
+        self.budget = budget
+        self.checkpoint_interval = checkpoint_interval
+        self.change = CHANGE if board.size * board.size <= 1 << 16 else LARGE_CHANGE
+        #entries before the cursor can be undone, entries after it redone
+        self.entries = []
+        self.cursor = 0
+        self.used = 0
+        #steps recorded from the last checkpoint on, None forces a checkpoint on the next step
+        self.since_checkpoint = None
+        self.before = None
+
+    def clear(self):
+        """
+        Forgets the whole history, used when the board jumps to another state
+        Returns:
+            None
+        """
+        self.entries = []
+        self.cursor = 0
+        self.used = 0
+        self.since_checkpoint = None
+        self.before = None
+
+    def can_undo(self) -> bool:
+        return self.cursor > 0
+
+    def can_redo(self) -> bool:
+        return self.cursor < len(self.entries)
+
+    def begin(self):
+        """
+        Remembers the exponents of the board before a change, the change is recorded by commit
+        Returns:
+            None
+        """
+        self.before = self.board.get_exponents()
+
+    def commit(self, extend=False) -> bool:
+        """
+        Records the cells changed since begin as a new step, the steps that could be redone are dropped
+        Parameters:
+            optional extend (bool): add the changes to the newest step instead, like the spawn after a move
+        Returns:
+            bool: True if any cell changed
+        """
+        before = self.before
+        self.before = None
+        after = self.board.get_exponents()
+        size = self.board.size
+        pack = self.change.pack
+        changes = []
+        #compare whole rows first, most rows are not changed by a move
+        for start in range(0, len(after), size):
+            end = start + size
+            if before[start:end] != after[start:end]:
+                for cell in range(start, end):
+                    if before[cell] != after[cell]:
+                        changes.append(pack(cell, before[cell], after[cell]))
+        if not changes:
+            return False
+        self.record(b''.join(changes), before, extend)
+        return True
+
+    def record_spawn(self, x: int, y: int, value: int):
+        """
+        Adds a new tile that spawned into an empty cell to the newest step
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+            value (int): value of the tile
+        Returns:
+            None
+        """
+        self.record(self.change.pack(x * self.board.size + y, 0, get_exponent(value)), None, True)
+
+    def record(self, changes: bytes, before, extend: bool):
+        """
+        Adds packed changes to the journal and collapses the old history if it is over the budget
+        Parameters:
+            changes (bytes): the packed changes
+            before (bytes): exponents of the board before the changes, read from the board if needed and None
+            extend (bool): add the changes to the newest step if there is one that can be extended
+        Returns:
+            None
+        """
+        if self.cursor < len(self.entries):
+            self.truncate()
+            self.add_step(changes, before)
+        elif extend and self.entries:
+            #only steps come after the cursor-side spans, the newest entry is a step
+            self.entries[-1].changes += changes
+            self.used += len(changes)
+        elif extend:
+            #tiles that spawn before the first move are part of the starting position
+            return
+        else:
+            self.add_step(changes, before)
+        if self.budget is not None and self.used > self.budget:
+            self.trim()
+
+    def add_step(self, changes: bytes, before):
+        """
+        Appends a new step, with a checkpoint if it is due
+        Parameters:
+            changes (bytes): the packed changes
+            before (bytes): exponents of the board before the changes, read from the board if needed and None
+        Returns:
+            None
+        """
+        checkpoint = None
+        if self.checkpoint_interval is not None and (self.since_checkpoint is None
+                                                     or self.since_checkpoint >= self.checkpoint_interval):
+            if before is None:
+                #the changes are already on the board
+                before = bytearray(self.board.get_exponents())
+                for cell, old, _ in reversed(list(self.change.iter_unpack(changes))):
+                    before[cell] = old
+            checkpoint = bytes(before)
+            self.since_checkpoint = 1
+        elif self.since_checkpoint is not None:
+            self.since_checkpoint += 1
+        step = Step(changes, checkpoint)
+        self.entries.append(step)
+        self.cursor += 1
+        self.used += step.get_bytes()
+
+    def truncate(self):
+        """
+        Drops the entries after the cursor, a new change makes them impossible to redo
+        Returns:
+            None
+        """
+        for entry in self.entries[self.cursor:]:
+            self.used -= entry.get_bytes()
+        del self.entries[self.cursor:]
+        if self.checkpoint_interval is None:
+            return
+        #the steps after the newest checkpoint count towards the next one
+        self.since_checkpoint = None
+        for count, entry in enumerate(reversed(self.entries)):
+            if isinstance(entry, Span):
+                break
+            if entry.checkpoint is not None:
+                self.since_checkpoint = count + 1
+                break
+
+    def trim(self):
+        """
+        Collapses the oldest steps into spans between their checkpoints until the journal fits its budget,
+        then drops the oldest entries, the entries that can be redone are kept
+        Returns:
+            None
+        """
+        entries = self.entries
+        while self.used > self.budget and self.cursor > 0:
+            #spans are always the oldest entries, the first step after them is where collapsing goes on
+            first = 0
+            while first < len(entries) and isinstance(entries[first], Span):
+                first += 1
+            following = first + 1
+            while following < self.cursor and entries[following].checkpoint is None:
+                following += 1
+            if first < len(entries) and entries[first].checkpoint is not None and following < self.cursor:
+                span = Span(entries[first].checkpoint, entries[following].checkpoint)
+                for entry in entries[first:following]:
+                    self.used -= entry.get_bytes()
+                entries[first:following] = [span]
+                self.used += span.get_bytes()
+                self.cursor -= following - first - 1
+            else:
+                self.used -= entries[0].get_bytes()
+                del entries[0]
+                self.cursor -= 1
+            if not entries:
+                self.since_checkpoint = None
+
+    def apply(self, changes: bytes, undo: bool):
+        """
+        Puts the old or the new exponents of packed changes on the board
+        Parameters:
+            changes (bytes): the packed changes
+            undo (bool): put the old exponents, in the reverse order of the changes
+        Returns:
+            None
+        """
+        set_exponent = self.board.set_exponent
+        unpacked = list(self.change.iter_unpack(changes))
+        if undo:
+            for cell, old, _ in reversed(unpacked):
+                set_exponent(cell, old)
+        else:
+            for cell, _, new in unpacked:
+                set_exponent(cell, new)
+
+    def undo(self) -> bool:
+        """
+        Takes back the newest step, or jumps back over the newest span
+        Returns:
+            bool: True if something was undone, False if there is nothing to undo
+        """
+        if self.cursor == 0:
+            return False
+        self.cursor -= 1
+        entry = self.entries[self.cursor]
+        if isinstance(entry, Span):
+            self.board.set_exponents(bytearray(entry.before))
+        else:
+            self.apply(entry.changes, True)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Makes again the step or span after the cursor
+        Returns:
+            bool: True if something was redone, False if there is nothing to redo
+        """
+        if self.cursor == len(self.entries):
+            return False
+        entry = self.entries[self.cursor]
+        self.cursor += 1
+        if isinstance(entry, Span):
+            self.board.set_exponents(bytearray(entry.after))
+        else:
+            self.apply(entry.changes, False)
+        return True
+
+    def make_move(self, direction: Direction) -> bool:
+        """
+        Makes a move on the board as a step that unmake takes back, used by search code
+        Parameters:
+            direction (Direction): Direction of the move
+        Returns:
+            bool: True if the move changed the board and was recorded
+        """
+        self.begin()
+        if not self.board.make_move(direction):
+            self.before = None
+            return False
+        return self.commit()
+
+    def place_tile(self, x: int, y: int, value: int):
+        """
+        Sets a tile on the board as a step that unmake takes back, used by search code for the spawns
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+            value (int): value of the tile
+        Returns:
+            None
+        """
+        cell = x * self.board.size + y
+        old = get_exponent(self.board.get_tile(x, y))
+        self.board.set_tile(x, y, value)
+        self.record(self.change.pack(cell, old, get_exponent(value)), None, False)
+
+    def unmake(self) -> bool:
+        """
+        Takes back the newest step for good, it can't be redone
+        Returns:
+            bool: True if a step was taken back
+        """
+        if not self.undo():
+            return False
+        self.truncate()
+        return True
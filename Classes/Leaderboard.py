@@ -0,0 +1,102 @@
+"""
+A persistent leaderboard of a game of 2048 kept in a local SQLite file.
+Scores are indexed by value, so inserts, top-K and rank queries do not read the whole leaderboard.
+"""
+import os
+import sqlite3
+
+
+class Leaderboard:
+    def __init__(self, path='Scores/leaderboard.db', scores_dir='Scores'):
+        """
+        Opens the leaderboard at the given path, creating it if needed
+        When the leaderboard is created, the scores saved as text files in scores_dir are imported once
+        Parameters:
+            optional path (str): path of the SQLite file
+            optional scores_dir (str): directory with the text score files of older versions
+        Returns:
+            None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS scores (name TEXT PRIMARY KEY, score INTEGER NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS scores_by_score ON scores (score DESC)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        if self.connection.execute("SELECT 1 FROM meta WHERE key = 'text_scores_imported'").fetchone() is None:
+            self.import_text_scores(scores_dir)
+
+    def import_text_scores(self, scores_dir='Scores') -> int:
+        """
+        Imports the scores from the text score files of older versions, in the format 'name score'
+        Names that are already on the leaderboard are skipped
+        Parameters:
+            optional scores_dir (str): directory with the text score files
+        Returns:
+            int: number of imported scores
+        """
+        scores = []
+        if os.path.isdir(scores_dir):
+            for file in os.listdir(scores_dir):
+                try:
+                    if file.endswith('.txt'):
+                        with open(os.path.join(scores_dir, file), 'r') as fScore:
+                            score_line = fScore.readline().split(' ')
+                            scores.append((score_line[0], int(score_line[1])))
+                except (IndexError, ValueError, FileNotFoundError, PermissionError, OSError):
+                    print(f"error reading the score from file {file}")
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany('INSERT OR IGNORE INTO scores (name, score) VALUES (?, ?)', scores)
+            imported = self.connection.total_changes - before
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('text_scores_imported', '1')")
+        return imported
+
+    def add_score(self, name: str, score: int) -> bool:
+        """
+        Adds a score under the given name
+        Parameters:
+            name (str): the name of the score
+            score (int): the score
+        Returns:
+            bool: True if the score was added, False if the name is already in use
+        """
+        try:
+            with self.connection:
+                self.connection.execute('INSERT INTO scores (name, score) VALUES (?, ?)', (name, score))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def has_name(self, name: str) -> bool:
+        return self.connection.execute('SELECT 1 FROM scores WHERE name = ?', (name,)).fetchone() is not None
+
+    def get_top(self, limit=None) -> list[tuple[str, int]]:
+        """
+        Gets the highest scores sorted from high to low
+        Parameters:
+            optional limit (int): the number of scores, all of them if None
+        Returns:
+            list[tuple[str, int]]: tuples of the name and the score
+        """
+        return self.connection.execute('SELECT name, score FROM scores ORDER BY score DESC LIMIT ?',
+                                       (-1 if limit is None else limit,)).fetchall()
+
+    def get_rank(self, score: int) -> int:
+        """
+        Gets the place on the leaderboard the given score would take
+        Parameters:
+            score (int): the score
+        Returns:
+            int: the rank, 1 for the best score
+        """
+        return self.connection.execute('SELECT COUNT(*) FROM scores WHERE score > ?', (score,)).fetchone()[0] + 1
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
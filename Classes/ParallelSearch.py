@@ -0,0 +1,245 @@
+"""
+An expectimax computer player for the game of 2048 that splits its search across a persistent process pool.
+The root is split into one task for every possible move and every cell a tile can spawn into after it,
+and the workers search those subtrees with a transposition table in shared memory,
+so a position searched by one worker is reused by all the others and by the following moves.
+The shared table is a fixed array of slots indexed by the 64-bit canonical keys of the boards and written without locks,
+every slot stores its key xor-ed with its depth and value, so a slot torn by two writers is read as a miss.
+Usage: python -m Classes.ParallelSearch --depth 3 --workers 4 --moves 20
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import os
+import time
+from Classes.Expectimax import *
+
+#64-bit words per slot of the shared table: check, depth, value
+SLOT_WORDS = 3
+KEY_MASK = 0xFFFFFFFFFFFFFFFF
+
+#player and boards of a worker process, set up by init_worker
+_worker_player = None
+_worker_boards = {}
+
+
+class SharedTranspositionTable:
+    def __init__(self, slots=1 << 20, name=None):
+        """
+        Creates a table in new shared memory, or attaches to the shared memory of an existing table
+        Parameters:
+            optional slots (int): The number of entries of the table
+            optional name (str): name of the shared memory of an existing table, a new table is created if None
+        Returns:
+            None
+        """
+        self.slots = slots
+        self.owner = name is None
+        if self.owner:
+            self.memory = SharedMemory(create=True, size=slots * SLOT_WORDS * 8)
+            self.memory.buf[:] = bytes(len(self.memory.buf))
+        else:
+            self.memory = SharedMemory(name=name)
+        self.name = self.memory.name
+        #the same bytes read as integers and as floats, the value word is read both ways
+        self.words = self.memory.buf.cast('Q')
+        self.floats = self.memory.buf.cast('d')
+
+    def get(self, key: int, depth: int):
+        """
+        Gets the stored value of a position if it was searched at least as deep as requested
+        Parameters:
+            key (int): the 64-bit canonical key of the position
+            depth (int): the depth of the search that needs the value
+        Returns:
+            float: the stored value, None if there is no usable entry
+        """
+        slot = (key % self.slots) * SLOT_WORDS
+        words = self.words
+        check = words[slot]
+        stored_depth = words[slot + 1]
+        bits = words[slot + 2]
+        value = self.floats[slot + 2]
+        #a writer in between the reads leaves a check that does not match or a changed value word
+        if check ^ stored_depth ^ bits != key or stored_depth < depth or words[slot + 2] != bits:
+            return None
+        return value
+
+    def put(self, key: int, depth: int, value: float):
+        """
+        Stores the value of a position searched to the given depth, replacing the entry in its slot
+        Parameters:
+            key (int): the 64-bit canonical key of the position
+            depth (int): the depth of the search of the value
+            value (float): the value of the position
+        Returns:
+            None
+        """
+        slot = (key % self.slots) * SLOT_WORDS
+        words = self.words
+        self.floats[slot + 2] = value
+        words[slot + 1] = depth
+        words[slot] = key ^ depth ^ words[slot + 2]
+
+    def clear(self):
+        self.memory.buf[:] = bytes(len(self.memory.buf))
+
+    def close(self):
+        """
+        Detaches from the shared memory, the table that created it also frees it
+        Returns:
+            None
+        """
+        self.words.release()
+        self.floats.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def init_worker(table_name: str, slots: int, min_probability: float, weights: dict):
+    """
+    Sets up the player of a worker process on the shared table, runs once in every worker of the pool
+    Parameters:
+        table_name (str): name of the shared memory of the table
+        slots (int): The number of entries of the table
+        min_probability (float): Spawn sequences less likely than this are not searched further
+        weights (dict): weights of the evaluator
+    Returns:
+        None
+    """
+    global _worker_player
+    _worker_player = ExpectimaxPlayer(min_probability=min_probability, evaluator=Evaluator(weights))
+    _worker_player.table = SharedTranspositionTable(slots, table_name)
+
+
+def search_spawns(engine: type, size: int, goal: int, two_probability: float, tiles: list[list[int]],
+                  x: int, y: int, depth: int) -> float:
+    """
+    Searches the positions after a 2 and a 4 spawn into a cell of a board, runs inside a worker process
+    Parameters:
+        engine (type): the board class
+        size (int): The size of the board
+        goal (int): The goal of the board
+        two_probability (float): Probability that a new tile is 2 rather than 4
+        tiles (list[list[int]]): the tiles of the board after the move, before the spawn
+        x (int): row of the spawn
+        y (int): column of the spawn
+        depth (int): the number of player moves left to search after the spawn
+    Returns:
+        float: the sum of the values of the two spawns weighted by their probabilities
+    """
+    key = (engine, size, goal, two_probability)
+    board = _worker_boards.get(key)
+    if board is None:
+        board = _worker_boards[key] = engine(size, goal, 0, two_probability)
+    board.tiles = tiles
+    #the probability of the subtree is that of its spawn, as in ExpectimaxPlayer.chance_value
+    spawns = len(board.get_empty_tiles())
+    value = 0.0
+    for tile, tile_probability in ((2, two_probability), (4, 1 - two_probability)):
+        board.set_tile(x, y, tile)
+        value += tile_probability * _worker_player.max_value(board, depth, tile_probability / spawns)
+    return value
+
+
+class ParallelExpectimaxPlayer:
+    def __init__(self, depth=3, workers=None, table_slots=1 << 20, min_probability=0.0001, evaluator=None):
+        """
+        Initializes a player that searches on a process pool, the pool and the shared table are created on the first move
+        Parameters:
+            optional depth (int): The number of player moves searched ahead
+            optional workers (int): The number of worker processes, the number of cores if None
+            optional table_slots (int): The number of entries of the shared transposition table
+            optional min_probability (float): Spawn sequences less likely than this are not searched further
+            optional evaluator (Evaluator): The evaluation of the searched positions, default weights if None
+        Returns:
+            None
+        """
+        self.depth = depth
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.table_slots = table_slots
+        self.min_probability = min_probability
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.table = None
+        self.executor = None
+
+    def start(self):
+        """
+        Creates the shared table and starts the workers if they are not running
+        Returns:
+            None
+        """
+        if self.executor is not None:
+            return
+        self.table = SharedTranspositionTable(self.table_slots)
+        self.executor = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                            initargs=(self.table.name, self.table_slots, self.min_probability,
+                                                      self.evaluator.weights))
+
+    def get_direction(self, board: Board) -> Direction:
+        """
+        Gets the direction of the move with the highest expected value
+        The spawns after every move are searched by the workers, the evaluation of a shallow search stays in this process
+        Parameters:
+            board (Board): the board to move on, it is not changed
+        Returns:
+            Direction: Direction of the best move, None if no move is possible
+        """
+        moves = board.get_legal_moves()
+        if self.depth <= 1:
+            values = {direction: self.evaluator.evaluate(child) for direction, child in moves.items()}
+            return max(values, key=values.get) if values else None
+        self.start()
+        futures = {}
+        for direction, child in moves.items():
+            tiles = [row[:] for row in child.tiles]
+            futures[direction] = [self.executor.submit(search_spawns, type(board), board.size, board.goal,
+                                                       board.two_probability, tiles, x, y, self.depth - 1)
+                                  for (x, y) in child.get_empty_tiles()]
+        best_direction = None
+        best_value = None
+        for direction, spawns in futures.items():
+            value = sum(future.result() for future in spawns) / len(spawns)
+            if best_value is None or value > best_value:
+                best_direction, best_value = direction, value
+        return best_direction
+
+    def close(self):
+        """
+        Stops the workers and frees the shared table, a later move starts them again
+        Returns:
+            None
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def __del__(self):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the moves of the parallel search against the sequential one')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--moves', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    players = (('sequential', ExpectimaxPlayer(args.depth)), ('parallel', ParallelExpectimaxPlayer(args.depth, args.workers)))
+    for name, player in players:
+        board = Board(4, 2048, args.seed)
+        board.generate_new_tile()
+        board.generate_new_tile()
+        start = time.perf_counter()
+        moves = 0
+        while moves < args.moves and board.is_there_move_possible():
+            board.make_move(player.get_direction(board))
+            board.generate_new_tile()
+            moves += 1
+        elapsed = time.perf_counter() - start
+        print(f'{name}: {moves} moves, {elapsed / max(1, moves) * 1000:.1f} ms per move')
+    players[1][1].close()
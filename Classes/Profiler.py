@@ -0,0 +1,162 @@
+"""
+Opt-in instrumentation of the hot paths of the game of 2048.
+Modules register the methods to measure with PROFILER.track, and only while the profiler is enabled
+are those methods replaced by wrappers that count the calls and record their latency into histograms,
+so a disabled profiler costs nothing.
+"""
+import functools
+import json
+import time
+
+#latency histograms have a bucket per power of 2 nanoseconds
+HISTOGRAM_BUCKETS = 48
+
+
+class OperationStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, elapsed: int):
+        """
+        Records a single call
+        Parameters:
+            elapsed (int): duration of the call in nanoseconds
+        Returns:
+            None
+        """
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.buckets[min(elapsed.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def get_percentile(self, percent: float) -> int:
+        """
+        Gets the upper bound of the histogram bucket holding the percentile
+        Parameters:
+            percent (float): the percentile, from 0 to 100
+        Returns:
+            int: latency in nanoseconds
+        """
+        rank = self.count * percent / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(1 << bucket, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total_ms': self.total / 1e6,
+            'mean_us': self.total / self.count / 1e3 if self.count else 0.0,
+            'p50_us': self.get_percentile(50) / 1e3,
+            'p99_us': self.get_percentile(99) / 1e3,
+            'max_us': self.max / 1e3,
+            'histogram': {f'<{1 << bucket}ns': count for bucket, count in enumerate(self.buckets) if count}
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.tracked = []
+        self.stats = {}
+
+    def track(self, cls: type, method: str, operation: str):
+        """
+        Registers a method to be measured under the given operation name while the profiler is enabled
+        Parameters:
+            cls (type): the class defining the method
+            method (str): the name of the method
+            operation (str): the name of the operation, several methods may share one
+        Returns:
+            None
+        """
+        self.tracked.append((cls, method, operation))
+        if self.enabled:
+            self.wrap(cls, method, operation)
+
+    def wrap(self, cls: type, method: str, operation: str):
+        function = cls.__dict__[method]
+        stats = self.stats.setdefault(operation, OperationStats())
+        clock = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats.record(clock() - start)
+
+        timed.profiled = function
+        setattr(cls, method, timed)
+
+    def enable(self):
+        """
+        Starts measuring all the tracked methods
+        Returns:
+            None
+        """
+        if not self.enabled:
+            self.enabled = True
+            for cls, method, operation in self.tracked:
+                self.wrap(cls, method, operation)
+
+    def disable(self):
+        """
+        Stops measuring and puts back the original methods, the collected stats are kept
+        Returns:
+            None
+        """
+        if self.enabled:
+            self.enabled = False
+            for cls, method, _ in self.tracked:
+                setattr(cls, method, cls.__dict__[method].profiled)
+
+    def reset(self):
+        for stats in self.stats.values():
+            stats.__init__()
+
+    def snapshot(self) -> dict:
+        """
+        Gets the current stats of every measured operation
+        Returns:
+            dict: stats by operation name
+        """
+        return {operation: stats.to_dict() for operation, stats in sorted(self.stats.items()) if stats.count}
+
+    def export_json(self, path=None) -> str:
+        """
+        Exports the snapshot as JSON
+        Parameters:
+            optional path (str): file to write the JSON to
+        Returns:
+            str: the JSON
+        """
+        exported = json.dumps({'enabled': self.enabled, 'operations': self.snapshot()}, indent=2)
+        if path is not None:
+            with open(path, 'w') as fExport:
+                fExport.write(exported)
+        return exported
+
+    def get_report(self) -> str:
+        """
+        Gets the snapshot as a text table
+        Returns:
+            str: the report
+        """
+        lines = [f'profiling {"enabled" if self.enabled else "disabled"}',
+                 f'{"operation":<14}{"count":>9}{"total ms":>11}{"mean us":>10}{"p50 us":>10}{"p99 us":>10}{"max us":>10}']
+        for operation, stats in self.snapshot().items():
+            lines.append(f'{operation:<14}{stats["count"]:>9}{stats["total_ms"]:>11.1f}{stats["mean_us"]:>10.1f}'
+                         f'{stats["p50_us"]:>10.1f}{stats["p99_us"]:>10.1f}{stats["max_us"]:>10.1f}')
+        return '\n'.join(lines)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,269 @@
+"""
+Compact replay logs of games of 2048 and a replayer that seeks to any move.
+A replay starts with a header holding the seed and the board config, followed by blocks.
+Every block starts with a keyframe of the board and packs its moves into a bit stream:
+2 bits for the direction, 1 bit telling if a tile spawned and, if so, 1 bit for 2/4 and the bits of the spawn position.
+Blocks are written as soon as they are full, and the replayer skips whole blocks to reach a move.
+"""
+import struct
+from Classes.Board import *
+
+REPLAY_MAGIC = b'2RPL'
+REPLAY_VERSION = 2
+#magic, version, size, goal exponent, flags, 2 probability, seed, keyframe interval
+REPLAY_HEADER = struct.Struct('<4sBHBBdQH')
+#version 1 kept the size in a single byte
+REPLAY_HEADERS = {1: struct.Struct('<4sBBBBdQH'), REPLAY_VERSION: REPLAY_HEADER}
+MAX_REPLAY_SIZE = 0xFFFF
+#number of moves, length of the packed moves
+BLOCK_HEADER = struct.Struct('<HI')
+FLAG_SEED = 1
+
+
+def get_position_bits(size: int) -> int:
+    """
+    Returns:
+        int: number of bits needed for a tile position on a board of the given size
+    """
+    return max(1, (size * size - 1).bit_length())
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = 0
+        self.bit_count = 0
+
+    def write(self, value: int, bit_count: int):
+        """
+        Appends the lowest bit_count bits of value
+        Returns:
+            None
+        """
+        self.bits |= value << self.bit_count
+        self.bit_count += bit_count
+
+    def to_bytes(self) -> bytes:
+        return self.bits.to_bytes((self.bit_count + 7) // 8, 'little')
+
+
+class BitReader:
+    def __init__(self, data: bytes):
+        self.bits = int.from_bytes(data, 'little')
+        self.position = 0
+
+    def read(self, bit_count: int) -> int:
+        """
+        Reads the next bit_count bits
+        Returns:
+            int: the value of the bits
+        """
+        value = (self.bits >> self.position) & ((1 << bit_count) - 1)
+        self.position += bit_count
+        return value
+
+
+class ReplayWriter:
+    def __init__(self, path: str, board: Board, keyframe_interval=256):
+        """
+        Creates a replay file and writes its header and the keyframe of the starting board
+        Parameters:
+            path (str): path of the replay file
+            board (Board): the board of the game at its start
+            optional keyframe_interval (int): number of moves between keyframes
+        Returns:
+            None
+        Raises:
+            WrongBoardSizeError: if the size does not fit into the header, checked before the file is created
+        """
+        if board.size > MAX_REPLAY_SIZE:
+            raise WrongBoardSizeError(f'boards bigger than {MAX_REPLAY_SIZE} can not be recorded')
+        self.size = board.size
+        self.keyframe_interval = keyframe_interval
+        self.position_bits = get_position_bits(board.size)
+        seed = board.seed if isinstance(board.seed, int) and 0 <= board.seed < 1 << 64 else None
+        self.file = open(path, 'wb')
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, board.size, board.goal.bit_length() - 1,
+                                           FLAG_SEED if seed is not None else 0, board.two_probability,
+                                           seed or 0, keyframe_interval))
+        self.keyframe = b''
+        self.moves = BitWriter()
+        self.move_count = 0
+        self.pending = None
+        self.start_block(board)
+
+    def start_block(self, board: Board):
+        self.keyframe = board.get_exponents()
+        self.moves = BitWriter()
+        self.move_count = 0
+
+    def flush_block(self):
+        """
+        Writes the current block to the file
+        Returns:
+            None
+        """
+        packed = self.moves.to_bytes()
+        self.file.write(BLOCK_HEADER.pack(self.move_count, len(packed)) + self.keyframe + packed)
+        self.file.flush()
+
+    def finish_move(self):
+        """
+        Packs the pending move with its spawn, if there was one
+        Returns:
+            None
+        """
+        if self.pending is None:
+            return
+        direction, spawn = self.pending
+        self.moves.write(direction.value - 1, 2)
+        if spawn is None:
+            self.moves.write(0, 1)
+        else:
+            (x, y, value) = spawn
+            self.moves.write(1, 1)
+            self.moves.write(1 if value == 4 else 0, 1)
+            self.moves.write(x * self.size + y, self.position_bits)
+        self.move_count += 1
+        self.pending = None
+
+    def start_turn(self, board: Board):
+        """
+        Called before every move, finishes the previous move and starts a new block with a keyframe when the current one is full
+        Parameters:
+            board (Board): the board before the move
+        Returns:
+            None
+        """
+        self.finish_move()
+        if self.move_count == self.keyframe_interval:
+            self.flush_block()
+            self.start_block(board)
+
+    def record_move(self, direction: Direction):
+        self.finish_move()
+        self.pending = (direction, None)
+
+    def record_spawn(self, x: int, y: int, value: int):
+        if self.pending is not None:
+            self.pending = (self.pending[0], (x, y, value))
+
+    def close(self):
+        """
+        Writes the last block and closes the file
+        Returns:
+            None
+        """
+        if self.file.closed:
+            return
+        self.finish_move()
+        self.flush_block()
+        self.file.close()
+
+
+class ReplayReader:
+    def __init__(self, path: str):
+        """
+        Opens a replay file and reads the headers of its blocks
+        Parameters:
+            path (str): path of the replay file
+        Returns:
+            None
+        Raises:
+            WrongSaveFormatError: if the file is not a replay of a supported version
+        """
+        with open(path, 'rb') as fReplay:
+            self.data = fReplay.read()
+        if len(self.data) < 5:
+            raise WrongSaveFormatError('replay is too short')
+        header = REPLAY_HEADERS.get(self.data[4])
+        if header is None or len(self.data) < header.size:
+            raise WrongSaveFormatError('not a replay')
+        magic, version, self.size, goal_exponent, flags, self.two_probability, seed, self.keyframe_interval = \
+            header.unpack_from(self.data)
+        if magic != REPLAY_MAGIC:
+            raise WrongSaveFormatError('not a replay')
+        self.goal = 1 << goal_exponent
+        self.seed = seed if flags & FLAG_SEED else None
+        self.position_bits = get_position_bits(self.size)
+        #offset and number of moves of every block
+        self.blocks = []
+        offset = header.size
+        while offset + BLOCK_HEADER.size <= len(self.data):
+            move_count, packed_length = BLOCK_HEADER.unpack_from(self.data, offset)
+            if offset + BLOCK_HEADER.size + self.size * self.size + packed_length > len(self.data):
+                break
+            self.blocks.append((offset, move_count))
+            offset += BLOCK_HEADER.size + self.size * self.size + packed_length
+
+    def __len__(self) -> int:
+        return sum(move_count for _, move_count in self.blocks)
+
+    def read_block(self, index: int) -> (list[list[int]], list):
+        """
+        Reads the keyframe and the moves of a block
+        Parameters:
+            index (int): index of the block
+        Returns:
+            (list[list[int]], list): tiles of the keyframe and the (direction, spawn) pairs, spawn is (x, y, value) or None
+        """
+        offset, move_count = self.blocks[index]
+        _, packed_length = BLOCK_HEADER.unpack_from(self.data, offset)
+        offset += BLOCK_HEADER.size
+        cells = self.size * self.size
+        exponents = self.data[offset:offset + cells]
+        tiles = [[1 << e if e else 0 for e in exponents[x * self.size:(x + 1) * self.size]] for x in range(self.size)]
+        reader = BitReader(self.data[offset + cells:offset + cells + packed_length])
+        moves = []
+        for _ in range(move_count):
+            direction = Direction(reader.read(2) + 1)
+            spawn = None
+            if reader.read(1):
+                value = 4 if reader.read(1) else 2
+                position = reader.read(self.position_bits)
+                spawn = (position // self.size, position % self.size, value)
+            moves.append((direction, spawn))
+        return tiles, moves
+
+    def get_moves(self):
+        """
+        Yields all the moves of the replay in order
+        Returns:
+            generator: (direction, spawn) pairs, spawn is (x, y, value) or None
+        """
+        for index in range(len(self.blocks)):
+            yield from self.read_block(index)[1]
+
+    def create_board(self, tiles: list[list[int]]) -> Board:
+        board = Board(self.size, self.goal, self.seed, self.two_probability)
+        board.tiles = [row[:] for row in tiles]
+        return board
+
+    @staticmethod
+    def apply_move(board: Board, direction: Direction, spawn):
+        """
+        Replays a single move with its recorded spawn
+        Returns:
+            None
+        """
+        board.make_move(direction)
+        if spawn is not None:
+            board.set_tile(*spawn)
+
+    def seek(self, move: int) -> Board:
+        """
+        Gets the board after the given number of moves, starting from the nearest keyframe
+        Parameters:
+            move (int): number of moves, 0 for the start of the game
+        Returns:
+            Board: the board after the moves
+        Raises:
+            IndexError: if the replay has fewer moves
+        """
+        if move < 0 or move > len(self):
+            raise IndexError('move out of range of the replay')
+        block = min(move // self.keyframe_interval, len(self.blocks) - 1)
+        tiles, moves = self.read_block(block)
+        board = self.create_board(tiles)
+        for direction, spawn in moves[:move - block * self.keyframe_interval]:
+            self.apply_move(board, direction, spawn)
+        return board
@@ -0,0 +1,289 @@
+"""
+Binary save format of a board in a game of 2048 and an append-only archive of many named saves.
+A save is a header with the size and the goal exponent followed by one exponent byte per tile,
+version 1 saves with a one-byte size are still read.
+The archive appends saves as records to one data file and their offsets to an index file,
+so a single save is read straight from a memory map of the data file without parsing the others.
+A deleted save is a record without a save, and compacting rewrites the data file with only the live saves.
+"""
+import mmap
+import os.path
+import struct
+from Classes.exceptions import *
+
+SAVE_MAGIC = b'2048'
+SAVE_VERSION = 2
+#magic, version, size, goal exponent
+SAVE_HEADER = struct.Struct('<4sBHB')
+SAVE_HEADERS = {1: struct.Struct('<4sBBB'), SAVE_VERSION: SAVE_HEADER}
+MAX_SAVE_SIZE = 0xFFFF
+#magic, name length, save length
+RECORD_HEADER = struct.Struct('<4sHI')
+RECORD_MAGIC = b'SNAP'
+#offset of the record, name length
+INDEX_ENTRY = struct.Struct('<QH')
+
+
+def encode_save(size: int, goal: int, tiles: list[list[int]]) -> bytes:
+    """
+    Encodes a board into the binary save format
+    Parameters:
+        size (int): The size of the board
+        goal (int): The goal of the board
+        tiles (list[list[int]]): the tiles of the board
+    Returns:
+        bytes: the encoded save
+    Raises:
+        WrongBoardSizeError: if the size does not fit into the header
+    """
+    if size > MAX_SAVE_SIZE:
+        raise WrongBoardSizeError(f'boards bigger than {MAX_SAVE_SIZE} can not be saved')
+    exponents = bytes(tile.bit_length() - 1 if tile else 0 for row in tiles for tile in row)
+    return SAVE_HEADER.pack(SAVE_MAGIC, SAVE_VERSION, size, goal.bit_length() - 1) + exponents
+
+
+def decode_save(data) -> (int, int, list[list[int]]):
+    """
+    Decodes a board from the binary save format
+    Parameters:
+        data (bytes): the encoded save
+    Returns:
+        (int, int, list[list[int]]): size, goal and tiles of the board
+    Raises:
+        WrongSaveFormatError: if the data is not a save of a supported version
+    """
+    if len(data) < 5:
+        raise WrongSaveFormatError('save is too short')
+    header = SAVE_HEADERS.get(data[4])
+    if header is None or len(data) < header.size:
+        raise WrongSaveFormatError('not a binary save')
+    magic, version, size, goal_exponent = header.unpack_from(data)
+    if magic != SAVE_MAGIC or len(data) != header.size + size * size:
+        raise WrongSaveFormatError('not a binary save')
+    exponents = data[header.size:]
+    tiles = [[1 << exponent if exponent else 0 for exponent in exponents[x * size:(x + 1) * size]] for x in range(size)]
+    return size, 1 << goal_exponent, tiles
+
+
+class SaveArchive:
+    def __init__(self, path='Saves/archive.dat'):
+        """
+        Opens the archive at the given path, the data file and its index file are created on the first save
+        A missing or incomplete index is rebuilt from the data file
+        Parameters:
+            optional path (str): path of the data file, the index is kept next to it with an .idx suffix
+        Returns:
+            None
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+        self.offsets = {}
+        self.map = None
+        self.indexed_size = 0
+        self.load_index()
+
+    def load_index(self):
+        """
+        Reads the index file and scans the data file for records written after the last index entry
+        Returns:
+            None
+        """
+        self.offsets = {}
+        self.indexed_size = 0
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'rb') as fIndex:
+                index = fIndex.read()
+            position = 0
+            while position + INDEX_ENTRY.size <= len(index):
+                offset, name_length = INDEX_ENTRY.unpack_from(index, position)
+                position += INDEX_ENTRY.size
+                if position + name_length > len(index):
+                    break
+                self.offsets[index[position:position + name_length].decode()] = offset
+                position += name_length
+        if not os.path.isfile(self.path):
+            self.offsets = {}
+        elif self.offsets:
+            self.indexed_size = self.get_record_end(max(self.offsets.values()))
+        self.scan_records()
+        #a deleted save is a record without a save
+        self.offsets = {name: offset for name, offset in self.offsets.items()
+                        if self.get_record_end(offset) - offset > RECORD_HEADER.size + len(name.encode())}
+
+    def scan_records(self):
+        """
+        Adds the records after the indexed part of the data file to the index
+        Returns:
+            None
+        """
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) <= self.indexed_size:
+            return
+        data = self.get_map()
+        offset = self.indexed_size
+        new_entries = []
+        while offset + RECORD_HEADER.size <= len(data):
+            magic, name_length, save_length = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + name_length + save_length
+            if magic != RECORD_MAGIC or end > len(data):
+                break
+            name = bytes(data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + name_length]).decode()
+            self.offsets[name] = offset
+            new_entries.append((name, offset))
+            offset = end
+        self.indexed_size = offset
+        self.append_index(new_entries)
+
+    def append_index(self, entries: list[tuple[str, int]]):
+        """
+        Appends entries to the index file
+        Parameters:
+            entries (list[tuple[str, int]]): name and record offset of every entry
+        Returns:
+            None
+        """
+        if not entries:
+            return
+        with open(self.index_path, 'ab') as fIndex:
+            for name, offset in entries:
+                encoded_name = name.encode()
+                fIndex.write(INDEX_ENTRY.pack(offset, len(encoded_name)) + encoded_name)
+
+    def get_map(self):
+        """
+        Gets a read-only memory map of the whole data file, remapping it if the file grew
+        Returns:
+            mmap.mmap: the memory map, None if the data file is empty
+        """
+        file_size = os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+        if self.map is not None and len(self.map) != file_size:
+            self.map.close()
+            self.map = None
+        if self.map is None and file_size:
+            with open(self.path, 'rb') as fData:
+                self.map = mmap.mmap(fData.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def get_record_end(self, offset: int) -> int:
+        """
+        Gets the offset right after the record at the given offset
+        Parameters:
+            offset (int): offset of the record
+        Returns:
+            int: offset of the end of the record
+        """
+        data = self.get_map()
+        _, name_length, save_length = RECORD_HEADER.unpack_from(data, offset)
+        return offset + RECORD_HEADER.size + name_length + save_length
+
+    def names(self) -> list[str]:
+        """
+        Returns:
+            list[str]: names of all the saves in the archive
+        """
+        return list(self.offsets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.offsets
+
+    def save(self, name: str, size: int, goal: int, tiles: list[list[int]]):
+        """
+        Appends a save of a board under the given name, a later save under the same name replaces the earlier one
+        Parameters:
+            name (str): the name of the save
+            size (int): The size of the board
+            goal (int): The goal of the board
+            tiles (list[list[int]]): the tiles of the board
+        Returns:
+            None
+        """
+        self.append_record(name, encode_save(size, goal, tiles))
+
+    def delete(self, name: str):
+        """
+        Deletes the save with the given name by appending a record without a save, compact frees its space
+        Parameters:
+            name (str): the name of the save
+        Returns:
+            None
+        """
+        if name in self.offsets:
+            self.append_record(name, b'')
+            del self.offsets[name]
+
+    def append_record(self, name: str, encoded_save: bytes):
+        """
+        Appends a record to the data file and its entry to the index
+        Parameters:
+            name (str): the name of the save
+            encoded_save (bytes): the encoded save, empty for a deleted save
+        Returns:
+            None
+        """
+        encoded_name = name.encode()
+        with open(self.path, 'ab') as fData:
+            offset = fData.tell()
+            fData.write(RECORD_HEADER.pack(RECORD_MAGIC, len(encoded_name), len(encoded_save)))
+            fData.write(encoded_name)
+            fData.write(encoded_save)
+        self.offsets[name] = offset
+        self.indexed_size = offset + RECORD_HEADER.size + len(encoded_name) + len(encoded_save)
+        self.append_index([(name, offset)])
+
+    def load(self, name: str) -> (int, int, list[list[int]]):
+        """
+        Reads the save with the given name from the memory map of the data file
+        Parameters:
+            name (str): the name of the save
+        Returns:
+            (int, int, list[list[int]]): size, goal and tiles of the board
+        Raises:
+            KeyError: if there is no save with the name
+            WrongSaveFormatError: if the record is damaged
+        """
+        offset = self.offsets[name]
+        data = self.get_map()
+        magic, name_length, save_length = RECORD_HEADER.unpack_from(data, offset)
+        if magic != RECORD_MAGIC:
+            raise WrongSaveFormatError('damaged archive record')
+        start = offset + RECORD_HEADER.size + name_length
+        return decode_save(data[start:start + save_length])
+
+    def get_garbage_size(self) -> int:
+        """
+        Returns:
+            int: bytes of the data file taken by replaced and deleted saves
+        """
+        if not os.path.isfile(self.path):
+            return 0
+        live = sum(self.get_record_end(offset) - offset for offset in self.offsets.values())
+        return os.path.getsize(self.path) - live
+
+    def compact(self):
+        """
+        Rewrites the data file and the index with only the live saves, each file is replaced in one step
+        Returns:
+            None
+        """
+        if not os.path.isfile(self.path):
+            return
+        data = self.get_map()
+        records = [(name, bytes(data[offset:self.get_record_end(offset)])) for name, offset in self.offsets.items()]
+        offsets = {}
+        with open(self.path + '.tmp', 'wb') as fData:
+            for name, record in records:
+                offsets[name] = fData.tell()
+                fData.write(record)
+        with open(self.index_path + '.tmp', 'wb') as fIndex:
+            for name, offset in offsets.items():
+                encoded_name = name.encode()
+                fIndex.write(INDEX_ENTRY.pack(offset, len(encoded_name)) + encoded_name)
+        self.close()
+        os.replace(self.path + '.tmp', self.path)
+        os.replace(self.index_path + '.tmp', self.index_path)
+        self.offsets = offsets
+        self.indexed_size = os.path.getsize(self.path)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
@@ -0,0 +1,598 @@
+"""
+An asyncio server hosting many concurrent games of 2048 over a newline-delimited JSON protocol on TCP or a Unix socket.
+Every request is a JSON object on its own line with a command and its arguments, and an optional id echoed in the response:
+    {"id": 1, "command": "new", "size": 4, "goal": 2048, "seed": 7, "strategy": "expectimax"}
+    {"id": 2, "command": "move", "session": "...", "direction": "left"}
+Commands: new, state, move, undo, ai, save, load, leaderboard, close.
+Every response holds "ok" and either the result or an "error" message.
+Computer moves are searched on a process pool, so they never block the event loop,
+and sessions idle for longer than the timeout are moved to a save archive and restored on their next request.
+The engine, strategy and random streams of the moved sessions are kept in a JSON index next to the archive,
+so they survive a restart, and sessions that are not back within the session lifetime are deleted.
+Usage: python -m Classes.Server --port 2048 or python -m Classes.Server --unix /tmp/2048.sock
+"""
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+import uuid
+from Classes.Simulator import *
+
+DIRECTIONS = {direction.name.lower(): direction for direction in Direction}
+#memory budget in bytes of the undo journal of every session
+UNDO_BUDGET = 64 * 1024
+#most scores a leaderboard request can ask for
+MAX_LEADERBOARD_LIMIT = 100
+#biggest board a client can create, boards are built on the event loop
+MAX_BOARD_SIZE = 64
+#default seconds a session moved to disk is kept for
+SESSION_TTL = 7 * 24 * 3600.0
+
+#computer players of a worker process by their configuration
+_worker_games = {}
+
+
+def get_int_argument(request: dict, name: str, default: int, low: int, high: int) -> int:
+    """
+    Gets an integer argument of a request, checked before it reaches the game or the database
+    Parameters:
+        request (dict): the request
+        name (str): name of the argument
+        default (int): value of a missing argument
+        low (int): the lowest allowed value
+        high (int): the highest allowed value
+    Returns:
+        int: the value of the argument
+    Raises:
+        ValueError: if the argument is not an integer between low and high
+    """
+    value = request.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+        raise ValueError(f'{name} must be an integer from {low} to {high}')
+    return value
+
+
+def encode_random_state(state: tuple) -> list:
+    """
+    Converts a state of random.Random into JSON values
+    Parameters:
+        state (tuple): the state from random.Random.getstate
+    Returns:
+        list: the version, the internal state as a list and the gauss value
+    """
+    version, internal, gauss = state
+    return [version, list(internal), gauss]
+
+
+def decode_random_state(values: list) -> tuple:
+    """
+    Converts JSON values from encode_random_state back into a state of random.Random
+    Parameters:
+        values (list): the encoded state
+    Returns:
+        tuple: the state for random.Random.setstate
+    """
+    version, internal, gauss = values
+    return version, tuple(internal), gauss
+
+
+def get_ai_direction(engine: str, strategy: str, size: int, goal: int, two_probability: float,
+                     tiles: list[list[int]]) -> int:
+    """
+    Gets the computer move for a board, runs inside a worker process, so all the arguments are plain values
+    The game and its player are created once per configuration and reused by later requests
+    Parameters:
+        engine (str): name of the board engine in ENGINES
+        strategy (str): name of the computer strategy in STRATEGIES
+        size (int): The size of the board
+        goal (int): The goal of the board
+        two_probability (float): Probability that a new tile is 2 rather than 4
+        tiles (list[list[int]]): the tiles of the board
+    Returns:
+        int: value of the direction of the move, 0 if no move is possible
+    """
+    key = (engine, strategy, size, goal, two_probability)
+    game = _worker_games.get(key)
+    if game is None:
+        game = Game(size, goal, ENGINES[engine], seed=0, two_probability=two_probability)
+        game.set_strategy(strategy)
+        _worker_games[key] = game
+    game.set_board_state(size, goal, tiles)
+    if not game.board.is_there_move_possible():
+        return 0
+    return game.get_computer_direction().value
+
+
+class Session:
+    def __init__(self, session_id: str, game: Game, engine: str, strategy: str):
+        """
+        Initializes a session of a single client game
+        Parameters:
+            session_id (str): The id of the session
+            game (Game): The game of the session
+            engine (str): name of the board engine in ENGINES
+            strategy (str): name of the computer strategy in STRATEGIES
+        Returns:
+            None
+        """
+        self.session_id = session_id
+        self.game = game
+        self.engine = engine
+        self.strategy = strategy
+        self.game.undo_budget = UNDO_BUDGET
+        self.last_active = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def get_state(self) -> dict:
+        """
+        Gets the state of the board sent to the client
+        Returns:
+            dict: the id of the session, size, goal, tiles, score, max tile, legal moves and flags of the game end
+        """
+        legal_moves = [direction.name.lower() for direction in self.get_legal_moves()]
+        board = self.game.board
+        return {
+            'session': self.session_id,
+            'size': board.size,
+            'goal': board.goal,
+            'tiles': [list(row) for row in board.tiles],
+            'score': board.get_score_on_board(),
+            'max_tile': board.find_max_tile(),
+            'goal_reached': board.is_goal_reached(),
+            'game_over': not legal_moves,
+            'legal_moves': legal_moves
+        }
+
+    def get_legal_moves(self) -> dict:
+        """
+        Gets the legal moves of the game, through the game so an engine that can't hold a merged tile falls back to Board
+        Returns:
+            dict: board after the move by Direction, only for legal moves
+        """
+        legal_moves = self.game.get_legal_moves()
+        self.update_engine()
+        return legal_moves
+
+    def update_engine(self):
+        """
+        Renames the engine of the session after the game moved onto another board engine
+        Returns:
+            None
+        """
+        if ENGINES.get(self.engine) is not self.game.engine:
+            self.engine = next(name for name, engine in ENGINES.items() if engine is self.game.engine)
+
+    def make_move(self, direction: Direction) -> tuple:
+        """
+        Makes a move with a new tile after it, the game records both in its undo journal
+        Parameters:
+            direction (Direction): direction of the move
+        Returns:
+            tuple: coordinates and value of the new tile, None if the move was not made or no tile spawned
+        """
+        moved = self.game.make_move(direction)
+        self.update_engine()
+        if not moved:
+            return None
+        if self.game.board.is_there_empty_tile():
+            return self.game.generate_new_tile()
+        return None
+
+    def undo(self) -> bool:
+        """
+        Puts back the board from before the last move
+        Returns:
+            bool: True if a move was undone, False if there is nothing to undo
+        """
+        return self.game.undo()
+
+
+class GameServer:
+    def __init__(self, host='127.0.0.1', port=2048, unix_path=None, idle_timeout=300.0, workers=2,
+                 archive_path='Saves/archive.dat', sessions_path='Saves/sessions.dat',
+                 leaderboard_path='Scores/leaderboard.db', session_ttl=SESSION_TTL):
+        """
+        Initializes a game server, nothing is opened until it is started
+        Parameters:
+            optional host (str): The address the TCP server listens on
+            optional port (int): The port the TCP server listens on
+            optional unix_path (str): path of a Unix socket to listen on instead of TCP
+            optional idle_timeout (float): seconds without requests after which a session is moved to disk
+            optional workers (int): The number of worker processes searching computer moves
+            optional archive_path (str): path of the save archive of the saves made by clients
+            optional sessions_path (str): path of the save archive of the idle sessions
+            optional leaderboard_path (str): path of the leaderboard
+            optional session_ttl (float): seconds a session moved to disk is kept before it is deleted
+        Returns:
+            None
+        """
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.idle_timeout = idle_timeout
+        self.workers = workers
+        self.archive_path = archive_path
+        self.sessions_path = sessions_path
+        self.session_index_path = sessions_path + '.json'
+        self.session_ttl = session_ttl
+        self.leaderboard_path = leaderboard_path
+        self.sessions = {}
+        #engine, strategy, random streams, spawn order and time of eviction of the sessions moved to disk, by session id
+        self.evicted = {}
+        self.archive = None
+        self.session_archive = None
+        self.leaderboard = None
+        self.executor = None
+        self.server = None
+        self.eviction_task = None
+        self.commands = {
+            'new': self.command_new,
+            'state': self.command_state,
+            'move': self.command_move,
+            'undo': self.command_undo,
+            'ai': self.command_ai,
+            'save': self.command_save,
+            'load': self.command_load,
+            'leaderboard': self.command_leaderboard,
+            'close': self.command_close
+        }
+
+    async def start(self):
+        """
+        Opens the archives, the leaderboard and the process pool and starts listening
+        Returns:
+            None
+        """
+        for path in (self.archive_path, self.sessions_path):
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.archive = SaveArchive(self.archive_path)
+        self.session_archive = SaveArchive(self.sessions_path)
+        self.load_session_index()
+        self.expire_evicted_sessions()
+        self.leaderboard = Leaderboard(self.leaderboard_path)
+        self.executor = ProcessPoolExecutor(self.workers)
+        if self.unix_path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, self.unix_path)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.eviction_task = asyncio.create_task(self.evict_idle_sessions_forever())
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        Stops listening, moves all the sessions to disk and closes the archives, the leaderboard and the process pool
+        Returns:
+            None
+        """
+        if self.eviction_task is not None:
+            self.eviction_task.cancel()
+            self.eviction_task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        self.evict_idle_sessions(0)
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for store in (self.archive, self.session_archive, self.leaderboard):
+            if store is not None:
+                store.close()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answers the requests of a single connection, one line each, until the client disconnects
+        Parameters:
+            reader (asyncio.StreamReader): the incoming stream
+            writer (asyncio.StreamWriter): the outgoing stream
+        Returns:
+            None
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line: bytes) -> dict:
+        """
+        Parses a request and runs its command
+        Parameters:
+            line (bytes): the request as a line of JSON
+        Returns:
+            dict: the response
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+            request_id = request.get('id')
+            command = self.commands.get(request.get('command'))
+            if command is None:
+                raise ValueError(f'unknown command {request.get("command")}')
+            response = await command(request)
+            response['ok'] = True
+        except (KeyError, ValueError, TypeError, WrongBoardSizeError, WrongGoalError, WrongSaveFormatError) as e:
+            response = {'ok': False, 'error': str(e) if not isinstance(e, KeyError) else f'missing {e}'}
+        except Exception as e:
+            #any other failure of a command is answered too, so the connection and the other requests on it live on
+            response = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    def get_session(self, session_id: str) -> Session:
+        """
+        Gets a session by its id, restoring it from disk if it was moved there
+        Parameters:
+            session_id (str): The id of the session
+        Returns:
+            Session: the session
+        Raises:
+            ValueError: if there is no such session
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            if session_id not in self.evicted:
+                raise ValueError('no such session')
+            entry = self.evicted[session_id]
+            size, goal, tiles = self.session_archive.load(session_id)
+            session = self.create_session(session_id, size, goal, entry['engine'], entry['strategy'], None)
+            game = session.game
+            game.set_board_state(size, goal, tiles)
+            #the session goes on with the same spawns it would have had without being moved
+            game.random.setstate(decode_random_state(entry['random']))
+            state, block_length, index = entry['board_random']
+            game.board.seed = entry['seed']
+            game.board.set_random_state(decode_random_state(state), block_length, index)
+            if entry['spawn_order'] is not None:
+                game.board.set_spawn_order(entry['spawn_order'])
+            self.forget_evicted_sessions([session_id])
+        session.last_active = time.monotonic()
+        return session
+
+    def create_session(self, session_id: str, size: int, goal: int, engine: str, strategy: str, seed) -> Session:
+        """
+        Creates a session with a new game sharing the archive and the leaderboard of the server
+        Returns:
+            Session: the new session
+        Raises:
+            ValueError: if the engine or the strategy is unknown
+        """
+        if engine not in ENGINES or strategy not in STRATEGIES:
+            raise ValueError('unknown engine or strategy')
+        game = Game(size, goal, ENGINES[engine], seed=seed)
+        game.archive_path = self.archive_path
+        game.archive = self.archive
+        game.leaderboard_path = self.leaderboard_path
+        game.leaderboard = self.leaderboard
+        session = Session(session_id, game, engine, strategy)
+        self.sessions[session_id] = session
+        return session
+
+    def evict_idle_sessions(self, timeout: float) -> int:
+        """
+        Moves the sessions idle for longer than the timeout to the session archive and the session index,
+        their undo history is dropped
+        Sessions with a request in progress are kept
+        Parameters:
+            timeout (float): seconds without requests
+        Returns:
+            int: the number of moved sessions
+        """
+        now = time.monotonic()
+        idle = [session for session in self.sessions.values()
+                if now - session.last_active >= timeout and not session.lock.locked()]
+        for session in idle:
+            board = session.game.board
+            self.session_archive.save(session.session_id, board.size, board.goal, board.tiles)
+            state, block_length, index = board.get_random_state()
+            self.evicted[session.session_id] = {
+                'engine': session.engine,
+                'strategy': session.strategy,
+                'seed': board.seed,
+                'random': encode_random_state(session.game.random.getstate()),
+                'board_random': [encode_random_state(state), block_length, index],
+                'spawn_order': board.get_spawn_order(),
+                'evicted_at': time.time()
+            }
+            session.game.stop_replay()
+            del self.sessions[session.session_id]
+        if idle:
+            self.save_session_index()
+        return len(idle)
+
+    def load_session_index(self):
+        """
+        Reads the index of the sessions moved to disk, a missing or damaged index leaves no sessions to restore
+        and the saves in the session archive without an entry are deleted
+        Returns:
+            None
+        """
+        index = {}
+        try:
+            with open(self.session_index_path, 'r') as fIndex:
+                index = json.load(fIndex)
+        except (OSError, ValueError):
+            pass
+        if not isinstance(index, dict):
+            index = {}
+        self.evicted = {session_id: entry for session_id, entry in index.items()
+                        if session_id in self.session_archive}
+        orphans = [name for name in self.session_archive.names() if name not in self.evicted]
+        self.forget_evicted_sessions(orphans)
+
+    def save_session_index(self):
+        """
+        Writes the index of the sessions moved to disk, replacing the old index in one step
+        Returns:
+            None
+        """
+        with open(self.session_index_path + '.tmp', 'w') as fIndex:
+            json.dump(self.evicted, fIndex)
+        os.replace(self.session_index_path + '.tmp', self.session_index_path)
+
+    def forget_evicted_sessions(self, session_ids: list[str]):
+        """
+        Deletes sessions moved to disk from the index and the archive, the archive is compacted once it is mostly garbage
+        Parameters:
+            session_ids (list[str]): ids of the sessions
+        Returns:
+            None
+        """
+        if not session_ids:
+            return
+        for session_id in session_ids:
+            self.evicted.pop(session_id, None)
+            self.session_archive.delete(session_id)
+        self.save_session_index()
+        garbage = self.session_archive.get_garbage_size()
+        if garbage * 2 > os.path.getsize(self.sessions_path):
+            self.session_archive.compact()
+
+    def expire_evicted_sessions(self) -> int:
+        """
+        Deletes the sessions that have been on disk for longer than the session lifetime
+        Returns:
+            int: the number of deleted sessions
+        """
+        now = time.time()
+        expired = [session_id for session_id, entry in self.evicted.items()
+                   if now - entry['evicted_at'] > self.session_ttl]
+        self.forget_evicted_sessions(expired)
+        return len(expired)
+
+    async def evict_idle_sessions_forever(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            self.evict_idle_sessions(self.idle_timeout)
+            self.expire_evicted_sessions()
+
+    async def command_new(self, request: dict) -> dict:
+        """
+        Creates a session with a new game
+        Request: size, goal, seed, engine and strategy, all optional, the size is at most MAX_BOARD_SIZE
+        Returns:
+            dict: the state of the new game
+        """
+        size = get_int_argument(request, 'size', 4, 2, MAX_BOARD_SIZE)
+        goal = get_int_argument(request, 'goal', 2048, 16, 16384)
+        seed = request.get('seed')
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+            raise ValueError('seed must be an integer')
+        session = self.create_session(uuid.uuid4().hex, size, goal, str(request.get('engine', 'board')),
+                                      str(request.get('strategy', 'greedy')), seed)
+        return session.get_state()
+
+    async def command_state(self, request: dict) -> dict:
+        return self.get_session(request['session']).get_state()
+
+    async def command_move(self, request: dict) -> dict:
+        """
+        Makes a move followed by a new tile
+        Request: session and direction (up, right, down or left)
+        Returns:
+            dict: whether the move was made, the new tile and the state of the game
+        """
+        session = self.get_session(request['session'])
+        direction = DIRECTIONS.get(str(request['direction']).lower())
+        if direction is None:
+            raise ValueError('direction must be up, right, down or left')
+        async with session.lock:
+            moved = direction in session.get_legal_moves()
+            spawn = session.make_move(direction) if moved else None
+            return {'moved': moved, 'spawn': spawn, **session.get_state()}
+
+    async def command_undo(self, request: dict) -> dict:
+        session = self.get_session(request['session'])
+        async with session.lock:
+            return {'undone': session.undo(), **session.get_state()}
+
+    async def command_ai(self, request: dict) -> dict:
+        """
+        Searches the computer move on the process pool and makes it if asked to
+        Request: session, optional strategy overriding the one of the session, optional move (bool)
+        Returns:
+            dict: the direction, None if no move is possible, whether it was made, the new tile and the state of the game
+        """
+        session = self.get_session(request['session'])
+        strategy = request.get('strategy', session.strategy)
+        if strategy not in STRATEGIES:
+            raise ValueError('unknown strategy')
+        async with session.lock:
+            board = session.game.board
+            direction_value = await asyncio.get_running_loop().run_in_executor(
+                self.executor, get_ai_direction, session.engine, strategy, board.size, board.goal,
+                board.two_probability, [list(row) for row in board.tiles])
+            direction = Direction(direction_value) if direction_value else None
+            moved = bool(request.get('move')) and direction is not None
+            spawn = session.make_move(direction) if moved else None
+            return {'direction': direction.name.lower() if direction else None, 'moved': moved, 'spawn': spawn,
+                    **session.get_state()}
+
+    async def command_save(self, request: dict) -> dict:
+        session = self.get_session(request['session'])
+        return {'saved': session.game.save_to_archive(str(request['name']))}
+
+    async def command_load(self, request: dict) -> dict:
+        """
+        Loads a save from the archive into the game of the session, the undo history is dropped
+        Request: session and name
+        Returns:
+            dict: whether the save was loaded and the state of the game
+        """
+        session = self.get_session(request['session'])
+        name = str(request['name'])
+        #saves of games played outside the server can be bigger than the boards clients may create
+        if name in self.archive and self.archive.load(name)[0] > MAX_BOARD_SIZE:
+            raise ValueError(f'boards bigger than {MAX_BOARD_SIZE} can not be loaded')
+        async with session.lock:
+            loaded = session.game.load_from_archive(name)
+            return {'loaded': loaded, **session.get_state()}
+
+    async def command_leaderboard(self, request: dict) -> dict:
+        limit = get_int_argument(request, 'limit', 10, 1, MAX_LEADERBOARD_LIMIT)
+        return {'scores': [[name, score] for name, score in self.leaderboard.get_top(limit)]}
+
+    async def command_close(self, request: dict) -> dict:
+        session = self.get_session(request['session'])
+        session.game.stop_replay()
+        del self.sessions[session.session_id]
+        return {'closed': True}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve games of 2048 over newline-delimited JSON')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--unix', help='path of a Unix socket to listen on instead of TCP')
+    parser.add_argument('--idle-timeout', type=float, default=300.0)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--session-ttl', type=float, default=SESSION_TTL,
+                        help='seconds a session moved to disk is kept before it is deleted')
+    args = parser.parse_args()
+    game_server = GameServer(args.host, args.port, args.unix, args.idle_timeout, args.workers,
+                             session_ttl=args.session_ttl)
+    try:
+        asyncio.run(game_server.serve_forever())
+    except KeyboardInterrupt:
+        pass
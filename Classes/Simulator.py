@@ -0,0 +1,181 @@
+"""
+A headless simulator that lets the computer play many games of 2048 on a process pool and reports statistics.
+Every worker plays its share of the games with its own seed derived from the master seed,
+so a run is reproducible for a given master seed and worker count.
+Usage: python -m Classes.Simulator --games 100 --workers 4 --seed 1
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import time
+from Classes.Game import *
+from Classes.BitBoard import BitBoard
+from Classes.SparseBoard import SparseBoard
+
+ENGINES = {
+    'board': Board,
+    'bitboard': BitBoard,
+    'sparse': SparseBoard
+}
+
+
+def play_games(size: int, goal: int, engine: str, strategy: str, seed: int, games: int,
+               replay_dir=None) -> list[tuple[int, int, int]]:
+    """
+    Plays the given number of computer games one after another without any console output
+    Runs inside a worker process, so all the arguments are plain values, every game is seeded from the worker seed
+    Parameters:
+        size (int): The size of the boards
+        goal (int): The goal of the games
+        engine (str): name of the board engine in ENGINES
+        strategy (str): name of the computer strategy in STRATEGIES
+        seed (int): seed of the worker
+        games (int): number of games to play
+        optional replay_dir (str): directory to record a replay of every game into, named by the seed of the game
+    Returns:
+        list[tuple[int, int, int]]: score, max tile and number of moves of every game
+    """
+    worker_random = random.Random(seed)
+    results = []
+    for _ in range(games):
+        game_seed = worker_random.getrandbits(64)
+        game = Game(size, goal, ENGINES[engine], seed=game_seed)
+        game.set_strategy(strategy)
+        if replay_dir is not None:
+            game.recorder = ReplayWriter(os.path.join(replay_dir, f'{game_seed}.rpl'), game.board)
+        moves = game.play_game_computer(delay=0, show=False)
+        game.stop_replay()
+        results.append((game.board.get_score_on_board(), game.board.find_max_tile(), moves))
+    return results
+
+
+def percentile(sorted_values: list[int], percent: float) -> int:
+    """
+    Gets the nearest-rank percentile of sorted values
+    Parameters:
+        sorted_values (list[int]): values sorted from low to high
+        percent (float): the percentile, from 0 to 100
+    Returns:
+        int: the value at the percentile
+    """
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Simulator:
+    def __init__(self, games=100, workers=4, seed=0, size=4, goal=2048, engine='board', strategy='greedy',
+                 replay_dir=None):
+        """
+        Initializes a simulator for headless computer games
+        Parameters:
+            optional games (int): The number of games to play
+            optional workers (int): The number of worker processes
+            optional seed (int): The master seed of the run
+            optional size (int): The size of the boards
+            optional goal (int): The goal of the games
+            optional engine (str): name of the board engine in ENGINES
+            optional strategy (str): name of the computer strategy in STRATEGIES
+            optional replay_dir (str): directory to record a replay of every game into
+        Returns:
+            None
+        """
+        self.games = games
+        self.workers = workers
+        self.seed = seed
+        self.size = size
+        self.goal = goal
+        self.engine = engine
+        self.strategy = strategy
+        self.replay_dir = replay_dir
+
+    def get_worker_seeds(self) -> list[int]:
+        """
+        Derives the seed of every worker from the master seed
+        Returns:
+            list[int]: seed of every worker
+        """
+        master = random.Random(self.seed)
+        return [master.getrandbits(32) for _ in range(self.workers)]
+
+    def run(self) -> dict:
+        """
+        Plays all the games and collects their statistics
+        Returns:
+            dict: the report with games/sec, moves/sec, win rate, max tile distribution and score percentiles
+        """
+        worker_games = [self.games // self.workers + (i < self.games % self.workers) for i in range(self.workers)]
+        if self.replay_dir is not None:
+            os.makedirs(self.replay_dir, exist_ok=True)
+        arguments = [(self.size, self.goal, self.engine, self.strategy, seed, games, self.replay_dir)
+                     for seed, games in zip(self.get_worker_seeds(), worker_games)]
+        start = time.perf_counter()
+        if self.workers == 1:
+            chunks = [play_games(*arguments[0])]
+        else:
+            with ProcessPoolExecutor(self.workers) as executor:
+                chunks = list(executor.map(play_games, *zip(*arguments)))
+        elapsed = time.perf_counter() - start
+        results = [result for chunk in chunks for result in chunk]
+        return self.get_report(results, elapsed)
+
+    def get_report(self, results: list[tuple[int, int, int]], elapsed: float) -> dict:
+        """
+        Aggregates the results of the games into a report
+        Parameters:
+            results (list[tuple[int, int, int]]): score, max tile and number of moves of every game
+            elapsed (float): wall-clock seconds the games took
+        Returns:
+            dict: the report
+        """
+        scores = sorted(score for score, _, _ in results)
+        moves = sum(game_moves for _, _, game_moves in results)
+        max_tiles = {}
+        for _, max_tile, _ in results:
+            max_tiles[max_tile] = max_tiles.get(max_tile, 0) + 1
+        return {
+            'games': len(results),
+            'workers': self.workers,
+            'seed': self.seed,
+            'seconds': elapsed,
+            'games_per_second': len(results) / elapsed if elapsed else 0.0,
+            'moves_per_second': moves / elapsed if elapsed else 0.0,
+            'win_rate': sum(1 for _, max_tile, _ in results if max_tile >= self.goal) / len(results) if results else 0.0,
+            'max_tile_distribution': dict(sorted(max_tiles.items())),
+            'score_percentiles': {p: percentile(scores, p) for p in (10, 25, 50, 75, 90, 99)} if scores else {}
+        }
+
+    @staticmethod
+    def print_report(report: dict):
+        """
+        Prints the report on the console
+        Parameters:
+            report (dict): the report from run
+        Returns:
+            None
+        """
+        print(f"games: {report['games']} on {report['workers']} workers, seed {report['seed']}")
+        print(f"time: {report['seconds']:.2f}s, {report['games_per_second']:.2f} games/sec, {report['moves_per_second']:.0f} moves/sec")
+        print(f"win rate: {report['win_rate'] * 100:.1f}%")
+        print('max tiles:')
+        for tile, count in report['max_tile_distribution'].items():
+            print(f'{tile:{6}} - {count}')
+        print('score percentiles:')
+        for p, score in report['score_percentiles'].items():
+            print(f'p{p} - {score}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play computer games of 2048 headless and report statistics')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=4)
+    parser.add_argument('--goal', type=int, default=2048)
+    parser.add_argument('--engine', choices=ENGINES, default='board')
+    parser.add_argument('--strategy', choices=STRATEGIES, default='greedy')
+    parser.add_argument('--replays', help='directory to record a replay of every game into')
+    args = parser.parse_args()
+    simulator = Simulator(args.games, args.workers, args.seed, args.size, args.goal, args.engine, args.strategy,
+                          args.replays)
+    Simulator.print_report(simulator.run())
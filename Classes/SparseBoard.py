@@ -0,0 +1,396 @@
+"""
+A class that represents a board in a game of 2048 for very large sizes, storing only the tiles on it.
+Every row and every column keeps its tiles as a dict from position to exponent, so a move only touches occupied cells,
+and every direction keeps the set of lines already settled towards it, so a move skips the lines it can not change.
+The hashes of the board are computed from its tiles when they are asked for and kept until the next change.
+"""
+from Classes.Board import *
+
+
+class SparseBoard(Board):
+    #_counts is the slot of Board, kept as a dict of the exponents on the board
+    __slots__ = ('_rows', '_columns', '_tile_count', '_settled')
+
+    #the getter of Board is kept, only the setter builds the lines instead of the buffers
+    @Board.tiles.setter
+    def tiles(self, tiles: list[list[int]]):
+        """
+        Replaces the tiles of the board and rebuilds the lines, score, max tile and settled lines from scratch
+        Parameters:
+            tiles (list[list[int]]): the tiles of the board
+        Returns:
+            None
+        """
+        self.clear(len(tiles))
+        for x, row in enumerate(tiles):
+            for y, value in enumerate(row):
+                if value:
+                    self.set_cell(x, y, get_exponent(value))
+
+    def clear(self, size: int):
+        """
+        Empties the board and sets its size
+        Parameters:
+            size (int): The size of the board
+        Returns:
+            None
+        """
+        self.size = size
+        self._moves = None
+        self._hashes = None
+        #tiles by position of the non-empty rows and columns
+        self._rows = {}
+        self._columns = {}
+        #number of tiles by exponent
+        self._counts = {}
+        self._tile_count = 0
+        self._score = 0
+        self._max_exponent = 0
+        #lines that a move in the direction would not change, by direction.value - 1
+        self._settled = [set(), set(), set(), set()]
+
+    def set_exponents(self, cells: bytearray):
+        """
+        Replaces the exponents of the tiles of the board
+        Parameters:
+            cells (bytearray): exponents of the tiles row by row
+        Returns:
+            None
+        """
+        self.clear(self.size)
+        for cell, exponent in enumerate(cells):
+            if exponent:
+                self.set_cell(cell // self.size, cell % self.size, exponent)
+
+    def set_cell(self, x: int, y: int, exponent: int):
+        """
+        Sets the exponent of a tile and updates its row and column, the score, max tile and settled lines
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+            exponent (int): exponent of the tile, 0 for empty
+        Returns:
+            None
+        """
+        row = self._rows.get(x)
+        old = row.get(y, 0) if row else 0
+        if old == exponent:
+            return
+        self._moves = None
+        self._hashes = None
+        counts = self._counts
+        if old:
+            del row[y]
+            if not row:
+                del self._rows[x]
+            column = self._columns[y]
+            del column[x]
+            if not column:
+                del self._columns[y]
+            count = counts[old] - 1
+            if count:
+                counts[old] = count
+            else:
+                del counts[old]
+            self._tile_count -= 1
+        if exponent:
+            self._rows.setdefault(x, {})[y] = exponent
+            self._columns.setdefault(y, {})[x] = exponent
+            counts[exponent] = counts.get(exponent, 0) + 1
+            self._tile_count += 1
+        self._score += TILE_VALUES[exponent] - TILE_VALUES[old]
+        if exponent > self._max_exponent:
+            self._max_exponent = exponent
+        elif old == self._max_exponent and old not in counts:
+            self._max_exponent = max(counts, default=0)
+        #up and down move columns, right and left move rows
+        settled = self._settled
+        settled[0].discard(y)
+        settled[2].discard(y)
+        settled[1].discard(x)
+        settled[3].discard(x)
+
+    def set_tile(self, x: int, y: int, value: int):
+        """
+        Sets the tile at the given coordinates
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+            value (int): value of the tile, 0 for empty
+        Returns:
+            None
+        """
+        self.set_cell(x, y, get_exponent(value))
+
+    def set_exponent(self, cell: int, exponent: int):
+        self.set_cell(cell // self.size, cell % self.size, exponent)
+
+    def get_tile(self, x: int, y: int) -> int:
+        """
+        Gets the value of the tile at the given coordinates
+        Parameters:
+            x (int): row of the tile
+            y (int): column of the tile
+        Returns:
+            int: value of the tile, 0 if empty
+        """
+        row = self._rows.get(x)
+        return TILE_VALUES[row.get(y, 0)] if row else 0
+
+    def get_row(self, x: int) -> list[int]:
+        """
+        Gets the values of the tiles of a row
+        Parameters:
+            x (int): the row
+        Returns:
+            list[int]: values of the tiles, 0 for empty tiles
+        """
+        values = [0] * self.size
+        for y, exponent in self._rows.get(x, {}).items():
+            values[y] = TILE_VALUES[exponent]
+        return values
+
+    def get_exponents(self) -> bytes:
+        """
+        Gets the exponents of the tiles row by row, 0 for empty tiles
+        Returns:
+            bytes: the exponent of the tile at (x, y) at index x * size + y
+        """
+        cells = bytearray(self.size * self.size)
+        for x, row in self._rows.items():
+            for y, exponent in row.items():
+                cells[x * self.size + y] = exponent
+        return bytes(cells)
+
+    def is_there_empty_tile(self) -> bool:
+        """
+        Checks if there is an empty tile in the board
+        Returns:
+            bool: True if there is a tile, False otherwise
+        """
+        return self._tile_count < self.size * self.size
+
+    def get_empty_tile_count(self) -> int:
+        """
+        Gets the number of empty tiles on the board
+        Returns:
+            int: number of empty tiles on the board
+        """
+        return self.size * self.size - self._tile_count
+
+    def get_empty_tiles(self) -> list[(int, int)]:
+        """
+        Gets coordinates of all empty tiles on the board row by row, this walks the whole board
+        Returns:
+            list[(int, int)]: coordinates of the empty tiles
+        """
+        rows = self._rows
+        return [(x, y) for x in range(self.size) for y in range(self.size) if y not in rows.get(x, ())]
+
+    def get_spawn_order(self) -> list[int]:
+        #the empty tiles are always picked row by row
+        return None
+
+    def set_spawn_order(self, order: list[int]):
+        pass
+
+    def get_random_empty_tile(self) -> (int, int):
+        """
+        Gets coordinates of a random empty tile on the board, every empty tile is equally likely
+        Full rows are skipped by their tile counts, so only the row of the tile is walked
+        Returns:
+            (int, int): coordinates of the empty tile
+        """
+        empty_count = self.get_empty_tile_count()
+        if empty_count == 0:
+            return None
+        index = int(self.get_random() * empty_count)
+        for x in range(self.size):
+            row = self._rows.get(x, {})
+            free = self.size - len(row)
+            if index < free:
+                for y in range(self.size):
+                    if y not in row:
+                        if index == 0:
+                            return x, y
+                        index -= 1
+            index -= free
+
+    def get_legal_moves(self) -> dict:
+        """
+        Gets the legal moves with the boards after them, computed once per state of the board
+        A direction with all its lines settled is not legal and is not tried on a copy
+        The boards after the moves are shared with later calls and must not be changed, clone them first
+        Returns:
+            dict: board after the move by Direction, only for legal moves, in the order of Direction
+        """
+        if self._moves is None:
+            moves = {}
+            for direction in Direction:
+                lines = self._rows if direction in (Direction.LEFT, Direction.RIGHT) else self._columns
+                if self._settled[direction.value - 1].issuperset(lines):
+                    continue
+                board = self.clone()
+                if board.make_move(direction):
+                    moves[direction] = board
+            self._moves = moves
+        return self._moves
+
+    def clone(self) -> 'SparseBoard':
+        """
+        Copies the board, only its lines, counts and settled lines are copied
+        The copy continues the random stream and shares the cache of legal moves of the board, as Board.clone does
+        Returns:
+            SparseBoard: an independent copy of the board
+        """
+        board = object.__new__(SparseBoard)
+        board.size = self.size
+        board.goal = self.goal
+        board.seed = self.seed
+        board.two_probability = self.two_probability
+        board.random = None
+        board._random_block = self._random_block
+        board._random_index = self._random_index
+        board._random_state = self._random_state
+        board.adopt(self)
+        board._moves = self._moves
+        return board
+
+    def adopt(self, board: 'SparseBoard'):
+        """
+        Copies the tiles and the aggregates of a board of the same size into this board
+        Parameters:
+            board (SparseBoard): the board to copy, it is not changed
+        Returns:
+            None
+        """
+        self._moves = None
+        self._hashes = board._hashes
+        self._rows = {x: row.copy() for x, row in board._rows.items()}
+        self._columns = {y: column.copy() for y, column in board._columns.items()}
+        self._counts = board._counts.copy()
+        self._tile_count = board._tile_count
+        self._score = board._score
+        self._max_exponent = board._max_exponent
+        self._settled = [lines.copy() for lines in board._settled]
+
+    def get_state_key(self):
+        """
+        Gets a hashable key of the tiles, equal for boards with equal tiles
+        Returns:
+            frozenset: (x, y, exponent) of every tile
+        """
+        return frozenset((x, y, exponent) for x, row in self._rows.items() for y, exponent in row.items())
+
+    def get_hashes(self) -> list[int]:
+        """
+        Gets the zobrist hashes of the 8 rotations and reflections of the board, computed once per state
+        Returns:
+            list[int]: the 64-bit hashes, the board itself first
+        """
+        if self._hashes is None:
+            size = self.size
+            last = size - 1
+            hashes = [0] * 8
+            for x, row in self._rows.items():
+                for y, exponent in row.items():
+                    transforms = ((x, y), (y, last - x), (last - x, last - y), (last - y, x),
+                                  (x, last - y), (last - x, y), (y, x), (last - y, last - x))
+                    for lane, (i, j) in enumerate(transforms):
+                        hashes[lane] ^= get_zobrist_value(i * size + j, exponent)
+            self._hashes = hashes
+        return self._hashes
+
+    def get_hash(self) -> int:
+        """
+        Gets the zobrist hash of the tiles
+        Returns:
+            int: the 64-bit hash
+        """
+        return self.get_hashes()[0]
+
+    def get_canonical_key(self) -> int:
+        """
+        Gets a 64-bit key equal for all the rotations and reflections of the tiles
+        Returns:
+            int: the smallest of the zobrist hashes of the 8 symmetric boards
+        """
+        return min(self.get_hashes())
+
+    def make_move(self, direction: Direction) -> bool:
+        """
+        Makes a move is the given direction
+        Only the lines with tiles that are not settled towards the direction are moved, in time linear in their tiles,
+        a moved line is replaced as a whole and only the crossing lines of its changed cells are updated
+        If no tiles were merged or shifted, the move was not made and False is returned
+        Parameters:
+            Direction: Direction of the move to be made
+        Returns:
+            bool: True if the move was valid and made, False otherwise
+        """
+        if self._moves is not None:
+            #the move was already made on a copy, its tiles and aggregates are copied back
+            if direction not in self._moves:
+                return False
+            self.adopt(self._moves[direction])
+            return True
+        horizontal = direction in (Direction.LEFT, Direction.RIGHT)
+        lines, crossing = (self._rows, self._columns) if horizontal else (self._columns, self._rows)
+        reverse = direction in (Direction.RIGHT, Direction.DOWN)
+        settled = self._settled[direction.value - 1]
+        #settled lines of the opposite direction and of the two directions of the crossing lines
+        opposite = self._settled[(direction.value + 1) % 4]
+        crossing_settled = (self._settled[direction.value % 4], self._settled[(direction.value + 2) % 4])
+        counts = self._counts
+        move_made = False
+        for index in [index for index in lines if index not in settled]:
+            line = lines[index]
+            merged = []
+            pending = 0
+            for exponent in [line[cell] for cell in sorted(line, reverse=reverse)]:
+                if exponent == pending:
+                    merged.append(exponent + 1)
+                    counts[exponent] -= 2
+                    if not counts[exponent]:
+                        del counts[exponent]
+                    counts[exponent + 1] = counts.get(exponent + 1, 0) + 1
+                    if exponent + 1 > self._max_exponent:
+                        self._max_exponent = exponent + 1
+                    self._tile_count -= 1
+                    pending = 0
+                else:
+                    if pending:
+                        merged.append(pending)
+                    pending = exponent
+            if pending:
+                merged.append(pending)
+            moved = dict(zip(range(self.size - 1, -1, -1) if reverse else range(self.size), merged))
+            if moved == line:
+                settled.add(index)
+                continue
+            move_made = True
+            for cell, exponent in line.items():
+                if moved.get(cell) != exponent:
+                    crossing_line = crossing[cell]
+                    del crossing_line[index]
+                    if not crossing_line:
+                        del crossing[cell]
+                    crossing_settled[0].discard(cell)
+                    crossing_settled[1].discard(cell)
+            for cell, exponent in moved.items():
+                if line.get(cell) != exponent:
+                    crossing.setdefault(cell, {})[index] = exponent
+                    crossing_settled[0].discard(cell)
+                    crossing_settled[1].discard(cell)
+            lines[index] = moved
+            opposite.discard(index)
+            #a moved line is packed, it is settled unless the merges left equal neighbors
+            if all(a != b for a, b in zip(merged, merged[1:])):
+                settled.add(index)
+        if move_made:
+            self._moves = None
+            self._hashes = None
+        return move_made
+
+
+PROFILER.track(SparseBoard, 'make_move', 'board_move')
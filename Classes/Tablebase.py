@@ -0,0 +1,236 @@
+"""
+Perfect play for small boards of the game of 2048, solved once and memory-mapped from disk.
+The generator enumerates every position reachable from the starting positions and solves them by retrograde analysis.
+Every turn adds 2 or 4 to the sum of the tiles, so the positions are solved from the highest sum down
+and every position is solved after all the positions that can follow it.
+The table stores the best move and the probability of reaching the goal with perfect play for every position,
+at an offset computed directly from the exponents of its tiles, so a lookup reads a single entry.
+Usage: python -m Classes.Tablebase --size 3 --goal 32
+"""
+import argparse
+import mmap
+import os
+import struct
+from Classes.BitBoard import *
+
+TABLEBASE_MAGIC = b'2TBL'
+TABLEBASE_VERSION = 1
+#magic, version, size, goal exponent, 2 probability
+TABLEBASE_HEADER = struct.Struct('<4sBBBd')
+#best move as direction value (0 if there is none or the position is not in the table), scaled win probability
+TABLEBASE_ENTRY = struct.Struct('<BH')
+PROBABILITY_SCALE = 65535
+TABLEBASE_DIR = 'Tablebases'
+
+
+def get_tablebase_path(size: int, goal: int, directory=TABLEBASE_DIR) -> str:
+    return os.path.join(directory, f'{size}x{size}_{goal}.tb')
+
+
+def get_state_index(exponents, base: int) -> int:
+    """
+    Gets the offset of a position in the table, reading the exponents as the digits of a number in the given base
+    Parameters:
+        exponents: exponents of the tiles row by row, 0 for empty tiles, all below base
+        base (int): the goal exponent plus one
+    Returns:
+        int: index of the entry of the position
+    """
+    index = 0
+    for exponent in reversed(exponents):
+        index = index * base + exponent
+    return index
+
+
+def get_line_cells(size: int) -> dict:
+    """
+    Gets the lines of every direction as cell indices x * size + y, ordered in the direction of the move
+    Returns:
+        dict: lists of cell indices of every line by Direction
+    """
+    return {direction: [[x * size + y for (x, y) in line] for line in get_lines(size, direction)]
+            for direction in Direction}
+
+
+def move_exponents(state: tuple, lines: list[list[int]]) -> tuple:
+    """
+    Makes a move on a position given as a tuple of exponents
+    Parameters:
+        state (tuple): exponents of the tiles row by row
+        lines (list[list[int]]): cell indices of the lines of the direction of the move
+    Returns:
+        tuple: the position after the move, equal to state if the move is not possible
+    """
+    moved = list(state)
+    for line in lines:
+        merged = merge_row_left([state[cell] for cell in line])
+        for cell, exponent in zip(line, merged):
+            moved[cell] = exponent
+    return tuple(moved)
+
+
+def get_spawns(state: tuple) -> list[int]:
+    return [cell for cell, exponent in enumerate(state) if exponent == 0]
+
+
+def enumerate_states(size: int, goal_exponent: int) -> set:
+    """
+    Enumerates every position reachable from the starting positions of two tiles before the goal is reached
+    Parameters:
+        size (int): The size of the board
+        goal_exponent (int): exponent of the goal tile
+    Returns:
+        set: the positions as tuples of exponents, with the player to move
+    """
+    cells = size * size
+    line_cells = get_line_cells(size)
+    states = set()
+    for first in range(cells):
+        for second in range(first + 1, cells):
+            for first_exponent in (1, 2):
+                for second_exponent in (1, 2):
+                    state = [0] * cells
+                    state[first] = first_exponent
+                    state[second] = second_exponent
+                    states.add(tuple(state))
+    stack = list(states)
+    while stack:
+        state = stack.pop()
+        for lines in line_cells.values():
+            moved = move_exponents(state, lines)
+            if moved == state or max(moved) >= goal_exponent:
+                continue
+            for cell in get_spawns(moved):
+                for exponent in (1, 2):
+                    child = moved[:cell] + (exponent,) + moved[cell + 1:]
+                    if child not in states:
+                        states.add(child)
+                        stack.append(child)
+    return states
+
+
+def generate_tablebase(size: int, goal: int, two_probability=0.7, path=None) -> int:
+    """
+    Solves every reachable position of a board and writes the table
+    Parameters:
+        size (int): The size of the board
+        goal (int): The goal as in the tile that player aims to achieve
+        optional two_probability (float): Probability that a new tile is 2 rather than 4
+        optional path (str): path of the table, in TABLEBASE_DIR by default
+    Returns:
+        int: the number of solved positions
+    """
+    goal_exponent = goal.bit_length() - 1
+    base = goal_exponent + 1
+    line_cells = get_line_cells(size)
+    states = sorted(enumerate_states(size, goal_exponent),
+                    key=lambda state: sum(1 << exponent for exponent in state if exponent), reverse=True)
+    if path is None:
+        path = get_tablebase_path(size, goal)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    length = TABLEBASE_HEADER.size + base ** (size * size) * TABLEBASE_ENTRY.size
+    with open(path, 'wb+') as fTable:
+        fTable.truncate(length)
+        fTable.write(TABLEBASE_HEADER.pack(TABLEBASE_MAGIC, TABLEBASE_VERSION, size, goal_exponent, two_probability))
+        fTable.flush()
+        with mmap.mmap(fTable.fileno(), length) as table:
+            values = {}
+            for state in states:
+                best_direction = 0
+                best_value = 0.0
+                for direction, lines in line_cells.items():
+                    moved = move_exponents(state, lines)
+                    if moved == state:
+                        continue
+                    if max(moved) >= goal_exponent:
+                        value = 1.0
+                    else:
+                        value = 0.0
+                        spawns = get_spawns(moved)
+                        for cell in spawns:
+                            value += two_probability * values[moved[:cell] + (1,) + moved[cell + 1:]]
+                            value += (1 - two_probability) * values[moved[:cell] + (2,) + moved[cell + 1:]]
+                        value /= len(spawns)
+                    if best_direction == 0 or value > best_value:
+                        best_direction, best_value = direction.value, value
+                values[state] = best_value
+                TABLEBASE_ENTRY.pack_into(table, TABLEBASE_HEADER.size + get_state_index(state, base) * TABLEBASE_ENTRY.size,
+                                          best_direction, round(best_value * PROBABILITY_SCALE))
+    return len(states)
+
+
+class Tablebase:
+    def __init__(self, path: str):
+        """
+        Opens a table written by generate_tablebase as a read-only memory map
+        Parameters:
+            path (str): path of the table
+        Returns:
+            None
+        Raises:
+            WrongSaveFormatError: if the file is not a table of a supported version
+        """
+        self.path = path
+        with open(path, 'rb') as fTable:
+            self.map = mmap.mmap(fTable.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < TABLEBASE_HEADER.size:
+            self.close()
+            raise WrongSaveFormatError('tablebase is too short')
+        magic, version, self.size, goal_exponent, self.two_probability = TABLEBASE_HEADER.unpack_from(self.map)
+        self.goal = 1 << goal_exponent
+        self.base = goal_exponent + 1
+        if magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION or \
+                len(self.map) != TABLEBASE_HEADER.size + self.base ** (self.size * self.size) * TABLEBASE_ENTRY.size:
+            self.close()
+            raise WrongSaveFormatError('not a tablebase')
+
+    def covers(self, board: Board) -> bool:
+        """
+        Checks if the table was solved for the configuration of the board and the goal is not reached yet
+        Returns:
+            bool: True if the position of the board can be looked up, False otherwise
+        """
+        return board.size == self.size and board.goal == self.goal and \
+            board.two_probability == self.two_probability and board.find_max_tile() < self.goal
+
+    def lookup(self, board: Board) -> (Direction, float):
+        """
+        Reads the entry of the position of a board
+        Parameters:
+            board (Board): the position, covered by the table
+        Returns:
+            (Direction, float): the best move and the probability of reaching the goal with perfect play,
+                                the direction is None if no move is possible or the position is not reachable
+        """
+        exponents = board.get_exponents()
+        offset = TABLEBASE_HEADER.size + get_state_index(exponents, self.base) * TABLEBASE_ENTRY.size
+        direction, probability = TABLEBASE_ENTRY.unpack_from(self.map, offset)
+        return Direction(direction) if direction else None, probability / PROBABILITY_SCALE
+
+    def get_direction(self, board: Board) -> Direction:
+        """
+        Gets the perfect move of a board, so the table can be used as a computer player
+        Parameters:
+            board (Board): the board to move on, it is not changed
+        Returns:
+            Direction: Direction of the best move, None if the table has no move for the board
+        """
+        if not self.covers(board):
+            return None
+        return self.lookup(board)[0]
+
+    def close(self):
+        self.map.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve a small board of the game perfectly and save the table')
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--goal', type=int, default=32)
+    parser.add_argument('--two-probability', type=float, default=0.7)
+    parser.add_argument('--output', help='path of the table, in the Tablebases directory by default')
+    args = parser.parse_args()
+    solved = generate_tablebase(args.size, args.goal, args.two_probability, args.output)
+    print(f'solved {solved} positions')
@@ -0,0 +1,218 @@
+"""
+Tuning of the evaluator weights of the computer player by an evolution strategy over seeded self-play games.
+Every generation samples candidates around the current weights, plays the same seeded games with every candidate
+on a process pool and moves the weights towards the candidates with the highest average score.
+Generations are checkpointed as JSON, so a stopped run resumes where it was,
+and the best weights are written where Game loads them for the board configuration.
+Usage: python -m Classes.Tuner --size 4 --goal 2048 --generations 20 --workers 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
+import random
+from Classes.Simulator import *
+
+#weights changed by the tuning, the others keep their values
+TUNED_WEIGHTS = ('empty', 'merges', 'monotonicity', 'smoothness', 'sum', 'corner')
+
+
+def play_candidate(size: int, goal: int, engine: str, depth: int, weights: dict, seeds: list[int]) -> float:
+    """
+    Plays a seeded game for every seed with an expectimax player using the given weights
+    Runs inside a worker process, so all the arguments are plain values
+    Parameters:
+        size (int): The size of the boards
+        goal (int): The goal of the games
+        engine (str): name of the board engine in ENGINES
+        depth (int): search depth of the player
+        weights (dict): weights of the evaluator
+        seeds (list[int]): seed of every game
+    Returns:
+        float: the average score of the games
+    """
+    player = ExpectimaxPlayer(depth, evaluator=Evaluator(weights))
+    total = 0
+    for seed in seeds:
+        game = Game(size, goal, ENGINES[engine], player, seed)
+        game.play_game_computer(delay=0, show=False)
+        total += game.board.get_score_on_board()
+    return total / len(seeds)
+
+
+class Tuner:
+    def __init__(self, size=4, goal=2048, engine='bitboard', depth=1, population=16, parents=4, games=8,
+                 sigma=0.3, workers=4, seed=0, checkpoint=None, output=None):
+        """
+        Initializes a tuning run, resuming it from the checkpoint if there is one
+        Parameters:
+            optional size (int): The size of the boards
+            optional goal (int): The goal of the games
+            optional engine (str): name of the board engine in ENGINES
+            optional depth (int): search depth of the player during the games
+            optional population (int): The number of candidates per generation
+            optional parents (int): The number of best candidates the next weights are averaged from
+            optional games (int): The number of games played by every candidate
+            optional sigma (float): Spread of the candidates, relative to the weights
+            optional workers (int): The number of worker processes
+            optional seed (int): The master seed of the run
+            optional checkpoint (str): path of the checkpoint, next to the output by default
+            optional output (str): path of the best weights, where Game loads them by default
+        Returns:
+            None
+        """
+        self.size = size
+        self.goal = goal
+        self.engine = engine
+        self.depth = depth
+        self.population = population
+        self.parents = parents
+        self.games = games
+        self.workers = workers
+        self.seed = seed
+        self.output = output if output is not None else get_weights_path(size, goal)
+        self.checkpoint = checkpoint if checkpoint is not None else os.path.splitext(self.output)[0] + '.tuning.json'
+        self.generation = 0
+        self.sigma = sigma
+        self.weights = {name: DEFAULT_WEIGHTS[name] for name in TUNED_WEIGHTS}
+        self.best_weights = dict(self.weights)
+        self.best_fitness = None
+        self.history = []
+        self.load_checkpoint()
+
+    def load_checkpoint(self) -> bool:
+        """
+        Restores the state of the run from the checkpoint
+        Returns:
+            bool: True if the run was resumed, False if there is no checkpoint
+        """
+        if not os.path.isfile(self.checkpoint):
+            return False
+        with open(self.checkpoint, 'r') as fCheckpoint:
+            state = json.load(fCheckpoint)
+        self.generation = state['generation']
+        self.sigma = state['sigma']
+        self.weights = state['weights']
+        self.best_weights = state['best_weights']
+        self.best_fitness = state['best_fitness']
+        self.history = state['history']
+        return True
+
+    def save_checkpoint(self):
+        """
+        Writes the state of the run to the checkpoint, replacing the previous one only once it is fully written
+        Returns:
+            None
+        """
+        directory = os.path.dirname(self.checkpoint)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = {
+            'size': self.size,
+            'goal': self.goal,
+            'generation': self.generation,
+            'sigma': self.sigma,
+            'weights': self.weights,
+            'best_weights': self.best_weights,
+            'best_fitness': self.best_fitness,
+            'history': self.history
+        }
+        with open(self.checkpoint + '.tmp', 'w') as fCheckpoint:
+            json.dump(state, fCheckpoint, indent=2)
+        os.replace(self.checkpoint + '.tmp', self.checkpoint)
+
+    def sample(self, generation_random: random.Random) -> list[dict]:
+        """
+        Samples the candidates of a generation by scaling every weight by a log-normal factor
+        The current weights are always the first candidate
+        Parameters:
+            generation_random (random.Random): random stream of the generation
+        Returns:
+            list[dict]: weights of every candidate
+        """
+        candidates = [dict(self.weights)]
+        while len(candidates) < self.population:
+            candidates.append({name: weight * math.exp(self.sigma * generation_random.gauss(0, 1))
+                               for name, weight in self.weights.items()})
+        return candidates
+
+    def evaluate(self, executor, candidates: list[dict], seeds: list[int]) -> list[float]:
+        """
+        Plays the games of every candidate
+        Parameters:
+            executor (ProcessPoolExecutor): the process pool, None to play in this process
+            candidates (list[dict]): weights of every candidate
+            seeds (list[int]): seeds of the games, the same for every candidate
+        Returns:
+            list[float]: the average score of every candidate
+        """
+        arguments = [(self.size, self.goal, self.engine, self.depth, weights, seeds) for weights in candidates]
+        if executor is None:
+            return [play_candidate(*argument) for argument in arguments]
+        return list(executor.map(play_candidate, *zip(*arguments)))
+
+    def step(self, executor):
+        """
+        Runs a single generation and moves the weights to the geometric mean of its best candidates
+        Parameters:
+            executor (ProcessPoolExecutor): the process pool, None to play in this process
+        Returns:
+            None
+        """
+        generation_random = random.Random(self.seed * 1000003 + self.generation)
+        seeds = [generation_random.getrandbits(64) for _ in range(self.games)]
+        candidates = self.sample(generation_random)
+        fitness = self.evaluate(executor, candidates, seeds)
+        ranked = sorted(range(len(candidates)), key=lambda i: fitness[i], reverse=True)[:self.parents]
+        if self.best_fitness is None or fitness[ranked[0]] > self.best_fitness:
+            self.best_fitness = fitness[ranked[0]]
+            self.best_weights = candidates[ranked[0]]
+        self.weights = {name: math.exp(sum(math.log(candidates[i][name]) for i in ranked) / len(ranked))
+                        for name in self.weights}
+        self.history.append({'generation': self.generation, 'best': fitness[ranked[0]], 'current': fitness[0],
+                             'average': sum(fitness) / len(fitness)})
+        self.generation += 1
+
+    def run(self, generations: int) -> dict:
+        """
+        Runs generations until the given total is reached, checkpointing and writing the best weights after each
+        Parameters:
+            generations (int): total number of generations of the run, including resumed ones
+        Returns:
+            dict: the best weights found
+        """
+        executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        try:
+            while self.generation < generations:
+                self.step(executor)
+                self.save_checkpoint()
+                Evaluator(self.best_weights).save(self.output)
+                entry = self.history[-1]
+                print(f'generation {entry["generation"]} - best {entry["best"]:.0f}, current {entry["current"]:.0f}, '
+                      f'average {entry["average"]:.0f}')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self.best_weights
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tune the evaluator weights of the computer player by self-play')
+    parser.add_argument('--size', type=int, default=4)
+    parser.add_argument('--goal', type=int, default=2048)
+    parser.add_argument('--engine', choices=ENGINES, default='bitboard')
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--population', type=int, default=16)
+    parser.add_argument('--parents', type=int, default=4)
+    parser.add_argument('--games', type=int, default=8)
+    parser.add_argument('--sigma', type=float, default=0.3)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--checkpoint', help='path of the checkpoint to resume from and write to')
+    parser.add_argument('--output', help='path of the best weights, in the Weights directory by default')
+    args = parser.parse_args()
+    tuner = Tuner(args.size, args.goal, args.engine, args.depth, args.population, args.parents, args.games,
+                  args.sigma, args.workers, args.seed, args.checkpoint, args.output)
+    print(f'best weights: {tuner.run(args.generations)}')
@@ -0,0 +1,266 @@
+"""
+A vectorized reinforcement-learning environment of M games of 2048 with a reset/step interface.
+The boards are split between worker processes, each advancing its share as a BatchBoard.
+Actions, observations, rewards, done flags and legal-action masks live in shared-memory NumPy buffers,
+so the parent and the workers exchange only short commands and no board data is copied or pickled.
+Observations are the exponents of the tiles (0 for empty tiles), actions are direction.value - 1,
+the reward of a step is the sum of the tiles merged by it, and finished boards are reset automatically.
+"""
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from Classes.BatchBoard import *
+
+#name, shape after the number of boards and dtype of every shared buffer
+BUFFERS = (
+    ('actions', (), np.int8),
+    ('observations', None, np.uint8),
+    ('rewards', (), np.float32),
+    ('dones', (), np.bool_),
+    ('action_masks', (4,), np.bool_),
+    ('final_scores', (), np.int64)
+)
+
+
+class VectorWorker:
+    def __init__(self, arrays: dict, size: int, goal: int, seed, two_probability: float, stop_at_goal: bool):
+        """
+        Initializes the boards of a worker over its slice of the shared buffers
+        Parameters:
+            arrays (dict): the slices of the shared arrays of the boards of the worker, by buffer name
+            size (int): The size of the boards
+            goal (int): The goal of the boards
+            seed: seed of the random generator of the worker
+            two_probability (float): Probability that a new tile is 2 rather than 4
+            stop_at_goal (bool): end the game of a board when it reaches the goal
+        Returns:
+            None
+        """
+        self.arrays = arrays
+        self.stop_at_goal = stop_at_goal
+        self.batch = BatchBoard(len(arrays['actions']), size, goal, seed, two_probability)
+
+    def write_observations(self):
+        """
+        Writes the exponents of the tiles and the legal-action masks into the shared buffers
+        Returns:
+            None
+        """
+        exponents = np.frexp(self.batch.tiles)[1] - 1
+        np.maximum(exponents, 0, out=exponents)
+        self.arrays['observations'][...] = exponents
+        self.arrays['action_masks'][...] = self.batch.get_legal_moves()
+
+    def reset(self):
+        """
+        Starts a new game on every board of the worker and clears the rewards and done flags
+        Returns:
+            None
+        """
+        self.batch.reset_boards(np.ones(len(self.batch), dtype=bool))
+        self.arrays['rewards'][...] = 0
+        self.arrays['dones'][...] = False
+        self.arrays['final_scores'][...] = 0
+        self.write_observations()
+
+    def step(self):
+        """
+        Makes the actions from the shared buffer, spawns tiles on the boards that moved and resets the finished boards
+        An illegal action leaves the board unchanged with a reward of 0
+        Returns:
+            None
+        """
+        moved, merged = self.batch.make_moves(self.arrays['actions'].astype(np.int64) + 1)
+        self.batch.generate_new_tiles(moved)
+        dones = self.batch.get_game_over()
+        if self.stop_at_goal:
+            dones |= self.batch.get_goal_reached()
+        self.arrays['rewards'][...] = merged
+        self.arrays['dones'][...] = dones
+        self.arrays['final_scores'][...] = np.where(dones, self.batch.get_scores(), 0)
+        if dones.any():
+            self.batch.reset_boards(dones)
+        self.write_observations()
+
+
+def attach_arrays(specs: list, start: int, end: int) -> (list[SharedMemory], dict):
+    """
+    Attaches to the shared buffers and views the slice of the boards of a worker
+    Parameters:
+        specs (list): name of the shared memory, buffer name, full shape and dtype of every buffer
+        start (int): index of the first board of the worker
+        end (int): index after the last board of the worker
+    Returns:
+        (list[SharedMemory], dict): the attached shared memories, to be closed, and the slices by buffer name
+    """
+    memories = []
+    arrays = {}
+    for memory_name, name, shape, dtype in specs:
+        memory = SharedMemory(name=memory_name)
+        memories.append(memory)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)[start:end]
+    return memories, arrays
+
+
+def run_worker(connection, specs: list, start: int, end: int, size: int, goal: int, seed, two_probability: float,
+               stop_at_goal: bool):
+    """
+    Serves the commands of the parent for a slice of the boards until it is told to close
+    Runs inside a worker process, the commands are the strings 'reset', 'step' and 'close', answered with 'ok'
+    Returns:
+        None
+    """
+    memories, arrays = attach_arrays(specs, start, end)
+    try:
+        worker = VectorWorker(arrays, size, goal, seed, two_probability, stop_at_goal)
+        while True:
+            command = connection.recv()
+            if command == 'close':
+                break
+            getattr(worker, command)()
+            connection.send('ok')
+    finally:
+        #the views have to be gone before the shared memory can be closed
+        worker = arrays = None
+        for memory in memories:
+            memory.close()
+        connection.close()
+
+
+class VectorEnv:
+    def __init__(self, count=64, size=4, goal=2048, workers=2, seed=None, two_probability=0.7, stop_at_goal=False):
+        """
+        Creates the shared buffers and starts the workers, workers=0 advances all the boards in this process
+        Parameters:
+            optional count (int): The number of boards
+            optional size (int): The size of the boards
+            optional goal (int): The goal of the boards
+            optional workers (int): The number of worker processes
+            optional seed (int): The seed of the run, every worker gets its own stream derived from it
+            optional two_probability (float): Probability that a new tile is 2 rather than 4
+            optional stop_at_goal (bool): end the game of a board when it reaches the goal, by default only when it is lost
+        Returns:
+            None
+        Raises:
+            WrongBoardSizeError: if the size is not an integer or is lower than 2
+            WrongGoalError: if the goal is not an integer or is less than 8 or more than 16384 or is not a power of 2
+            ValueError: if the count is not a positive integer
+        """
+        #the workers check their arguments too, but only after the shared buffers exist
+        if not isinstance(count, int) or count < 1:
+            raise ValueError('count must be a positive integer')
+        if not isinstance(size, int) or size < 2:
+            raise WrongBoardSizeError('board size must be greater than 2')
+        if not isinstance(goal, int) or goal.bit_count() != 1 or goal <= 8 or goal > 16384:
+            raise WrongGoalError('goal must be power of 2 greater than 8 and smaller or equal to 16384')
+        self.count = count
+        self.size = size
+        self.goal = goal
+        self.memories = []
+        specs = []
+        for name, shape, dtype in BUFFERS:
+            full_shape = (count,) + (shape if shape is not None else (size, size))
+            memory = SharedMemory(create=True, size=max(1, int(np.prod(full_shape)) * np.dtype(dtype).itemsize))
+            self.memories.append(memory)
+            specs.append((memory.name, name, full_shape, dtype))
+            array = np.ndarray(full_shape, dtype=dtype, buffer=memory.buf)
+            array[...] = 0
+            setattr(self, name, array)
+        workers = min(workers, count)
+        seeds = np.random.SeedSequence(seed).spawn(max(1, workers))
+        bounds = [count * i // max(1, workers) for i in range(max(1, workers) + 1)]
+        self.connections = []
+        self.processes = []
+        self.local_worker = None
+        try:
+            if workers == 0:
+                arrays = {name: getattr(self, name) for name, _, _ in BUFFERS}
+                self.local_worker = VectorWorker(arrays, size, goal, seeds[0], two_probability, stop_at_goal)
+            else:
+                for i in range(workers):
+                    connection, worker_connection = Pipe()
+                    process = Process(target=run_worker, daemon=True,
+                                      args=(worker_connection, specs, bounds[i], bounds[i + 1], size, goal, seeds[i],
+                                            two_probability, stop_at_goal))
+                    process.start()
+                    worker_connection.close()
+                    self.connections.append(connection)
+                    self.processes.append(process)
+        except Exception:
+            self.close()
+            raise
+
+    def send(self, command: str):
+        """
+        Runs a command on all the boards and waits until every worker is done with it
+        Parameters:
+            command (str): 'reset' or 'step'
+        Returns:
+            None
+        """
+        if self.local_worker is not None:
+            getattr(self.local_worker, command)()
+            return
+        for connection in self.connections:
+            connection.send(command)
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self) -> np.ndarray:
+        """
+        Starts a new game on every board
+        Returns:
+            np.ndarray: (M, N, N) shared observations, overwritten by the next step
+        """
+        self.send('reset')
+        return self.observations
+
+    def step(self, actions) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+        Makes an action on every board, finished boards are reset and their next observation is of the new game
+        Parameters:
+            actions: (M,) actions, direction.value - 1 of the move of every board
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, np.ndarray): the shared observations, rewards, done flags
+                                                              and legal-action masks, overwritten by the next step
+        """
+        self.actions[...] = actions
+        self.send('step')
+        return self.observations, self.rewards, self.dones, self.action_masks
+
+    def close(self):
+        """
+        Stops the workers and frees the shared buffers
+        Arrays returned by reset and step must not be used after closing
+        Returns:
+            None
+        """
+        for connection in self.connections:
+            try:
+                connection.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+        self.processes = []
+        self.local_worker = None
+        for name, _, _ in BUFFERS:
+            if hasattr(self, name):
+                delattr(self, name)
+        for memory in self.memories:
+            try:
+                memory.close()
+            except BufferError:
+                #the caller still holds a view, the memory is freed once it is gone
+                pass
+            memory.unlink()
+        self.memories = []
+
+    def __enter__(self) -> 'VectorEnv':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
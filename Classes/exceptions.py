@@ -1,4 +1,8 @@
 class WrongBoardSizeError(Exception):
     """Raise when board size is not an integer or below 2"""
 class WrongGoalError(Exception):
-    """Raise when goal is not an integer over 4 or not a power of 2"""
\ No newline at end of file
+    """Raise when goal is not an integer over 4 or not a power of 2"""
+class WrongSaveFormatError(Exception):
+    """Raise when a save or an archive record is not in the binary save format"""
+class TileOverflowError(Exception):
+    """Raise when a move would make a tile too big for the board engine"""